@@ -1,5 +1,5 @@
 from .type_def import fields, Bool, Integer, Float, List, Dict, RpcType,\
-    rpc_doc_type_key, rpc_doc_resp_key, rpc_doc_args_key
+    rpc_doc_type_key, rpc_doc_resp_key, rpc_doc_args_key, rpc_doc_cache_key
 
 from .web import namespace
 
@@ -7,9 +7,9 @@ from .metadata import MetaData, Arg, Entry, ArgSource
 
 from .trace import TraceInfo
 
-from .pool import HostInfo, ConnectionInfo, Pool
+from .pool import HostInfo, ConnectionInfo, Pool, ConnectionPool, PooledConnectionInfo, Balancer
 
-from .ctx import Context, CallableAction, CallableImpl, ContextCache
+from .ctx import Context, CallableAction, CallableImpl, ContextCache, AsyncContext, AsyncCallableAction
 
 from .base_util import rpc_impl_rename
 
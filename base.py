@@ -1,6 +1,7 @@
 import typing
 
-from .util import is_builtin_type
+from .util.convert import convert2builtin, CycleError
+from .type_def.type_codec import codec_of
 from .ctx import Context
 
 
@@ -47,13 +48,23 @@ class CommonImpl(CommonAbs):
 
 class RPCDict(object):
     """
-    所有的服务接口的参数跟返回值都会继承该类型，从而得到序列化成 dict 的能力
+    所有的服务接口的参数跟返回值都会继承该类型，从而得到序列化成 dict 的能力,
+    类型上有 fields.args / fields.resp 的定义时按定义中的字段转换, 否则转换所有的公开属性
     """
 
     def to_dict(self) -> dict:
-        return convert2builtin(self.__dict__)
+        codec = codec_of(type(self))
+        if codec is None:
+            return convert2builtin(self.__dict__)
+        return codec.to_dict(self.__dict__)
 
     def from_dict(self, _d: dict):
+        """
+        按定义反序列化 _d 并赋值到当前对象上, 没有定义时不做任何处理
+        """
+        codec = codec_of(type(self))
+        if codec is not None:
+            self.__dict__.update(codec.from_dict(_d))
         return self
 
     def from_pb2(self, _context):
@@ -69,44 +80,3 @@ class RPCDict(object):
             return default_value
         return f_from_ctx
 
-
-def convert2builtin(obj) -> typing.Union[typing.Dict[str, typing.Any],
-                                         typing.List,
-                                         int, bool, float, str, None]:
-    """
-    转换任意复合类型到基础类型, deep_copy 决定了是否会进行深度拷贝，默认开启深度拷贝
-    如果传递的类型不在支持的范围内则原样返回.
-    WARN: 但如果一个类型无法转换为 builtin， 则说明他后续的序列化会出错。
-    """
-
-    d = obj
-
-    if is_builtin_type(obj):
-        return obj
-    elif isinstance(obj, dict):
-        d = dict()
-
-        for key, value in obj.items():
-            if key.startswith("_") or callable(value):
-                continue
-
-            if is_builtin_type(value):
-                d[key] = value
-
-            elif isinstance(value, (list, dict)):
-                d[key] = convert2builtin(value)
-
-            elif hasattr(value, "__dict__"):
-                d[key] = convert2builtin(value.__dict__)
-            else:
-                d[key] = value
-
-    elif isinstance(obj, list):
-        d = []
-        for i in obj:
-            d.append(convert2builtin(i))
-
-    elif hasattr(obj, "__dict__"):
-        d = convert2builtin(obj.__dict__)
-
-    return d
@@ -0,0 +1 @@
+from .suite import Benchmark, Registry, Change, registry, bench, measure, run, save, load, compare, report
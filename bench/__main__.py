@@ -0,0 +1,13 @@
+"""
+运行基准测试并保存结果, 或比较两次结果:
+
+    python -m <package>.bench run -o base.json
+    python -m <package>.bench run "dict.*" -o new.json
+    python -m <package>.bench compare base.json new.json --threshold 0.1
+"""
+
+import sys
+
+from .suite import main
+
+sys.exit(main())
@@ -0,0 +1,372 @@
+"""
+类型系统、trace、datasource、context 及连接池的基准测试用例, 每个用例在注册的函数中准备数据, 返回被计时的函数
+"""
+
+import copy
+import datetime
+import io
+import typing
+
+from ..base import convert2builtin, RPCDict
+from ..ctx.cache import ContextCache
+from ..ctx.context import Context
+from ..pool import ConnectionInfo, ConnectionPool, Pool
+from ..trace import TraceInfo
+from ..type_def import RpcType
+from ..type_def.type_valid import validator_constructor, StringValidate
+from ..type_def.type_gen import PayloadGenerator
+from ..type_def.type_util import fields, Model
+from ..type_def.datasource import args
+from .local_server import LocalServer
+from .suite import bench
+
+WIDTHS = [4, 16]
+DEPTHS = [1, 3]
+
+
+def nested_schema(width: int, depth: int) -> RpcType:
+    """
+    生成嵌套的 Dict 定义, 每一层有 width 个标量字段, depth > 1 时再包含一个子 Dict 及一个子 Dict 的 List
+    """
+    fs: typing.Dict[str, RpcType] = {}
+    for i in range(width):
+        kind = i % 4
+        if kind == 0:
+            fs[f"i{i}"] = fields.Integer(minimum=0, maximum=1000)
+        elif kind == 1:
+            fs[f"s{i}"] = fields.String(min_length=1, max_length=16)
+        elif kind == 2:
+            fs[f"f{i}"] = fields.Float()
+        else:
+            fs[f"b{i}"] = fields.Bool()
+    if depth > 1:
+        fs["child"] = nested_schema(width, depth - 1)
+        fs["items"] = fields.List(nested_schema(width, depth - 1))
+    return fields.Dict(fs)
+
+
+def nested_payload(width: int, depth: int, items: int = 3, seed: int = 0) -> typing.Dict[str, typing.Any]:
+    """
+    生成与 nested_schema(width, depth) 对应的合法数据, 每个列表固定包含 items 个元素, 保证结果可以比较
+    """
+    return PayloadGenerator(nested_schema(width, depth), seed=seed, list_len=(items, items)).valid()
+
+
+def user_model() -> Model:
+    return fields.model("bench_user", dict(
+        id=fields.Integer().column(primary_key=True),
+        name=fields.String(min_length=1, max_length=32).column(length=32),
+        age=fields.Integer(minimum=0, maximum=200).column(),
+        height=fields.Float().column(),
+        created=fields.DateTime().column(),
+        enabled=fields.Bool().column(),
+    ))
+
+
+def order_model() -> Model:
+    return fields.model("bench_order", dict(
+        id=fields.Integer().column(primary_key=True),
+        user_id=fields.Integer().column(foreign="bench_user.id"),
+        amount=fields.Float().column(),
+        state=fields.Integer(minimum=0, maximum=8).column(),
+    ))
+
+
+# 标量类型: 名称 -> (创建类型的函数, 序列化前的值, 反序列化前的值)
+_scalars = {
+    "integer": (fields.Integer, 42, "42"),
+    "float": (fields.Float, 4.2, "4.2"),
+    "bool": (fields.Bool, True, "true"),
+    "string": (fields.String, "hello", "hello"),
+    "datetime": (lambda: fields.DateTime(in_format="%Y-%m-%d %H:%M:%S"), datetime.datetime(2020, 1, 2, 3, 4, 5), "2020-01-02 03:04:05"),
+}
+
+
+@bench("scalar.serialize", kind=list(_scalars))
+def scalar_serialize(kind: str):
+    factory, value, _ = _scalars[kind]
+    t = factory()
+    return lambda: t.serialize(value)
+
+
+@bench("scalar.deserialize", kind=list(_scalars))
+def scalar_deserialize(kind: str):
+    factory, _, raw = _scalars[kind]
+    t = factory()
+    return lambda: t.deserialize(raw)
+
+
+@bench("dict.deserialize", width=WIDTHS, depth=DEPTHS)
+def dict_deserialize(width: int, depth: int):
+    schema, payload = nested_schema(width, depth), nested_payload(width, depth)
+    return lambda: schema.deserialize(payload)
+
+
+@bench("dict.serialize", width=WIDTHS, depth=DEPTHS)
+def dict_serialize(width: int, depth: int):
+    schema, payload = nested_schema(width, depth), nested_payload(width, depth)
+    return lambda: schema.serialize(payload)
+
+
+@bench("dict.validate", width=WIDTHS, depth=DEPTHS)
+def dict_validate(width: int, depth: int):
+    schema, payload = nested_schema(width, depth), nested_payload(width, depth)
+    return lambda: schema.validator.valid(payload)
+
+
+@bench("list.deserialize", size=[10, 1000])
+def list_deserialize(size: int):
+    schema = fields.List(nested_schema(4, 1))
+    payload = PayloadGenerator(schema, seed=0, list_len=(size, size)).valid()
+    return lambda: schema.deserialize(payload)
+
+
+@bench("generator", width=WIDTHS, depth=DEPTHS, kind=["valid", "invalid"])
+def generator(width: int, depth: int, kind: str):
+    gen = PayloadGenerator(nested_schema(width, depth), seed=0)
+    return gen.valid if kind == "valid" else gen.invalid
+
+
+# validator_constructor 的参数组合及一个合法值
+_validators = {
+    "less": (dict(max=100), 50),
+    "greater": (dict(min=0), 50),
+    "range": (dict(min=0, max=100), 50),
+    "choice": (dict(choose_n=1, choose_condition=["a", "b", "c"]), "b"),
+}
+
+
+@bench("validator.construct", kind=list(_validators))
+def validator_construct(kind: str):
+    kwargs, _ = _validators[kind]
+    return lambda: validator_constructor(**kwargs)
+
+
+@bench("validator.valid", kind=list(_validators) + ["string"])
+def validator_valid(kind: str):
+    if kind == "string":
+        validator, value = StringValidate(1, 32), "hello"
+    else:
+        kwargs, value = _validators[kind]
+        validator = validator_constructor(**kwargs)
+    return lambda: validator.valid(value)
+
+
+@bench("model.derive", op=["extend", "extend_model", "choose", "exclude", "exclude_primary"])
+def model_derive(op: str):
+    user, order = user_model(), order_model()
+    ops = {
+        "extend": lambda: user.extend("nickname", fields.String()),
+        "extend_model": lambda: user.extend_model(order),
+        "choose": lambda: user.choose(["id", "name", "age"]),
+        "exclude": lambda: user.exclude(["created", "enabled"]),
+        "exclude_primary": user.exclude_primary,
+    }
+    return ops[op]
+
+
+@bench("model.deepcopy")
+def model_deepcopy():
+    user = user_model()
+    return lambda: copy.deepcopy(user)
+
+
+@bench("trace.encode", fmt=["legacy", "header", "bytes"])
+def trace_encode(fmt: str):
+    child = TraceInfo.from_exists(TraceInfo("root"), "impl.action")
+    return {"legacy": child.encode, "header": child.to_header, "bytes": child.to_bytes}[fmt]
+
+
+@bench("trace.decode", fmt=["legacy", "header", "bytes"])
+def trace_decode(fmt: str):
+    child = TraceInfo.from_exists(TraceInfo("root"), "impl.action")
+    if fmt == "legacy":
+        data = child.encode()
+        return lambda: TraceInfo.decode(data)
+    if fmt == "header":
+        header = child.to_header()
+        return lambda: TraceInfo.from_header(header)
+    data = child.to_bytes()
+    return lambda: TraceInfo.from_bytes(data)
+
+
+@bench("trace.from_exists")
+def trace_from_exists():
+    root = TraceInfo("root")
+
+    def from_exists():
+        # 每个请求的下游调用数通常不多, 重置序号避免 span id 无限增长
+        root.next_id = -1
+        return TraceInfo.from_exists(root, "impl.action")
+    return from_exists
+
+
+@bench("trace.hop", fmt=["legacy", "header", "bytes"])
+def trace_hop(fmt: str):
+    """
+    一跳: 为下游调用创建子 TraceInfo, 编码后由下游解码
+    """
+    encode, decode = {"legacy": (TraceInfo.encode, TraceInfo.decode),
+                      "header": (TraceInfo.to_header, TraceInfo.from_header),
+                      "bytes": (TraceInfo.to_bytes, TraceInfo.from_bytes)}[fmt]
+    root = TraceInfo("root")
+
+    def hop():
+        root.next_id = -1
+        return decode(encode(TraceInfo.from_exists(root, "impl.action")))
+    return hop
+
+
+@bench("binary", op=["deserialize", "serialize", "write_to", "read_from"], size=[1024, 1 << 20])
+def binary(op: str, size: int):
+    t = fields.LargeBinary(max_length=size)
+    blob = bytearray(size)
+    data = t.to_bytes(blob)
+
+    def write_to():
+        t.write_to(blob, io.BytesIO())
+    return {"deserialize": lambda: t.deserialize(blob),
+            "serialize": lambda: t.serialize(blob),
+            "write_to": write_to,
+            "read_from": lambda: t.read_from(data)}[op]
+
+
+class _Address(object):
+    def __init__(self, i: int):
+        self.city = f"city{i}"
+        self.zip = i
+        self._internal = i
+
+
+class _User(object):
+    def __init__(self, i: int):
+        self.id = i
+        self.name = f"user{i}"
+        self.score = i * 1.5
+        self.tags = ["a", "b", "c"]
+        self.address = _Address(i)
+        self.meta = {"k": i, "nested": {"v": [1, 2, 3]}}
+
+
+@bench("convert2builtin", size=[1, 100])
+def convert_objects(size: int):
+    users = {"users": [_User(i) for i in range(size)], "total": size}
+    return lambda: convert2builtin(users)
+
+
+class _Order(RPCDict):
+    pass
+
+
+# 按 order_model 的定义生成 to_dict / from_dict
+_Order = fields.args(order_model())(_Order)
+
+
+@bench("rpcdict", op=["to_dict", "from_dict", "deserialize"])
+def rpcdict(op: str):
+    payload = {"id": 1, "user_id": 2, "amount": 3.5, "state": 1}
+    order = _Order().from_dict(payload)
+    schema = _Order._rpc_doc_args
+    return {"to_dict": order.to_dict,
+            "from_dict": lambda: _Order().from_dict(payload),
+            "deserialize": lambda: schema.deserialize(payload)}[op]
+
+
+@bench("datasource.build", kind=["select", "join", "subquery"])
+def datasource_build(kind: str):
+    user, order = user_model(), order_model()
+
+    def select():
+        return fields.datasource().select(user).filter(user.age > args.age).skip(0).take(20)
+
+    def join():
+        return fields.datasource().select(user.id, user.name, order.amount) \
+            .join(user.id == order.user_id) \
+            .filter((order.state == args.state) & (user.name.like(args.name))) \
+            .skip(args.skip).take(args.take)
+
+    def subquery():
+        return fields.datasource().select(
+            user,
+            fields.datasource().select(order.id.count()).filter(order.user_id.eq(user.id)).alias("orders")
+        ).filter(user.enabled == args.enabled)
+
+    return {"select": select, "join": join, "subquery": subquery}[kind]
+
+
+@bench("datasource.compile", kind=["select", "join", "subquery"])
+def datasource_compile(kind: str):
+    build = datasource_build(kind)
+
+    def compile_():
+        # 每次都重新定义, 避免命中编译结果的缓存
+        return build().get_source().compile()
+    return compile_
+
+
+class _Pool(Pool):
+    def get(self, key: str) -> ConnectionInfo:
+        return ConnectionInfo(key)
+
+
+class _Noop(object):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def noop(self, args):
+        return args
+
+
+@bench("context.call", mode=["walk", "flat"], depth=[1, 5, 20])
+def context_call(mode: str, depth: int):
+    """
+    对比每次调用沿 prev 链查找 root 的缓存管理器(walk)与使用创建时缓存的 root 缓存管理器(flat)
+    """
+    cache = ContextCache(_Pool())
+    cache.set("noop", _Noop)
+    chain = [Context(TraceInfo("root"), client_cache=cache)]
+    for i in range(depth - 1):
+        chain.append(chain[-1].child(f"level{i}"))
+    leaf = chain[-1]
+
+    # 子上下文只持有上一级的弱引用, 被计时的函数通过默认参数持有整条链
+    def walk(_chain=chain):
+        ctx, prev = leaf, leaf._prev()
+        while prev is not None:
+            ctx, prev = prev, prev._prev()
+        return ctx._client_cache.get("noop", "noop")(None)
+
+    def flat(_chain=chain):
+        return leaf.call("noop", "noop", None)
+    return {"walk": walk, "flat": flat}[mode]
+
+
+# 连接池用例共用的本地服务及连接池, 第一次使用时创建, 作为后台线程运行至进程退出
+_local: typing.Dict[str, typing.Any] = {}
+
+
+def _local_pool() -> typing.Tuple[LocalServer, ConnectionPool]:
+    if not _local:
+        server = LocalServer().start()
+        _local.update(server=server, pool=ConnectionPool(server.connect, max_size=8))
+    return _local["server"], _local["pool"]
+
+
+@bench("pool.request", mode=["no_pool", "pooled"])
+def pool_request(mode: str):
+    """
+    对比每次请求新建连接与使用连接池时单次请求的耗时
+    """
+    server, pool = _local_pool()
+
+    def no_pool():
+        conn = server.connect()
+        try:
+            return conn.request(b"x")
+        finally:
+            conn.close()
+
+    def pooled():
+        with pool.get("bench") as conn:
+            return conn.request(b"x")
+    return {"no_pool": no_pool, "pooled": pooled}[mode]
@@ -0,0 +1,95 @@
+"""
+用于测试及性能测试的本地 socket 服务, 按行回显收到的数据, 收到 ping 时返回 pong
+"""
+
+import socket
+import socketserver
+import threading
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server: LocalServer = self.server.owner
+        with server.lock:
+            server.accepted += 1
+            server.lock.notify_all()
+        for line in self.rfile:
+            if server.delay:
+                threading.Event().wait(server.delay)
+            if line.strip() == b"ping":
+                self.wfile.write(b"pong\n")
+            else:
+                self.wfile.write(line)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class LocalServer(object):
+    """
+    在后台线程中运行的 TCP 服务, accepted 记录了已接受的连接数, delay 为每行响应前的等待时间
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.lock = threading.Condition()
+        self.accepted = 0
+        self.delay = delay
+        self._server = _TCPServer(("127.0.0.1", 0), _Handler)
+        self._server.owner = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self) -> 'LocalServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wait_accepted(self, n: int, timeout: float = 1.0) -> bool:
+        """
+        等待服务接受 n 个连接, 连接由后台线程计数, 客户端建立连接后不能立即检查 accepted
+        """
+        with self.lock:
+            return self.lock.wait_for(lambda: self.accepted >= n, timeout)
+
+    def connect(self, key: str = "") -> 'LineClient':
+        return LineClient(socket.create_connection(self.address))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class LineClient(object):
+    """
+    按行收发数据的客户端连接
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.file = sock.makefile("rb")
+        self.closed = False
+
+    def request(self, data: bytes) -> bytes:
+        self.sock.sendall(data + b"\n")
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("连接已被关闭")
+        return line.rstrip(b"\n")
+
+    def ping(self) -> bool:
+        return self.request(b"ping") == b"pong"
+
+    def close(self):
+        self.closed = True
+        self.file.close()
+        self.sock.close()
@@ -0,0 +1,263 @@
+"""
+基准测试的注册、执行及结果比较, 结果以 JSON 保存, 便于对比不同提交之间的性能变化
+"""
+
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+# 基准测试函数, 调用后返回被计时的无参函数, 准备数据的开销不计入结果
+Factory = typing.Callable[..., typing.Callable[[], typing.Any]]
+
+FORMAT_VERSION = 1
+
+
+class Benchmark(object):
+    """
+    一个基准测试用例, name 为用例的完整名称, 带参数的用例为 group[k=v,...]
+    """
+
+    def __init__(self, name: str, group: str, factory: Factory, params: typing.Dict[str, typing.Any] = None):
+        self.name = name
+        self.group = group
+        self.factory = factory
+        self.params = params or {}
+
+    def setup(self) -> typing.Callable[[], typing.Any]:
+        return self.factory(**self.params)
+
+    def __repr__(self):
+        return f"Benchmark({self.name})"
+
+
+class Registry(object):
+    def __init__(self):
+        self._benchmarks: typing.Dict[str, Benchmark] = {}
+
+    def add(self, benchmark: Benchmark):
+        if benchmark.name in self._benchmarks:
+            raise KeyError(f"benchmark {benchmark.name} already registered")
+        self._benchmarks[benchmark.name] = benchmark
+
+    def bench(self, group: str, **params: typing.List[typing.Any]):
+        """
+        注册基准测试, params 中的每个参数为取值列表, 会按笛卡尔积展开为多个用例:
+
+            @registry.bench("dict.deserialize", width=[4, 16], depth=[1, 3])
+            def dict_deserialize(width, depth):
+                ...
+                return lambda: schema.deserialize(payload)
+        """
+        def w(factory: Factory):
+            keys = list(params)
+            for values in itertools.product(*(params[k] for k in keys)):
+                p = dict(zip(keys, values))
+                name = group if not p else group + "[" + ",".join(f"{k}={v}" for k, v in p.items()) + "]"
+                self.add(Benchmark(name, group, factory, p))
+            return factory
+        return w
+
+    def select(self, patterns: typing.Sequence[str] = ()) -> typing.List[Benchmark]:
+        """
+        按 fnmatch 的模式筛选用例, 没有模式时返回全部用例
+        """
+        if not patterns:
+            return list(self._benchmarks.values())
+        return [b for b in self._benchmarks.values() if any(fnmatch.fnmatchcase(b.name, p) for p in patterns)]
+
+    def __len__(self):
+        return len(self._benchmarks)
+
+
+registry = Registry()
+bench = registry.bench
+
+
+def measure(fn: typing.Callable[[], typing.Any], rounds: int = 5, min_time: float = 0.05) -> typing.Dict[str, typing.Any]:
+    """
+    测量 fn 单次调用的耗时(纳秒), 先按 timeit.autorange 的方式确定每轮的调用次数, 使每轮不少于 min_time 秒,
+    再执行 rounds 轮, 返回最快一轮、中位数及标准差
+    """
+    timer = time.perf_counter
+    loops = 1
+    while True:
+        start = timer()
+        for _ in range(loops):
+            fn()
+        elapsed = timer() - start
+        if elapsed >= min_time:
+            break
+        loops = loops * 10 if elapsed < min_time / 10 else loops * 2
+
+    samples = []
+    for _ in range(rounds):
+        start = timer()
+        for _ in range(loops):
+            fn()
+        samples.append((timer() - start) / loops * 1e9)
+
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "rounds": rounds,
+    }
+
+
+def environment() -> typing.Dict[str, typing.Any]:
+    """
+    结果所对应的运行环境, 包括当前的 git 提交
+    """
+    commit = ""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=10, check=True
+        ).stdout.decode().strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run(benchmarks: typing.List[Benchmark], rounds: int = 5, min_time: float = 0.05,
+        out: typing.TextIO = None) -> typing.Dict[str, typing.Any]:
+    """
+    执行所有用例, out 不为 None 时输出每个用例的结果
+    """
+    results = {}
+    for b in benchmarks:
+        fn = b.setup()
+        r = measure(fn, rounds, min_time)
+        r["group"], r["params"] = b.group, b.params
+        results[b.name] = r
+        if out is not None:
+            out.write(f"{b.name:<56}{format_ns(r['min']):>12}{format_ns(r['median']):>12}"
+                      f"  ±{r['stdev'] / r['median'] * 100 if r['median'] else 0:.1f}%\n")
+            out.flush()
+    return {"version": FORMAT_VERSION, "env": environment(), "results": results}
+
+
+def save(result: typing.Dict[str, typing.Any], path: str):
+    with open(path, "w") as fp:
+        json.dump(result, fp, indent=2, sort_keys=True)
+
+
+def load(path: str) -> typing.Dict[str, typing.Any]:
+    with open(path) as fp:
+        result = json.load(fp)
+    if result.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported benchmark result version {result.get('version')} in {path}")
+    return result
+
+
+def format_ns(ns: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f}{unit}"
+    return f"{ns:.0f}ns"
+
+
+class Change(object):
+    """
+    同一个用例在两次结果中的对比, ratio 为 new / base, 大于 1 表示变慢
+    """
+
+    def __init__(self, name: str, base: float, new: float, threshold: float):
+        self.name = name
+        self.base = base
+        self.new = new
+        self.ratio = new / base if base else float("inf")
+        self.threshold = threshold
+
+    @property
+    def regressed(self) -> bool:
+        return self.ratio > 1 + self.threshold
+
+    @property
+    def improved(self) -> bool:
+        return self.ratio < 1 / (1 + self.threshold)
+
+    def __repr__(self):
+        return f"Change({self.name}, {self.ratio:.3f})"
+
+
+def compare(base: typing.Dict[str, typing.Any], new: typing.Dict[str, typing.Any],
+            threshold: float = 0.1, metric: str = "min") -> typing.Tuple[typing.List[Change], typing.List[str]]:
+    """
+    比较两次结果, 返回两次都存在的用例的变化, 以及只存在于其中一次的用例,
+    默认使用最快一轮的耗时比较, 受其他进程干扰最小
+    """
+    base_results, new_results = base["results"], new["results"]
+    changes = [Change(name, base_results[name][metric], r[metric], threshold)
+               for name, r in new_results.items() if name in base_results]
+    missing = sorted(set(base_results) ^ set(new_results))
+    return changes, missing
+
+
+def report(changes: typing.List[Change], missing: typing.List[str], only_changed: bool = False) -> str:
+    lines = [f"{'benchmark':<56}{'base':>12}{'new':>12}{'ratio':>9}"]
+    for c in sorted(changes, key=lambda c: -c.ratio):
+        if only_changed and not (c.regressed or c.improved):
+            continue
+        mark = "  slower" if c.regressed else ("  faster" if c.improved else "")
+        lines.append(f"{c.name:<56}{format_ns(c.base):>12}{format_ns(c.new):>12}{c.ratio:>9.3f}{mark}")
+    for name in missing:
+        lines.append(f"{name:<56}  only in one result")
+    regressed = sum(c.regressed for c in changes)
+    lines.append(f"{len(changes)} compared, {regressed} slower, {sum(c.improved for c in changes)} faster")
+    return "\n".join(lines)
+
+
+def main(argv: typing.List[str] = None) -> int:
+    import argparse
+    from . import cases  # 导入时注册所有用例
+
+    parser = argparse.ArgumentParser(prog="bench", description="type system and datasource benchmarks")
+    sub = parser.add_subparsers(dest="command")
+
+    p_run = sub.add_parser("run", help="run benchmarks and optionally save results as json")
+    p_run.add_argument("patterns", nargs="*", help="fnmatch patterns of benchmark names")
+    p_run.add_argument("--out", "-o", default="")
+    p_run.add_argument("--rounds", type=int, default=5)
+    p_run.add_argument("--min-time", type=float, default=0.05)
+
+    p_list = sub.add_parser("list", help="list benchmark names")
+    p_list.add_argument("patterns", nargs="*")
+
+    p_cmp = sub.add_parser("compare", help="compare two result files, exit 1 when any benchmark regressed")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--threshold", type=float, default=0.1)
+    p_cmp.add_argument("--metric", choices=("min", "median"), default="min")
+    p_cmp.add_argument("--only-changed", action="store_true")
+
+    opts = parser.parse_args(argv)
+    if opts.command == "list":
+        for b in registry.select(opts.patterns):
+            print(b.name)
+    elif opts.command == "run":
+        result = run(registry.select(opts.patterns), opts.rounds, opts.min_time, sys.stdout)
+        if opts.out:
+            save(result, opts.out)
+            print(f"saved {len(result['results'])} results to {opts.out}")
+    elif opts.command == "compare":
+        changes, missing = compare(load(opts.base), load(opts.new), opts.threshold, opts.metric)
+        print(report(changes, missing, opts.only_changed))
+        return 1 if any(c.regressed for c in changes) else 0
+    else:
+        parser.print_help()
+    return 0
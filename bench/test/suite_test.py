@@ -0,0 +1,32 @@
+from .. import cases
+from ..suite import Registry, registry, measure, compare
+
+
+def test_params_expand():
+    r = Registry()
+
+    @r.bench("x", a=[1, 2], b=["p"])
+    def x(a, b):
+        return lambda: (a, b)
+
+    assert [b.name for b in r.select()] == ["x[a=1,b=p]", "x[a=2,b=p]"]
+    assert [b.name for b in r.select(["x[a=2*"])] == ["x[a=2,b=p]"]
+    assert r.select(["x[a=1*"])[0].setup()() == (1, "p")
+
+
+def test_all_cases_run():
+    payload = cases.nested_payload(4, 3)
+    assert len(payload["items"]) == 3 and cases.nested_schema(4, 3).deserialize(payload) == payload
+    for b in registry.select():
+        b.setup()()
+
+
+def test_measure_and_compare():
+    r = measure(lambda: None, rounds=2, min_time=0.001)
+    assert r["loops"] >= 1 and r["min"] <= r["median"]
+
+    base = {"results": {"a": {"min": 100.0}, "b": {"min": 100.0}, "c": {"min": 100.0}}}
+    new = {"results": {"a": {"min": 105.0}, "b": {"min": 150.0}, "d": {"min": 1.0}}}
+    changes, missing = compare(base, new, threshold=0.1)
+    assert {c.name: c.regressed for c in changes} == {"a": False, "b": True}
+    assert missing == ["c", "d"]
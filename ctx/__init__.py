@@ -1,3 +1,9 @@
-from .context import Context, WeakContext
+from .context import Context, WeakContext, CallResult, current_context
 from .callable_impl import InvokeMethod, CallableImpl, CallableAction
 from .cache import ContextCache
+from .async_context import AsyncContext, AsyncCallableAction
+from .policy import InvokePolicy, RetryPolicy, HedgePolicy, CircuitBreaker, CircuitOpenError
+from .statistic import ImplStatistic, ActionStatistic, prometheus
+from .canonical import canonical, canonical_hash, NotCanonicalError
+from .coalesce import Coalescer
+from .response_cache import ResponseCache, CachedCallableAction, CacheSpec
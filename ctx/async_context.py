@@ -0,0 +1,202 @@
+"""
+基于 asyncio 的上下文, 用于在一个请求中并发调用多个 RPC 服务,
+超时及取消会沿着 prev 链传递给所有的子上下文
+"""
+
+import asyncio
+import functools
+import inspect
+import time
+import typing
+import weakref
+from concurrent.futures import Executor
+
+from ..trace import TraceInfo, SpanCollector
+from ..pool.host_info import HostInfo
+from ..pool.pool import detached_context
+from .cache import ContextCache
+from .callable_impl import CallableAction
+from .context import Context, CallSpec, _current
+
+
+class AsyncCallableAction(object):
+    """
+    CallableAction 的异步封装, 服务实现的 action 为协程函数时直接在事件循环中执行,
+    并在调用策略及统计中等待其完成, 否则在 executor 中执行, executor 为 None 时使用事件循环默认的线程池
+    注意在线程池中执行的调用被取消时, 只会停止等待其结果, 已经开始的调用仍会执行完毕
+    """
+
+    def __init__(self, action: CallableAction, executor: typing.Union[Executor, None] = None):
+        self.action = action
+        self.executor = executor
+
+    def is_coroutine(self) -> bool:
+        method = getattr(self.action.impl.impl, self.action.action, None)
+        return self.action.invoke is None and asyncio.iscoroutinefunction(method)
+
+    async def __call__(self, *args, **kwargs):
+        if self.is_coroutine():
+            return await self.action.acall(*args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        run = functools.partial(detached_context().run, self.action, *args, **kwargs)
+        result = await loop.run_in_executor(self.executor, run)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+
+class AsyncContext(Context):
+    """
+    异步上下文, timeout 为该上下文中所有调用的总时限(秒), 子上下文的时限不会超过父上下文剩余的时限,
+    调用 cancel 时会取消该上下文及其所有子上下文中正在进行的调用
+    """
+
+    def __init__(self, trace_info: TraceInfo = None,
+                 prev: typing.Union[typing.Callable[[], typing.Union[Context, None]], None] = None,
+                 client_cache: ContextCache = None,
+                 servicer_cache: ContextCache = None,
+                 logger=None,
+                 impl_context=None,
+                 host: typing.Union[HostInfo, None] = None,
+                 timeout: typing.Union[float, None] = None,
+                 executor: typing.Union[Executor, None] = None,
+                 collector: typing.Union[SpanCollector, None] = None):
+        super(AsyncContext, self).__init__(trace_info, prev, client_cache, servicer_cache,
+                                           logger, impl_context, host, collector)
+        self._executor = executor
+        self._tasks: typing.Set[asyncio.Future] = set()
+        self._children: typing.MutableSet[AsyncContext] = weakref.WeakSet()
+        self._cancelled = False
+        self._deadline: typing.Union[float, None] = time.monotonic() + timeout if timeout is not None else None
+
+        parent = self._prev()
+        if isinstance(parent, AsyncContext):
+            parent._children.add(self)
+            self._cancelled = parent._cancelled
+            if parent._deadline is not None:
+                self._deadline = min(self._deadline or parent._deadline, parent._deadline)
+            self._executor = executor or parent._executor
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def remaining(self) -> typing.Union[float, None]:
+        """
+        剩余的时限, 没有时限时返回 None
+        """
+        if self._deadline is None:
+            return None
+        return max(self._deadline - time.monotonic(), 0.0)
+
+    def child(self, identifier: str, host: typing.Union[HostInfo, None] = None,
+              timeout: typing.Union[float, None] = None) -> 'AsyncContext':
+        """
+        创建子上下文, 子上下文的 span id 在创建时即分配, 因此并发的子调用也会按照创建的顺序编号
+        """
+        if self._trace_info:
+            trace_info = TraceInfo.from_exists(self._trace_info, identifier)
+        else:
+            trace_info = TraceInfo(identifier)
+        return AsyncContext(trace_info, weakref.ref(self), host=host or self._host, timeout=timeout)
+
+    def cancel(self):
+        """
+        取消该上下文及其所有子上下文中正在进行的调用
+        """
+        self._cancelled = True
+        for task in list(self._tasks):
+            task.cancel()
+        for child in list(self._children):
+            child.cancel()
+
+    async def run(self, awaitable: typing.Awaitable) -> typing.Any:
+        """
+        在该上下文中执行 awaitable, 超过时限时抛出 asyncio.TimeoutError, 上下文被取消时抛出 asyncio.CancelledError
+        """
+        remaining = self.remaining()
+        if self._cancelled or remaining == 0:
+            if inspect.iscoroutine(awaitable):
+                awaitable.close()
+            raise asyncio.CancelledError() if self._cancelled else asyncio.TimeoutError()
+
+        task = asyncio.ensure_future(self._enter(awaitable))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return await asyncio.wait_for(task, remaining)
+
+    async def _enter(self, awaitable: typing.Awaitable) -> typing.Any:
+        token = _current.set(self)
+        try:
+            return await awaitable
+        finally:
+            _current.reset(token)
+
+    def get_async_callable(self, impl_name: str, action_name: str, identity: str = "",
+                           host: HostInfo = None) -> AsyncCallableAction:
+        return AsyncCallableAction(self.get_callable(impl_name, action_name, identity, host), self._executor)
+
+    async def call(self, impl_name: str, action_name: str, args, identity: str = "",
+                   timeout: typing.Union[float, None] = None):
+        """
+        在新的子上下文中调用服务, timeout 为本次调用的时限
+        """
+        return await self._spawn(self.child(f"{impl_name}.{action_name}", timeout=timeout),
+                                 impl_name, action_name, args, identity)
+
+    async def _ainvoke(self, impl_name: str, action_name: str, args, identity: str = ""):
+        """
+        _invoke 的异步版本, 同样会合并并发的相同调用, 并使用配置的响应缓存
+        """
+        action = self.get_async_callable(impl_name, action_name, identity, self._host)
+        coalescer = self._root_client_cache.coalescer
+        if coalescer is not None and coalescer.enabled(impl_name, action_name):
+            return await coalescer.acall(impl_name, action_name, identity, self._resolved_host, args,
+                                         lambda: action(args))
+        return await action(args)
+
+    async def _spawn(self, child: 'AsyncContext', impl_name: str, action_name: str, args, identity: str = ""):
+        span = child.start_span({"impl": impl_name, "action": action_name})
+        try:
+            result = await child.run(child._ainvoke(impl_name, action_name, args, identity))
+        except BaseException as e:
+            child.finish_span(span, e)
+            raise
+        child.finish_span(span)
+        return result
+
+    async def gather(self, *calls: typing.Union[CallSpec, typing.Awaitable],
+                     return_exceptions: bool = False,
+                     timeout: typing.Union[float, None] = None) -> typing.List[typing.Any]:
+        """
+        并发执行多个调用并按顺序返回结果, calls 可以是 (impl_name, action_name, args[, identity]) 或 awaitable,
+        return_exceptions 为 False 时任一调用失败会取消其余的调用并抛出该异常,
+        为 True 时失败的调用以异常作为结果
+        """
+        awaitables = []
+        for call in calls:
+            if isinstance(call, tuple):
+                impl_name, action_name, args = call[:3]
+                identity = call[3] if len(call) > 3 else ""
+                child = self.child(f"{impl_name}.{action_name}", timeout=timeout)
+                awaitables.append(self._spawn(child, impl_name, action_name, args, identity))
+            else:
+                awaitables.append(call)
+
+        tasks = [asyncio.ensure_future(a) for a in awaitables]
+        if return_exceptions:
+            return list(await asyncio.gather(*tasks, return_exceptions=True))
+
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+        return [task.result() for task in tasks]
@@ -1,58 +1,156 @@
+import threading
+import typing
+
 from ..pool import Pool
 from ..pool.host_info import HostInfo
 from .callable_impl import CallableImpl, CallableAction
+from .policy import InvokePolicy
+from .statistic import ImplStatistic, prometheus
+from .response_cache import ResponseCache, CachedCallableAction
+
+# servicer_cache 的 key, 为 (impl_name, identity)
+CacheKey = typing.Tuple[str, str]
+
+
+class _Flight(object):
+    """
+    正在构建中的缓存, 同一个 key 的其他线程会等待构建完成并使用其结果
+    """
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: typing.Union[CallableImpl, None] = None
+        self.error: typing.Union[BaseException, None] = None
 
 
 class ContextCache(object):
-    def __init__(self, pool: Pool = None):
+    def __init__(self, pool: Pool = None, policy: typing.Union[InvokePolicy, None] = None,
+                 statistic: bool = True, coalescer=None,
+                 response_cache: typing.Union[ResponseCache, None] = None):
         # 当前上下文使用的连接管理器
         self.pool = pool
+        # 构建 CallableImpl 时使用的调用策略
+        self.policy = policy
+        # 是否记录调用统计, 同一个服务的所有 CallableImpl 共享同一份统计
+        self.statistic = statistic
+        self.statistics: typing.Dict[str, ImplStatistic] = {}
+        # Context.call 使用的请求合并, 为 None 时不合并
+        self.coalescer = coalescer
+        # 通过 fields.cacheable 标记的服务所使用的响应缓存, 为 None 时不缓存
+        self.response_cache = response_cache
         # 上下文已注册的服务, 这些服务只会存在于 root 中
         self.servicer_map = {}
-        # 当前上下文所使用的 rpc 服务缓存, Value 为 CallableImpl
-        self.servicer_cache = {}
+        # 当前上下文所使用的 rpc 服务缓存, Key 为 (impl_name, identity), Value 为 CallableImpl
+        self.servicer_cache: typing.Dict[CacheKey, CallableImpl] = {}
+        # 正在构建中的缓存, 保证同一个 key 在并发的情况下只会构建一次
+        self._flights: typing.Dict[CacheKey, _Flight] = {}
+        self._lock = threading.Lock()
 
-    def get(self, impl_name: str, action_name: str, host: HostInfo = None, identity: str = str) -> CallableAction:
+    def get(self, impl_name: str, action_name: str, host: HostInfo = None, identity: str = "") -> CallableAction:
         """
         获取一个已注册的服务, 及其对应的 action, 可以通过指定 host 的方式，来强制调用 host 指定的 impl 服务
-        identity 作为缓存的标识符，如果没有传递，则使用 impl_name 作为缓存标识符
+        identity 作为缓存及获取连接的标识符，如果没有传递，则使用 impl_name 作为标识符,
+        缓存命中时不需要加锁, 未命中时同一个服务及 identity 只会有一个线程进行构建
         """
         identity = identity or impl_name
-        callable_impl: CallableImpl = self.servicer_cache.get(impl_name)
-        if not callable_impl:
-            impl = self.servicer_map.get(impl_name)
-            if not impl:
-                raise KeyError("can not find servicer named %s" % impl_name)
-
-            callable_impl: CallableImpl = self.build_cache(identity, impl, host)
+        if host:
+            # 来自客户端指定 Host 的，不作缓存
+            callable_impl = self.build_cache(identity, self.find_impl(impl_name), host, impl_name)
+        else:
+            callable_impl = self.servicer_cache.get((impl_name, identity))
+            if callable_impl is None:
+                callable_impl = self.build_once(impl_name, identity)
 
         if not callable_impl.has_action(action_name):
             raise KeyError("can not find action named %s in servicer %s" % (impl_name, action_name))
 
+        if self.response_cache is not None:
+            spec = self.response_cache.spec(impl_name, action_name, callable_impl.impl)
+            if spec is not None:
+                return CachedCallableAction(callable_impl, action_name, self.response_cache, spec,
+                                            impl_name, identity)
         return CallableAction(callable_impl, action_name)
 
+    def find_impl(self, impl_name: str):
+        impl = self.servicer_map.get(impl_name)
+        if not impl:
+            raise KeyError("can not find servicer named %s" % impl_name)
+        return impl
+
+    def build_once(self, impl_name: str, identity: str) -> CallableImpl:
+        """
+        单次构建 (impl_name, identity) 对应的缓存, 并发的调用会等待第一个调用构建完成,
+        构建失败时所有等待的调用都会抛出同样的异常, 之后的调用会重新尝试构建
+        """
+        key = (impl_name, identity)
+        with self._lock:
+            callable_impl = self.servicer_cache.get(key)
+            if callable_impl is not None:
+                return callable_impl
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self.build_cache(identity, self.find_impl(impl_name), impl_name=impl_name)
+            with self._lock:
+                self.servicer_cache[key] = flight.result
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
     def set(self, impl_name: str, impl):
         """
-        注册一个服务
+        注册一个服务, 已缓存的同名服务会被移除
         :param impl_name:
         :param impl:
         :return:
         """
-        self.servicer_map[impl_name] = impl
+        with self._lock:
+            self.servicer_map[impl_name] = impl
+            for key in [k for k in self.servicer_cache if k[0] == impl_name]:
+                del self.servicer_cache[key]
 
-    def build_cache(self, identity: str, impl_class, host: HostInfo = None) -> CallableImpl:
+    def build_cache(self, identity: str, impl_class, host: HostInfo = None, impl_name: str = "") -> CallableImpl:
         """
         为当前服务构建缓存信息，缓存信息为该服务将使用的链接等信息, 当传递了 host 时，使用 host 提供的 Connection
         :param identity:
         :param impl_class:
         :param host
+        :param impl_name: 统计信息所属的服务名, 不传递时使用 identity
         :return:
         """
         # 如果传递了 host, 则优先使用 host 提供的连接
         conn = host and host.get() or self.pool.get(identity)
-        # TODO: 当需要统计信息时，从 CallableImpl 及此处做调整
-        callable_impl = CallableImpl(impl_class, conn, self.pool)
-        if not host:
-            # 如果是来自客户端指定 Host 的，则不作缓存
-            self.servicer_cache[identity] = callable_impl
-        return callable_impl
+        statistic = self.get_statistic(impl_name or identity) if self.statistic else None
+        return CallableImpl(impl_class, conn, self.pool, statistic, policy=self.policy)
+
+    def get_statistic(self, impl_name: str) -> ImplStatistic:
+        statistic = self.statistics.get(impl_name)
+        if statistic is None:
+            with self._lock:
+                statistic = self.statistics.setdefault(impl_name, ImplStatistic(impl_name))
+        return statistic
+
+    def snapshot(self) -> typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]]:
+        """
+        所有服务的调用统计, 格式为 {impl_name: {action: {...}}}
+        """
+        return {name: s.snapshot() for name, s in list(self.statistics.items())}
+
+    def prometheus(self) -> str:
+        return prometheus(list(self.statistics.values()))
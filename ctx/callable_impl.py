@@ -3,9 +3,15 @@
 如连接信息，连接池信息，调用状态等。
 """
 
+import functools
+import inspect
+import threading
+import time
 import typing
 
-from ..pool.pool import ConnectionInfo, Pool
+from ..pool.pool import ConnectionInfo, Pool, CONNECTION_ERRORS
+from .policy import InvokePolicy, PolicyState, CircuitBreaker, CircuitOpenError
+from .statistic import ImplStatistic, ActionStatistic
 
 # receive an impl_instance, action_name, and any additional args
 # InvokeMethod = typing.Callable[[object, str, ...], any]
@@ -13,32 +19,71 @@ InvokeMethod = typing.Callable[..., any]
 
 
 class CallableImpl(object):
-    def __init__(self, impl_class, conn: ConnectionInfo, pool: Pool, statistic=None):
+    def __init__(self, impl_class, conn: ConnectionInfo, pool: Pool,
+                 statistic: typing.Union[ImplStatistic, None] = None,
+                 policy: typing.Union[InvokePolicy, None] = None):
         """
         impl 是具体 RPC 的实现类，conn 是当前实现类使用的连接信息， pool 是该连接所在的
-        连接池, statistic 是该服务的调用统计信息
+        连接池, statistic 是该服务的调用统计信息, policy 是调用的重试、对冲及熔断策略,
+        CallableImpl 会被缓存并在线程间共享, 因此每次调用时才从 conn 租借连接, 调用结束后归还
         """
         self.impl = impl_class
-        self.impl_instance = None
         self.conn = conn
         self.pool = pool
         self.statistic = statistic
-        self.try_pool_again()
+        self.policy_state: typing.Union[PolicyState, None] = None
+        # 出现这些异常时认为连接已不可用, 有调用策略时为其中可重试的异常
+        self.useless_on: typing.Tuple[typing.Type[BaseException], ...] = CONNECTION_ERRORS
+        # 每个线程最近使用的连接及其 impl 实例, 再次租借到同一个连接时复用实例
+        self._local = threading.local()
+        self.set_policy(policy)
+
+    def set_policy(self, policy: typing.Union[InvokePolicy, None]):
+        self.policy_state = PolicyState(policy) if policy else None
+        self.useless_on = policy.retry.retry_on if policy else CONNECTION_ERRORS
+
+    @property
+    def impl_instance(self):
+        """
+        当前线程最近一次调用所使用的 impl 实例
+        """
+        return getattr(self._local, "instance", None)
+
+    def instance(self, conn):
+        """
+        conn 对应的 impl 实例
+        """
+        local = self._local
+        if getattr(local, "conn", None) is not conn:
+            local.conn, local.instance = conn, self.impl(conn)
+        return local.instance
+
+    def endpoint_key(self) -> typing.Hashable:
+        """
+        当前连接所对应的节点, 用于区分熔断器
+        """
+        endpoint = getattr(self.conn, "endpoint", None)
+        if endpoint is not None:
+            return endpoint.address
+        return getattr(self.conn, "key", None) or id(self.conn)
 
     def has_action(self, action: str):
-        if not self.impl_instance:
-            self.try_pool_again()
-        return hasattr(self.impl_instance, action)
+        if hasattr(self.impl, action):
+            return True
+        # action 不是类的属性时, 需要通过实例判断
+        conn = self.conn.get_conn()
+        try:
+            return hasattr(self.instance(conn), action)
+        finally:
+            self.conn.release()
 
     def try_pool_again(self):
         """
-        尝试从 Pool 中获取可用的连接信息
+        报告当前线程使用的连接不可用, 下一次调用时将重新获取连接
         """
         # GRPCConn 的 get_conn 本身使用了服务发现的策略，能够尝试切换连接
-        if self.impl_instance:
-            self.conn.useless()
-        conn = self.conn.get_conn()
-        self.impl_instance = self.impl(conn)
+        self.conn.useless()
+        self._local.conn = self._local.instance = None
 
     def __call__(self, action: str, *args, **kwargs):
         """
@@ -46,12 +91,170 @@ class CallableImpl(object):
         调整 conn 跟 pool 的信息
         """
 
-        invoke_method: InvokeMethod = kwargs.get("invoke_method")
+        invoke_method: InvokeMethod = kwargs.pop("invoke_method", None)
+        if self.statistic is None:
+            return self._call(action, invoke_method, args, kwargs)
+
+        stat = self.statistic.action(action)
+        start = stat.start()
+        ok = False
+        try:
+            result = self._call(action, invoke_method, args, kwargs)
+            ok = True
+            return result
+        finally:
+            stat.finish(start, ok)
+
+    async def acall(self, action: str, *args, **kwargs):
+        """
+        __call__ 的异步版本, action 返回的 awaitable 会在统计及调用策略中等待完成,
+        因此耗时、重试及熔断都以实际的执行结果为准
+        """
+        invoke_method: InvokeMethod = kwargs.pop("invoke_method", None)
+        if self.statistic is None:
+            return await self._acall(action, invoke_method, args, kwargs)
+
+        stat = self.statistic.action(action)
+        start = stat.start()
+        ok = False
+        try:
+            result = await self._acall(action, invoke_method, args, kwargs)
+            ok = True
+            return result
+        finally:
+            stat.finish(start, ok)
+
+    def _call(self, action: str, invoke_method: typing.Union[InvokeMethod, None], args, kwargs):
+        if self.policy_state is None:
+            return self.invoke(action, invoke_method, args, kwargs)
+        return self.invoke_with_policy(action, invoke_method, args, kwargs)
+
+    async def _acall(self, action: str, invoke_method: typing.Union[InvokeMethod, None], args, kwargs):
+        if self.policy_state is None:
+            return await self.ainvoke(action, invoke_method, args, kwargs)
+        return await self.ainvoke_with_policy(action, invoke_method, args, kwargs)
+
+    @staticmethod
+    def call_instance(instance, action: str, invoke_method: typing.Union[InvokeMethod, None], args, kwargs):
         if invoke_method:
-            kwargs.pop("invoke_method")
-            return invoke_method(self.impl_instance, action, *args, **kwargs)
+            return invoke_method(instance, action, *args, **kwargs)
         else:
-            return getattr(self.impl_instance, action)(*args, **kwargs)
+            return getattr(instance, action)(*args, **kwargs)
+
+    def _begin(self) -> typing.Tuple[typing.Any, typing.Union[CircuitBreaker, None]]:
+        """
+        租借连接并返回其 impl 实例, 有调用策略时检查连接所在节点的熔断器,
+        熔断器打开时归还连接并抛出 CircuitOpenError, 连接本身没有问题, 因此不会被关闭
+        """
+        info = self.conn
+        instance = self.instance(info.get_conn())
+        breaker = None
+        if self.policy_state is not None:
+            key = self.endpoint_key()
+            breaker = self.policy_state.breaker(key)
+            if breaker is not None and not breaker.allow():
+                # 没有发送请求, 不记录耗时
+                info.release(False)
+                raise CircuitOpenError(f"{key} 的熔断器已打开")
+        return instance, breaker
+
+    def _end(self, action: str, breaker: typing.Union[CircuitBreaker, None], start: float,
+             error: typing.Union[BaseException, None] = None):
+        """
+        归还连接, useless_on 中的异常说明连接已不可用, 会关闭并移除该连接,
+        熔断器放行的调用无论结果如何都会记录, 否则半开状态的探测名额不会被释放
+        """
+        info = self.conn
+        if error is None:
+            if self.policy_state is not None:
+                self.policy_state.latency(action).add(time.perf_counter() - start)
+            info.release()
+            if breaker is not None:
+                breaker.record_success()
+        elif isinstance(error, self.useless_on):
+            info.useless()
+            if breaker is not None:
+                breaker.record_failure()
+        else:
+            info.release(False)
+            if breaker is not None:
+                breaker.record_ignored()
+
+    def invoke(self, action: str, invoke_method: typing.Union[InvokeMethod, None], args, kwargs):
+        """
+        租借连接并执行一次调用, 调用结束后归还连接,
+        对冲请求在 hedge_pool 的线程中执行, 因此每个请求都会租借各自的连接, 可能来自不同的节点
+        """
+        instance, breaker = self._begin()
+        start = time.perf_counter()
+        try:
+            result = self.call_instance(instance, action, invoke_method, args, kwargs)
+        except BaseException as e:
+            self._end(action, breaker, start, e)
+            raise
+        self._end(action, breaker, start)
+        return result
+
+    async def ainvoke(self, action: str, invoke_method: typing.Union[InvokeMethod, None], args, kwargs):
+        """
+        invoke 的异步版本, 在返回的 awaitable 完成后才归还连接,
+        每个对冲请求为单独的 asyncio 任务, 同样会租借各自的连接
+        """
+        instance, breaker = self._begin()
+        start = time.perf_counter()
+        try:
+            result = self.call_instance(instance, action, invoke_method, args, kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+        except BaseException as e:
+            self._end(action, breaker, start, e)
+            raise
+        self._end(action, breaker, start)
+        return result
+
+    def invoke_with_policy(self, action: str, invoke_method: typing.Union[InvokeMethod, None], args, kwargs):
+        """
+        按调用策略执行, 可重试的异常在等待随机的退避时间后重新租借连接重试,
+        熔断器打开时不发送请求, 同样在退避后重试, 负载均衡时可能选择其他的节点,
+        幂等的 action 会在超过 p95 耗时后发出对冲请求
+        """
+        state = self.policy_state
+        policy = state.policy
+        retry = policy.retry
+        hedge = policy.hedge is not None and policy.is_idempotent(action)
+        call = functools.partial(self.invoke, action, invoke_method, args, kwargs)
+
+        attempt = 0
+        while True:
+            try:
+                return state.hedged(action, call) if hedge else call()
+            except Exception as e:
+                open_circuit = isinstance(e, CircuitOpenError)
+                attempt += 1
+                if not (open_circuit or retry.should_retry(e)) or attempt >= retry.max_attempts:
+                    raise
+                retry.sleep(retry.delay(attempt - 1))
+
+    async def ainvoke_with_policy(self, action: str, invoke_method: typing.Union[InvokeMethod, None], args, kwargs):
+        """
+        invoke_with_policy 的异步版本
+        """
+        state = self.policy_state
+        policy = state.policy
+        retry = policy.retry
+        hedge = policy.hedge is not None and policy.is_idempotent(action)
+        call = functools.partial(self.ainvoke, action, invoke_method, args, kwargs)
+
+        attempt = 0
+        while True:
+            try:
+                return await (state.ahedged(action, call) if hedge else call())
+            except Exception as e:
+                open_circuit = isinstance(e, CircuitOpenError)
+                attempt += 1
+                if not (open_circuit or retry.should_retry(e)) or attempt >= retry.max_attempts:
+                    raise
+                await retry.asleep(retry.delay(attempt - 1))
 
 
 class CallableAction(object):
@@ -63,5 +266,17 @@ class CallableAction(object):
     def set_invoke(self, invoke: InvokeMethod):
         self.invoke = invoke
 
+    @property
+    def statistic(self) -> typing.Union[ActionStatistic, None]:
+        """
+        该 action 的调用统计, 没有开启统计时为 None
+        """
+        if self.impl.statistic is None:
+            return None
+        return self.impl.statistic.action(self.action)
+
     def __call__(self, *args, **kwargs):
         return self.impl(self.action, invoke_method=self.invoke,  *args, **kwargs)
+
+    async def acall(self, *args, **kwargs):
+        return await self.impl.acall(self.action, invoke_method=self.invoke, *args, **kwargs)
@@ -0,0 +1,95 @@
+"""
+参数的规范编码, 相同内容的参数总是得到相同的编码, 用于请求合并及响应缓存的 key
+"""
+
+import enum
+import hashlib
+import struct
+import typing
+
+
+class NotCanonicalError(TypeError):
+    """
+    参数中包含无法规范编码的值
+    """
+    pass
+
+
+def _encode(obj, out: typing.List[bytes], seen: typing.Set[int]):
+    if obj is None:
+        out.append(b"N")
+    elif obj is True:
+        out.append(b"T")
+    elif obj is False:
+        out.append(b"F")
+    elif isinstance(obj, enum.Enum):
+        out.append(b"E")
+        _encode(obj.value, out, seen)
+    elif isinstance(obj, int):
+        data = str(obj).encode("ascii")
+        out.append(b"i%d:" % len(data))
+        out.append(data)
+    elif isinstance(obj, float):
+        out.append(b"f")
+        out.append(struct.pack(">d", obj))
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        out.append(b"s%d:" % len(data))
+        out.append(data)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        out.append(b"b%d:" % len(data))
+        out.append(data)
+    else:
+        if id(obj) in seen:
+            raise NotCanonicalError("参数中存在循环引用")
+        seen.add(id(obj))
+        if isinstance(obj, (list, tuple)):
+            out.append(b"l%d:" % len(obj))
+            for item in obj:
+                _encode(item, out, seen)
+        elif isinstance(obj, (set, frozenset)):
+            items = sorted(canonical(item) for item in obj)
+            out.append(b"S%d:" % len(items))
+            out.extend(items)
+        elif isinstance(obj, dict):
+            _encode_dict(obj, out, seen, b"d")
+        elif hasattr(obj, "__dict__"):
+            # 与 convert2builtin 一致, 忽略以 _ 开头的属性及方法
+            out.append(b"o")
+            _encode(type(obj).__qualname__, out, seen)
+            _encode_dict({k: v for k, v in obj.__dict__.items() if not k.startswith("_") and not callable(v)},
+                         out, seen, b"d")
+        else:
+            raise NotCanonicalError(f"无法规范编码 {type(obj).__name__} 类型的值")
+        seen.discard(id(obj))
+
+
+def _encode_dict(obj: dict, out: typing.List[bytes], seen: typing.Set[int], tag: bytes):
+    items = []
+    for key, value in obj.items():
+        if not isinstance(key, str):
+            raise NotCanonicalError(f"dict 的 key 必须是 str, 而不是 {type(key).__name__}")
+        items.append((key, value))
+    items.sort(key=lambda kv: kv[0])
+    out.append(tag + b"%d:" % len(items))
+    for key, value in items:
+        _encode(key, out, seen)
+        _encode(value, out, seen)
+
+
+def canonical(obj) -> bytes:
+    """
+    规范编码, dict 按 key 排序, set 按元素的编码排序, 对象按其公开属性编码,
+    无法编码时抛出 NotCanonicalError
+    """
+    out: typing.List[bytes] = []
+    _encode(obj, out, set())
+    return b"".join(out)
+
+
+def canonical_hash(obj) -> bytes:
+    """
+    规范编码的 128 位摘要
+    """
+    return hashlib.blake2b(canonical(obj), digest_size=16).digest()
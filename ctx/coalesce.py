@@ -0,0 +1,135 @@
+"""
+请求合并, 并发的相同调用(服务、action、identity 及规范编码后的参数都相同)只会调用一次后端,
+其余的调用等待并共享同一个结果或异常
+"""
+
+import asyncio
+import threading
+import typing
+
+from .cache import _Flight
+from .canonical import canonical_hash, NotCanonicalError
+
+CoalesceKey = typing.Tuple[str, str, str, typing.Any, bytes]
+
+
+class Coalescer(object):
+    """
+    actions 为开启合并的 action, 格式为 "impl_name.action_name" 或 "impl_name.*", 为 True 时所有 action 都开启,
+    注意合并的调用之间共享同一个结果对象, 调用方不应修改返回值
+    """
+
+    def __init__(self, actions: typing.Union[bool, typing.Iterable[str]] = ()):
+        self._all = actions is True
+        self._actions: typing.Set[str] = set() if isinstance(actions, bool) else set(actions)
+        self._flights: typing.Dict[CoalesceKey, _Flight] = {}
+        # 异步调用的合并按事件循环区分, key 为 (事件循环, CoalesceKey)
+        self._aflights: typing.Dict[typing.Tuple[int, CoalesceKey], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        # (impl_name, action_name) 的调用次数及被合并而节省的调用次数
+        self._calls: typing.Dict[typing.Tuple[str, str], int] = {}
+        self._saved: typing.Dict[typing.Tuple[str, str], int] = {}
+
+    def enable(self, impl_name: str, action_name: str = "*"):
+        self._actions.add(f"{impl_name}.{action_name}")
+
+    def disable(self, impl_name: str, action_name: str = "*"):
+        self._actions.discard(f"{impl_name}.{action_name}")
+
+    def enabled(self, impl_name: str, action_name: str) -> bool:
+        if self._all:
+            return True
+        return f"{impl_name}.{action_name}" in self._actions or f"{impl_name}.*" in self._actions
+
+    def call(self, impl_name: str, action_name: str, identity: str, host, args,
+             invoke: typing.Callable[[], typing.Any]) -> typing.Any:
+        """
+        合并执行 invoke, 参数无法规范编码时不合并, 直接调用
+        """
+        try:
+            key = (impl_name, action_name, identity, id(host) if host else None, canonical_hash(args))
+        except NotCanonicalError:
+            return invoke()
+
+        name = (impl_name, action_name)
+        with self._lock:
+            self._calls[name] = self._calls.get(name, 0) + 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+            else:
+                self._saved[name] = self._saved.get(name, 0) + 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = invoke()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def acall(self, impl_name: str, action_name: str, identity: str, host, args,
+                    invoke: typing.Callable[[], typing.Awaitable[typing.Any]]) -> typing.Any:
+        """
+        call 的异步版本, 合并同一个事件循环中的相同调用
+        """
+        try:
+            key = (impl_name, action_name, identity, id(host) if host else None, canonical_hash(args))
+        except NotCanonicalError:
+            return await invoke()
+
+        loop = asyncio.get_running_loop()
+        key = (id(loop), key)
+        name = (impl_name, action_name)
+        with self._lock:
+            self._calls[name] = self._calls.get(name, 0) + 1
+            flight = self._aflights.get(key)
+            leader = flight is None
+            if leader:
+                flight = loop.create_future()
+                self._aflights[key] = flight
+            else:
+                self._saved[name] = self._saved.get(name, 0) + 1
+
+        if not leader:
+            # 等待方被取消时不应取消共享的结果
+            return await asyncio.shield(flight)
+
+        try:
+            result = await invoke()
+            flight.set_result(result)
+            return result
+        except BaseException as e:
+            flight.set_exception(e)
+            # 没有等待方时避免 "exception was never retrieved" 的警告
+            flight.exception()
+            raise
+        finally:
+            with self._lock:
+                self._aflights.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._flights) + len(self._aflights)
+
+    def snapshot(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        """
+        每个 action 的调用次数及节省的后端调用次数, 格式为 {"impl_name.action_name": {"calls": n, "saved": n}}
+        """
+        with self._lock:
+            return {f"{impl}.{action}": {"calls": calls, "saved": self._saved.get((impl, action), 0)}
+                    for (impl, action), calls in self._calls.items()}
+
+    def saved(self) -> int:
+        with self._lock:
+            return sum(self._saved.values())
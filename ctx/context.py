@@ -3,18 +3,152 @@
 及通过基类提供基础类库的基础封装功能
 """
 
+import contextvars
+import functools
+import threading
+import time
 import typing
+import weakref
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
 
 from ..logger import Logger
-from ..trace import TraceInfo
+from ..trace import TraceInfo, Span, SpanCollector
 from .cache import ContextCache
 from ..pool.host_info import HostInfo
+from ..pool.pool import detached_context
+
+# 当前正在执行的调用所属的上下文, 服务实现及 invoke_method 可通过 current_context 获取子调用的 TraceInfo
+_current: contextvars.ContextVar = contextvars.ContextVar("ds_define_context", default=None)
+
+# (impl_name, action_name, args) 或 (impl_name, action_name, args, identity)
+CallSpec = typing.Tuple[typing.Any, ...]
+
+# call_many 默认使用的共享线程池
+_call_pool: typing.Union[ThreadPoolExecutor, None] = None
+_call_pool_lock = threading.Lock()
+CALL_POOL_SIZE = 16
+# 当前线程是否正在执行 call_many 中的调用
+_in_call: contextvars.ContextVar = contextvars.ContextVar("ds_define_in_call", default=False)
 
 
 def _empty() -> typing.Union['Context', None]:
     return None
 
 
+def current_context() -> typing.Union['Context', None]:
+    return _current.get()
+
+
+def call_pool() -> ThreadPoolExecutor:
+    """
+    获取 call_many 共享的线程池, 线程数为 CALL_POOL_SIZE
+    """
+    global _call_pool
+    if _call_pool is None:
+        with _call_pool_lock:
+            if _call_pool is None:
+                _call_pool = ThreadPoolExecutor(max_workers=CALL_POOL_SIZE, thread_name_prefix="ctx-call")
+    return _call_pool
+
+
+class CallResult(object):
+    """
+    call_many 中单个调用的结果, ok 为 False 时 error 为调用抛出的异常,
+    超时的调用 error 为 concurrent.futures.TimeoutError
+    """
+
+    def __init__(self, trace_info: TraceInfo):
+        self.trace_info = trace_info
+        self.ok = False
+        self.value: typing.Any = None
+        self.error: typing.Union[BaseException, None] = None
+        self.seconds = 0.0
+
+    def get(self) -> typing.Any:
+        """
+        获取调用的结果, 调用失败时抛出对应的异常
+        """
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def __repr__(self):
+        state = "ok" if self.ok else f"error: {self.error!r}"
+        return f"CallResult({self.trace_info.identifier}, {state}, seconds: {self.seconds:.6f})"
+
+
+class _PendingCall(object):
+    """
+    call_many 中正在等待的调用, 执行的线程将结果写入私有的 CallResult, 只有在时限内完成时才会复制到 result 中,
+    超时由等待的线程或执行的线程中先发现的一方记录, 之后的结果会被丢弃
+    """
+
+    def __init__(self, result: CallResult, deadline: typing.Union[float, None],
+                 call_timeout: typing.Union[float, None]):
+        self.result = result
+        self.future: typing.Union[Future, None] = None
+        # 执行该调用的函数, 嵌套的 call_many 在当前线程中执行尚未开始的调用
+        self.run: typing.Union[typing.Callable[[], None], None] = None
+        self._deadline = deadline
+        self._call_timeout = call_timeout
+        self._cond = threading.Condition()
+        self._started: typing.Union[float, None] = None
+        self._settled = False
+
+    def deadline(self) -> typing.Union[float, None]:
+        deadline = self._deadline
+        if self._started is not None and self._call_timeout is not None:
+            call_deadline = self._started + self._call_timeout
+            deadline = min(deadline, call_deadline) if deadline is not None else call_deadline
+        return deadline
+
+    def start(self) -> bool:
+        """
+        开始执行, 已经超时的调用返回 False 且不再执行
+        """
+        with self._cond:
+            now = time.monotonic()
+            if self._settled or (self._deadline is not None and now >= self._deadline):
+                self._timeout(now)
+                return False
+            self._started = now
+            self._cond.notify_all()
+            return True
+
+    def finish(self, result: CallResult):
+        with self._cond:
+            if self._settled:
+                return
+            now = time.monotonic()
+            deadline = self.deadline()
+            if deadline is not None and now > deadline:
+                self._timeout(now)
+                return
+            self.result.ok, self.result.value, self.result.error = result.ok, result.value, result.error
+            self.result.seconds = now - self._started
+            self._settled = True
+            self._cond.notify_all()
+
+    def wait(self):
+        with self._cond:
+            while not self._settled:
+                deadline = self.deadline()
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self.future.cancel()
+                    self._timeout(time.monotonic())
+                    break
+                self._cond.wait(remaining)
+
+    def _timeout(self, now: float):
+        if self._settled:
+            return
+        self.result.error = FutureTimeoutError()
+        self.result.seconds = now - self._started if self._started is not None else 0.0
+        self._settled = True
+        self._cond.notify_all()
+
+
 class Context(object):
     """
     上下文类，记录了当前调用的各种信息，如当前关联的 RPC 服务及其调用状况,
@@ -25,13 +159,15 @@ class Context(object):
                  servicer_cache: ContextCache = None,
                  logger=None,
                  impl_context=None,
-                 host: typing.Union[HostInfo, None] = None):
+                 host: typing.Union[HostInfo, None] = None,
+                 collector: typing.Union[SpanCollector, None] = None):
         """
         构建一个上下文对象， trace_info 用于记录调用状况，
         prev 是当前上下文的上一级上下文，用于关联多个调用
         cache 是上下文的缓存管理器，一般只有库开发人员会使用
         当没有传递 trace_info, 但传递了 prev 时， 会使用 prev 的 trace_info 来构建新一级的 trace_info
         impl_context 是服务具体实现的上下文，他的具体类型由实现框架决定
+        collector 用于收集调用的 span, 子上下文没有传递时使用上一级的 collector, 为 None 时不记录 span
         TODO: 考虑为服务具体上下文增加基础接口定义
         :param trace_info:
         :param prev:
@@ -48,18 +184,32 @@ class Context(object):
         self._impl_context = impl_context
         self._host = host
 
+        # 创建时即从上一级获取 root 的缓存管理器、最近的 logger 及 host, 避免每次调用都沿着 prev 链查找,
+        # 缓存管理器为直接引用, 因此 root 被回收后子上下文仍然可以正常调用
+        parent = prev()
+        if parent is not None:
+            self._root_client_cache = parent._root_client_cache
+            self._root_servicer_cache = parent._root_servicer_cache
+            # 当前及上一级的 logger, 当前的 logger 被回收后继续使用上一级的 logger
+            self._loggers = ((logger,) if logger else ()) + parent._loggers
+            self._resolved_host = host or parent._resolved_host
+            self._resolved_collector = collector or parent._resolved_collector
+        else:
+            self._root_client_cache = client_cache
+            self._root_servicer_cache = servicer_cache
+            self._loggers = (logger,) if logger else ()
+            self._resolved_host = host
+            self._resolved_collector = collector
+
     @property
     def logger(self) -> typing.Union[Logger, None]:
         """
-        获取日志记录接口
+        获取日志记录接口, 即当前或最近的上一级上下文的 logger
         """
-        if self._logger():
-            return self._logger()
-
-        prev = self._prev()
-        if prev:
-            return prev.logger
-
+        for ref in self._loggers:
+            logger = ref()
+            if logger:
+                return logger
         return None
 
     @property
@@ -72,15 +222,134 @@ class Context(object):
         对 get_impl 的简易封装, 便于客户端调用, 获取客户端实现类,
         host 用于指定调用的服务地址, 不传递时将使用服务发现来查找服务地址
         identity 作为构建缓存及服务发现的标识符，当不传递时，使用 impl_name 作为标识，
+        client_cache 配置了 coalescer 时, 并发的相同调用会合并为一次调用,
+        配置了 collector 时, 会在新的子上下文中调用并记录其 span
         :param identity
         :param impl_name:
         :param action_name:
         :param args:
         :return:
         """
+        collector = self._resolved_collector
+        if collector is not None and collector.wants(self._trace_info):
+            return self.child(f"{impl_name}.{action_name}")._traced(impl_name, action_name, args, identity)
+        return self._invoke(impl_name, action_name, args, identity)
+
+    def _invoke(self, impl_name: str, action_name: str, args, identity: str = ""):
         impl = self.get_client_impl(impl_name, action_name, self._host, identity)
+        coalescer = self._root_client_cache.coalescer
+        if coalescer is not None and coalescer.enabled(impl_name, action_name):
+            return coalescer.call(impl_name, action_name, identity, self._resolved_host, args,
+                                  lambda: impl(args))
         return impl(args)
 
+    def _traced(self, impl_name: str, action_name: str, args, identity: str = ""):
+        """
+        以当前上下文的 trace_info 记录本次调用的 span
+        """
+        span = self.start_span({"impl": impl_name, "action": action_name})
+        token = _current.set(self)
+        try:
+            result = self._invoke(impl_name, action_name, args, identity)
+        except BaseException as e:
+            self.finish_span(span, e)
+            raise
+        finally:
+            _current.reset(token)
+        self.finish_span(span)
+        return result
+
+    def start_span(self, attributes: typing.Dict[str, typing.Any] = None) -> typing.Union[Span, None]:
+        """
+        为当前上下文开始一个 span, 没有 collector 或 trace_info, 以及调用链未被采样且没有尾部采样时返回 None
+        """
+        collector = self._resolved_collector
+        if collector is None or self._trace_info is None or not collector.wants(self._trace_info):
+            return None
+        return Span(self._trace_info, attributes, self._prev() is None)
+
+    def finish_span(self, span: typing.Union[Span, None], error: typing.Union[BaseException, None] = None):
+        if span is None:
+            return
+        span.finish(error)
+        self._resolved_collector.add(span)
+
+    def span(self, attributes: typing.Dict[str, typing.Any] = None) -> 'SpanScope':
+        """
+        使用 with 语句记录当前上下文的 span, 如服务端处理一次请求的耗时
+        """
+        return SpanScope(self, attributes)
+
+    def child(self, identifier: str, host: typing.Union[HostInfo, None] = None) -> 'Context':
+        """
+        创建子上下文, 并为其分配下一级的 span id
+        """
+        if self._trace_info:
+            trace_info = TraceInfo.from_exists(self._trace_info, identifier)
+        else:
+            trace_info = TraceInfo(identifier)
+        return Context(trace_info, weakref.ref(self), host=host or self._host)
+
+    def call_many(self, calls: typing.List[CallSpec],
+                  timeout: typing.Union[float, None] = None,
+                  call_timeout: typing.Union[float, None] = None,
+                  executor: typing.Union[ThreadPoolExecutor, None] = None) -> typing.List[CallResult]:
+        """
+        在共享的线程池中并发执行多个互不依赖的调用, 并按 calls 的顺序返回每个调用的 CallResult,
+        calls 中的每一项为 (impl_name, action_name, args) 或 (impl_name, action_name, args, identity),
+        timeout 为所有调用的总时限, call_timeout 为单个调用从开始执行时计算的时限, 排队的时间不计算在内,
+        单个调用的失败或超时只会记录在其 CallResult 中, 不会影响其他的调用,
+        在 call_many 的调用中再次调用 call_many 时, 尚未开始的调用会在当前线程中执行, 避免线程池被占满后互相等待,
+        注意已经开始执行的调用超时后仍会在线程池中执行完毕, 但其结果不会再写入 CallResult
+        :param calls:
+        :param timeout:
+        :param call_timeout:
+        :param executor:
+        :return:
+        """
+        executor = executor or call_pool()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        nested = _in_call.get()
+
+        pending: typing.List[_PendingCall] = []
+        for call in calls:
+            impl_name, action_name, args = call[:3]
+            identity = call[3] if len(call) > 3 else ""
+            # span id 在提交之前按顺序分配
+            child = self.child(f"{impl_name}.{action_name}")
+            p = _PendingCall(CallResult(child.trace_info), deadline, call_timeout)
+            p.run = functools.partial(
+                detached_context().run, child._run_call, p, impl_name, action_name, args, identity
+            )
+            p.future = executor.submit(p.run)
+            pending.append(p)
+
+        for p in pending:
+            if nested and p.future.cancel():
+                p.run()
+            else:
+                p.wait()
+        return [p.result for p in pending]
+
+    def _run_call(self, pending: '_PendingCall', impl_name: str, action_name: str, args, identity: str):
+        if not pending.start():
+            return
+        result = CallResult(self._trace_info)
+        token = _current.set(self)
+        in_call = _in_call.set(True)
+        try:
+            if self._resolved_collector is not None and self._resolved_collector.wants(self._trace_info):
+                result.value = self._traced(impl_name, action_name, args, identity)
+            else:
+                result.value = self._invoke(impl_name, action_name, args, identity)
+            result.ok = True
+        except Exception as e:
+            result.error = e
+        finally:
+            _in_call.reset(in_call)
+            _current.reset(token)
+            pending.finish(result)
+
     def get_callable(self, impl_name: str, action_name: str, identity: str = "", host: HostInfo = None):
         """
         获取 Impl 的 Action，可用于直接调用，同时可从 Action 中得到
@@ -89,38 +358,34 @@ class Context(object):
         return self.get_client_impl(impl_name, action_name, host or self._host, identity)
 
     def reg_client_impl(self, impl_name: str, impl):
-        prev = self._prev()
-        if prev:
-            prev.reg_client_impl(impl_name, impl)
-        else:
-            self._client_cache.set(impl_name, impl)
+        self._root_client_cache.set(impl_name, impl)
 
     def reg_servicer_impl(self, impl_name: str, impl):
-        prev = self._prev()
-        if prev:
-            prev.reg_servicer_impl(impl_name, impl)
-        else:
-            self._servicer_cache.set(impl_name, impl)
+        self._root_servicer_cache.set(impl_name, impl)
 
     def get_client_impl(
             self, impl_name: str,
             action_name: str,
             host: HostInfo = None,
             identity: str = ""):
-        prev = self._prev()
-        if prev:
-            impl = prev.get_client_impl(impl_name, action_name, host or self._host, identity)
-            return impl
-
-        return self._client_cache.get(impl_name, action_name, host or self._host, identity)
+        return self._root_client_cache.get(impl_name, action_name, host or self._resolved_host, identity)
 
     def get_servicer_impl(self, impl_name: str, action_name: str):
-        prev = self._prev()
-        if prev:
-            impl = prev.get_servicer_impl(impl_name, action_name)
-            return impl
+        return self._root_servicer_cache.get(impl_name, action_name)
+
+
+class SpanScope(object):
+    def __init__(self, context: Context, attributes: typing.Dict[str, typing.Any] = None):
+        self.context = context
+        self.attributes = attributes
+        self.span: typing.Union[Span, None] = None
+
+    def __enter__(self) -> typing.Union[Span, None]:
+        self.span = self.context.start_span(self.attributes)
+        return self.span
 
-        return self._servicer_cache.get(impl_name, action_name)
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.context.finish_span(self.span, exc_val)
 
 
 # Context 弱引用的声明
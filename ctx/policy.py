@@ -0,0 +1,285 @@
+"""
+CallableImpl 的调用策略, 包括带随机退避的重试、针对幂等 action 的对冲请求(hedging)
+以及按节点划分的熔断器
+"""
+
+import asyncio
+import random
+import threading
+import time
+import typing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+from ..pool.pool import CONNECTION_ERRORS, NoUsefulConnectionError
+
+# 对冲请求使用的共享线程池
+_hedge_pool: typing.Union[ThreadPoolExecutor, None] = None
+_hedge_pool_lock = threading.Lock()
+HEDGE_POOL_SIZE = 16
+
+
+def hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="ctx-hedge")
+    return _hedge_pool
+
+
+class CircuitOpenError(Exception):
+    """
+    节点的熔断器处于打开状态, 调用没有被发送
+    """
+    pass
+
+
+# 默认重试的异常, 只包括连接及传输层的错误, 服务返回的业务异常重试也不会成功
+RETRY_ON = CONNECTION_ERRORS + (NoUsefulConnectionError,)
+
+
+class RetryPolicy(object):
+    """
+    重试策略, 最多调用 max_attempts 次, 第 n 次重试前等待 [0, min(max_backoff, backoff * 2^n)) 之间的随机时间,
+    只有 retry_on 中的异常才会重试, 这些异常同时说明连接已不可用, 会关闭当前的连接, 重试时重新租借连接
+    """
+
+    def __init__(self, max_attempts: int = 3,
+                 backoff: float = 0.05,
+                 max_backoff: float = 1.0,
+                 retry_on: typing.Tuple[typing.Type[BaseException], ...] = RETRY_ON,
+                 rand: random.Random = None,
+                 sleep: typing.Callable[[float], None] = time.sleep,
+                 asleep: typing.Callable[[float], typing.Awaitable[None]] = asyncio.sleep):
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on
+        self._rand = rand or random.Random()
+        self.sleep = sleep
+        # 异步调用重试前的等待
+        self.asleep = asleep
+
+    def delay(self, attempt: int) -> float:
+        return self._rand.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def should_retry(self, error: BaseException) -> bool:
+        return isinstance(error, self.retry_on)
+
+
+class LatencyWindow(object):
+    """
+    最近 size 次调用的耗时, 用于计算对冲请求的等待时间
+    """
+
+    def __init__(self, size: int = 200):
+        self._samples: typing.Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def quantile(self, q: float) -> typing.Union[float, None]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class HedgePolicy(object):
+    """
+    对冲策略, 调用超过该 action 最近耗时的 quantile 分位数(默认 p95)仍未返回时, 再发出一个相同的请求,
+    使用先成功返回的结果, 样本数少于 min_samples 时使用 initial_delay, 等待时间不小于 min_delay
+    只应该对幂等的 action 使用
+    """
+
+    def __init__(self, quantile: float = 0.95,
+                 max_hedges: int = 1,
+                 min_samples: int = 20,
+                 initial_delay: float = 0.1,
+                 min_delay: float = 0.001,
+                 window: int = 200):
+        self.quantile = quantile
+        self.max_hedges = max_hedges
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.window = window
+
+    def delay(self, latency: LatencyWindow) -> float:
+        if len(latency) < self.min_samples:
+            return self.initial_delay
+        return max(latency.quantile(self.quantile), self.min_delay)
+
+
+class CircuitBreaker(object):
+    """
+    熔断器, 连续失败 failure_threshold 次后打开, 打开 reset_timeout 秒后进入半开状态,
+    半开状态最多同时放行 half_open_max 个探测请求, 探测成功则关闭, 失败则重新打开,
+    allow 放行的每个调用都需要以 record_success、record_failure 或 record_ignored 之一记录结果
+    """
+    Closed = "closed"
+    Open = "open"
+    HalfOpen = "half_open"
+
+    def __init__(self, failure_threshold: int = 5,
+                 reset_timeout: float = 30,
+                 half_open_max: int = 1,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.Closed
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.Open:
+                if self._clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state, self.probes = self.HalfOpen, 0
+
+            if self.state == self.HalfOpen:
+                if self.probes >= self.half_open_max:
+                    return False
+                self.probes += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self.probes = self.Closed, 0, 0
+
+    def record_ignored(self):
+        """
+        放行的调用没有得到能够说明节点状态的结果, 如业务异常, 只释放其占用的探测名额
+        """
+        with self._lock:
+            if self.state == self.HalfOpen and self.probes > 0:
+                self.probes -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HalfOpen or self.failures >= self.failure_threshold:
+                self.state, self.opened_at, self.probes = self.Open, self._clock(), 0
+
+    def __repr__(self):
+        return f"CircuitBreaker({self.state}, failures: {self.failures})"
+
+
+class InvokePolicy(object):
+    """
+    CallableImpl 的调用策略, retry 为重试策略, hedge 为对冲策略, 只对 idempotent 中的 action 生效,
+    idempotent 为 True 时所有 action 都视为幂等, breaker 用于为每个节点创建熔断器, 为 None 时不熔断
+    """
+
+    def __init__(self, retry: typing.Union[RetryPolicy, None] = None,
+                 hedge: typing.Union[HedgePolicy, None] = None,
+                 idempotent: typing.Union[bool, typing.Iterable[str]] = False,
+                 breaker: typing.Union[typing.Callable[[], CircuitBreaker], None] = None):
+        self.retry = retry or RetryPolicy(max_attempts=1)
+        self.hedge = hedge
+        self._idempotent = idempotent if isinstance(idempotent, bool) else set(idempotent)
+        self.breaker = breaker
+
+    def is_idempotent(self, action: str) -> bool:
+        if isinstance(self._idempotent, bool):
+            return self._idempotent
+        return action in self._idempotent
+
+
+class PolicyState(object):
+    """
+    CallableImpl 中调用策略的运行时状态, 包括每个节点的熔断器及每个 action 的耗时
+    """
+
+    def __init__(self, policy: InvokePolicy):
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._breakers: typing.Dict[typing.Hashable, CircuitBreaker] = {}
+        self._latency: typing.Dict[str, LatencyWindow] = {}
+
+    def breaker(self, endpoint: typing.Hashable) -> typing.Union[CircuitBreaker, None]:
+        if self.policy.breaker is None:
+            return None
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self.policy.breaker()
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def latency(self, action: str) -> LatencyWindow:
+        window = self._latency.get(action)
+        if window is None:
+            with self._lock:
+                window = self._latency.setdefault(action, LatencyWindow(self.policy.hedge.window
+                                                                        if self.policy.hedge else 200))
+        return window
+
+    def hedged(self, action: str, invoke: typing.Callable[[], typing.Any]) -> typing.Any:
+        """
+        执行对冲请求, 返回第一个成功的结果, 所有请求都失败时抛出第一个请求的异常
+        """
+        hedge = self.policy.hedge
+        delay = hedge.delay(self.latency(action))
+        futures: typing.List[Future] = [hedge_pool().submit(invoke)]
+        pending = set(futures)
+        first_error: typing.Union[BaseException, None] = None
+
+        while pending:
+            timeout = delay if len(futures) <= hedge.max_hedges else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    for p in pending:
+                        p.cancel()
+                    return f.result()
+                first_error = first_error or f.exception()
+
+            if not done and len(futures) <= hedge.max_hedges:
+                # 超过等待时间仍未返回时发出新的请求
+                f = hedge_pool().submit(invoke)
+                futures.append(f)
+                pending.add(f)
+
+        raise first_error
+
+    async def ahedged(self, action: str, invoke: typing.Callable[[], typing.Awaitable[typing.Any]]) -> typing.Any:
+        """
+        hedged 的异步版本, 每个请求为单独的 asyncio 任务, 返回第一个成功的结果后取消其余的请求
+        """
+        hedge = self.policy.hedge
+        delay = hedge.delay(self.latency(action))
+        tasks: typing.List[asyncio.Future] = [asyncio.ensure_future(invoke())]
+        pending = set(tasks)
+        first_error: typing.Union[BaseException, None] = None
+
+        try:
+            while pending:
+                timeout = delay if len(tasks) <= hedge.max_hedges else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        return t.result()
+                    first_error = first_error or t.exception()
+
+                if not done and len(tasks) <= hedge.max_hedges:
+                    t = asyncio.ensure_future(invoke())
+                    tasks.append(t)
+                    pending.add(t)
+        finally:
+            for t in pending:
+                t.cancel()
+
+        raise first_error
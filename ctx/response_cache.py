@@ -0,0 +1,258 @@
+"""
+客户端的响应缓存, 对通过 fields.cacheable 标记的幂等服务, 以服务、action 及规范编码后的参数作为 key
+缓存其返回值, 支持 TTL 过期、按字节数限制的 LRU 淘汰, 以及过期后返回旧结果并在后台刷新(stale-while-revalidate)
+"""
+
+import asyncio
+import threading
+import time
+import typing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from ..type_def.type_tags import rpc_doc_cache_key
+from .callable_impl import CallableImpl, CallableAction
+from .canonical import canonical, canonical_hash, NotCanonicalError
+
+
+class CacheSpec(object):
+    __slots__ = ("ttl", "stale")
+
+    def __init__(self, ttl: float, stale: float = 0):
+        self.ttl = ttl
+        self.stale = stale
+
+    def __repr__(self):
+        return f"CacheSpec(ttl: {self.ttl}, stale: {self.stale})"
+
+
+def cache_spec(impl_class, action: str) -> typing.Union[CacheSpec, None]:
+    """
+    读取服务定义中 fields.cacheable 的配置, 实现类覆盖了定义中的方法时, 沿着 mro 查找定义
+    """
+    for klass in getattr(impl_class, "__mro__", (impl_class,)):
+        method = klass.__dict__.get(action)
+        while method is not None:
+            d = getattr(method, rpc_doc_cache_key, None)
+            if d is not None:
+                return CacheSpec(d["ttl"], d.get("stale", 0))
+            method = getattr(method, "__wrapped__", None)
+    return None
+
+
+def _sizeof(value: typing.Any) -> int:
+    """
+    以规范编码的长度估算返回值所占用的字节数
+    """
+    try:
+        return len(canonical(value))
+    except NotCanonicalError:
+        return 1024
+
+
+class ResponseEntry(object):
+    __slots__ = ("value", "expires", "stale_until", "size", "refreshing")
+
+    def __init__(self, value: typing.Any, expires: float, stale_until: float, size: int):
+        self.value = value
+        self.expires = expires
+        self.stale_until = stale_until
+        self.size = size
+        self.refreshing = False
+
+
+class ResponseCache(object):
+    """
+    线程安全的响应缓存, max_bytes 为所有缓存的估算字节数上限, max_entries 为缓存条数的上限,
+    超出任一上限时淘汰最久未使用的缓存, 缓存的结果会直接返回给所有的调用方, 调用方不应修改返回的结果,
+    生成的客户端没有继承服务定义时, 可通过 register 为 action 配置缓存
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 10000,
+                 clock: typing.Callable[[], float] = time.monotonic,
+                 executor: typing.Union[ThreadPoolExecutor, None] = None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._clock = clock
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._entries: typing.Dict[typing.Hashable, ResponseEntry] = OrderedDict()
+        self._specs: typing.Dict[typing.Tuple[str, str], CacheSpec] = {}
+        self._discovered: typing.Dict[typing.Tuple[typing.Any, str], typing.Union[CacheSpec, None]] = {}
+        # 失效的次数, 避免失效之前开始的刷新写入旧的结果
+        self._generation = 0
+        self._bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def register(self, impl_name: str, action: str, ttl: float, stale: float = 0):
+        self._specs[(impl_name, action)] = CacheSpec(ttl, stale)
+
+    def spec(self, impl_name: str, action: str, impl_class) -> typing.Union[CacheSpec, None]:
+        spec = self._specs.get((impl_name, action))
+        if spec is not None:
+            return spec
+        key = (impl_class, action)
+        if key not in self._discovered:
+            self._discovered[key] = cache_spec(impl_class, action)
+        return self._discovered[key]
+
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ctx-refresh")
+        return self._executor
+
+    def _lookup(self, key: typing.Hashable) -> typing.Tuple[bool, typing.Any, bool, int]:
+        """
+        查找缓存, 返回 (是否命中, 缓存的结果, 是否需要在后台刷新, 当前的失效次数)
+        """
+        refresh = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                now = self._clock()
+                if now < entry.expires:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry.value, False, self._generation
+                if now < entry.stale_until:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if not entry.refreshing:
+                        entry.refreshing = refresh = True
+                    return True, entry.value, refresh, self._generation
+                self._remove(key)
+            self.misses += 1
+            return False, None, False, self._generation
+
+    def call(self, key: typing.Hashable, spec: CacheSpec, invoke: typing.Callable[[], typing.Any]) -> typing.Any:
+        """
+        返回缓存的结果, 未命中时调用 invoke 并缓存其结果, 处于 stale 期间时返回旧结果并在后台刷新
+        """
+        found, value, refresh, generation = self._lookup(key)
+        if not found:
+            value = invoke()
+            self.set(key, value, spec, generation)
+            return value
+
+        if refresh:
+            self.executor().submit(self._refresh, key, spec, invoke, generation)
+        return value
+
+    async def acall(self, key: typing.Hashable, spec: CacheSpec,
+                    invoke: typing.Callable[[], typing.Awaitable[typing.Any]]) -> typing.Any:
+        """
+        call 的异步版本, 后台刷新在当前的事件循环中执行
+        """
+        found, value, refresh, generation = self._lookup(key)
+        if not found:
+            value = await invoke()
+            self.set(key, value, spec, generation)
+            return value
+
+        if refresh:
+            asyncio.ensure_future(self._arefresh(key, spec, invoke, generation))
+        return value
+
+    def _refresh(self, key: typing.Hashable, spec: CacheSpec, invoke: typing.Callable[[], typing.Any],
+                 generation: int):
+        try:
+            value = invoke()
+        except Exception:
+            self._refresh_failed(key)
+            return
+        self._refreshed(key, value, spec, generation)
+
+    async def _arefresh(self, key: typing.Hashable, spec: CacheSpec,
+                        invoke: typing.Callable[[], typing.Awaitable[typing.Any]], generation: int):
+        try:
+            value = await invoke()
+        except Exception:
+            self._refresh_failed(key)
+            return
+        self._refreshed(key, value, spec, generation)
+
+    def _refresh_failed(self, key: typing.Hashable):
+        # 刷新失败时保留旧的结果, 直到 stale 期间结束
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refreshing = False
+
+    def _refreshed(self, key: typing.Hashable, value: typing.Any, spec: CacheSpec, generation: int):
+        with self._lock:
+            self.refreshes += 1
+        self.set(key, value, spec, generation)
+
+    def set(self, key: typing.Hashable, value: typing.Any, spec: CacheSpec, generation: int = None):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+
+            now = self._clock()
+            self._entries[key] = ResponseEntry(value, now + spec.ttl, now + spec.ttl + spec.stale, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, impl_name: str = None, action: str = None):
+        """
+        移除缓存, 不传递参数时移除所有缓存, 否则只移除对应服务或 action 的缓存
+        """
+        with self._lock:
+            self._generation += 1
+            for key in list(self._entries):
+                if (impl_name is None or key[0] == impl_name) and (action is None or key[2] == action):
+                    self._remove(key)
+
+    def clear(self):
+        self.invalidate()
+
+    def _remove(self, key: typing.Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CachedCallableAction(CallableAction):
+    """
+    带有响应缓存的 CallableAction, 参数无法规范编码时不使用缓存
+    """
+
+    def __init__(self, impl: CallableImpl, action: str, cache: ResponseCache, spec: CacheSpec,
+                 impl_name: str, identity: str):
+        super(CachedCallableAction, self).__init__(impl, action)
+        self.cache = cache
+        self.spec = spec
+        self.impl_name = impl_name
+        self.identity = identity
+
+    def __call__(self, *args, **kwargs):
+        try:
+            key = (self.impl_name, self.identity, self.action, canonical_hash((args, kwargs)))
+        except NotCanonicalError:
+            return super(CachedCallableAction, self).__call__(*args, **kwargs)
+        return self.cache.call(key, self.spec, lambda: super(CachedCallableAction, self).__call__(*args, **kwargs))
+
+    async def acall(self, *args, **kwargs):
+        try:
+            key = (self.impl_name, self.identity, self.action, canonical_hash((args, kwargs)))
+        except NotCanonicalError:
+            return await super(CachedCallableAction, self).acall(*args, **kwargs)
+        return await self.cache.acall(key, self.spec, lambda: super(CachedCallableAction, self).acall(*args, **kwargs))
@@ -0,0 +1,224 @@
+"""
+CallableImpl 的调用统计, 按 action 记录调用次数、失败次数、进行中的调用数及耗时分布,
+每个 action 有固定数量的分片, 线程按其序号写入对应的分片, 线程数不超过分片数时分片的锁不会发生竞争,
+读取时合并所有分片
+"""
+
+import itertools
+import threading
+import time
+import typing
+
+# 耗时以纳秒为单位记录, 每个 2 的幂次区间划分为 SUB_BUCKETS 个子区间, 相对误差不超过 1 / SUB_BUCKETS
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+# 2^45 纳秒约 9.7 小时, 超过的耗时记录在最后一个区间
+MAX_BUCKET = (45 - SUB_BITS) * SUB_BUCKETS + 2 * SUB_BUCKETS
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 每个 action 的分片数, 分片在第一次写入时才创建
+SHARDS = 16
+
+# 线程的序号, 所有的 ActionStatistic 共享, 线程结束后不需要回收
+_thread_slot = threading.local()
+_next_slot = itertools.count()
+
+
+def _slot() -> int:
+    slot = getattr(_thread_slot, "index", None)
+    if slot is None:
+        slot = _thread_slot.index = next(_next_slot) % SHARDS
+    return slot
+
+
+def bucket_of(nanos: int) -> int:
+    """
+    HDR 风格的对数线性分桶, 小于 2 * SUB_BUCKETS 的值各占一个桶
+    """
+    if nanos < 2 * SUB_BUCKETS:
+        return max(nanos, 0)
+    shift = nanos.bit_length() - SUB_BITS - 1
+    return min(shift * SUB_BUCKETS + (nanos >> shift), MAX_BUCKET - 1)
+
+
+def bucket_value(index: int) -> float:
+    """
+    桶所代表的耗时(纳秒), 取桶的中间值
+    """
+    if index < 2 * SUB_BUCKETS:
+        return float(index)
+    shift = index // SUB_BUCKETS - 1
+    lower = (index - shift * SUB_BUCKETS) << shift
+    return lower + (1 << shift) / 2
+
+
+class _Shard(object):
+    __slots__ = ("lock", "calls", "errors", "in_flight", "total", "max", "buckets")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * MAX_BUCKET
+
+
+class ActionStatistic(object):
+    """
+    单个 action 的调用统计
+    """
+
+    def __init__(self, impl_name: str, action: str):
+        self.impl_name = impl_name
+        self.action = action
+        self._shards: typing.List[typing.Union[_Shard, None]] = [None] * SHARDS
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        slot = _slot()
+        shard = self._shards[slot]
+        if shard is None:
+            with self._lock:
+                shard = self._shards[slot]
+                if shard is None:
+                    shard = self._shards[slot] = _Shard()
+        return shard
+
+    def start(self) -> float:
+        """
+        记录一次调用的开始, 返回值需要传递给 finish
+        """
+        shard = self._shard()
+        with shard.lock:
+            shard.in_flight += 1
+        return time.perf_counter()
+
+    def finish(self, start: float, ok: bool = True):
+        seconds = time.perf_counter() - start
+        bucket = bucket_of(int(seconds * 1e9))
+        shard = self._shard()
+        with shard.lock:
+            shard.in_flight -= 1
+            shard.calls += 1
+            if not ok:
+                shard.errors += 1
+            shard.total += seconds
+            if seconds > shard.max:
+                shard.max = seconds
+            shard.buckets[bucket] += 1
+
+    def snapshot(self) -> typing.Dict[str, typing.Any]:
+        """
+        合并所有的分片, 耗时的单位为秒
+        """
+        shards = [shard for shard in self._shards if shard is not None]
+
+        calls = errors = in_flight = 0
+        total = longest = 0.0
+        buckets = [0] * MAX_BUCKET
+        for shard in shards:
+            calls += shard.calls
+            errors += shard.errors
+            in_flight += shard.in_flight
+            total += shard.total
+            longest = max(longest, shard.max)
+            for i, n in enumerate(shard.buckets):
+                if n:
+                    buckets[i] += n
+
+        result = {
+            "calls": calls,
+            "errors": errors,
+            "in_flight": in_flight,
+            "sum": total,
+            "max": longest,
+        }
+        count = sum(buckets)
+        for q in QUANTILES:
+            result[f"p{int(q * 100)}"] = self._quantile(buckets, count, q)
+        return result
+
+    @staticmethod
+    def _quantile(buckets: typing.List[int], count: int, q: float) -> float:
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if n and seen >= rank:
+                return bucket_value(i) / 1e9
+        return 0.0
+
+
+class ImplStatistic(object):
+    """
+    一个服务的调用统计, 同一个服务的所有 CallableImpl 共享同一个 ImplStatistic
+    """
+
+    def __init__(self, impl_name: str):
+        self.impl_name = impl_name
+        self._actions: typing.Dict[str, ActionStatistic] = {}
+        self._lock = threading.Lock()
+
+    def action(self, action: str) -> ActionStatistic:
+        stat = self._actions.get(action)
+        if stat is None:
+            with self._lock:
+                stat = self._actions.setdefault(action, ActionStatistic(self.impl_name, action))
+        return stat
+
+    def snapshot(self) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+        with self._lock:
+            actions = list(self._actions.values())
+        return {a.action: a.snapshot() for a in actions}
+
+    def prometheus(self) -> str:
+        return prometheus([self])
+
+
+def _labels(stat: ActionStatistic, **extra) -> str:
+    labels = {"impl": stat.impl_name, "action": stat.action}
+    labels.update(extra)
+    text = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels.items())
+    return "{" + text + "}"
+
+
+def prometheus(statistics: typing.Iterable[ImplStatistic]) -> str:
+    """
+    以 Prometheus 文本格式导出调用统计
+    """
+    samples: typing.Dict[str, typing.List[str]] = {
+        "rpc_client_calls_total": [],
+        "rpc_client_errors_total": [],
+        "rpc_client_in_flight": [],
+        "rpc_client_latency_seconds": [],
+    }
+    for impl_stat in statistics:
+        with impl_stat._lock:
+            actions = list(impl_stat._actions.values())
+        for stat in actions:
+            snap = stat.snapshot()
+            samples["rpc_client_calls_total"].append(f"rpc_client_calls_total{_labels(stat)} {snap['calls']}")
+            samples["rpc_client_errors_total"].append(f"rpc_client_errors_total{_labels(stat)} {snap['errors']}")
+            samples["rpc_client_in_flight"].append(f"rpc_client_in_flight{_labels(stat)} {snap['in_flight']}")
+            latency = samples["rpc_client_latency_seconds"]
+            for q in QUANTILES:
+                latency.append(f"rpc_client_latency_seconds{_labels(stat, quantile=q)} {snap['p%d' % (q * 100)]}")
+            latency.append(f"rpc_client_latency_seconds_sum{_labels(stat)} {snap['sum']}")
+            latency.append(f"rpc_client_latency_seconds_count{_labels(stat)} {snap['calls']}")
+
+    types = {
+        "rpc_client_calls_total": "counter",
+        "rpc_client_errors_total": "counter",
+        "rpc_client_in_flight": "gauge",
+        "rpc_client_latency_seconds": "summary",
+    }
+    lines = []
+    for name, values in samples.items():
+        lines.append(f"# TYPE {name} {types[name]}")
+        lines.extend(values)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import pytest
+
+from ...pool import ConnectionInfo, Pool
+from ...trace import TraceInfo
+from ..async_context import AsyncContext
+from ..coalesce import Coalescer
+from ..context import current_context
+from ..cache import ContextCache
+from ..policy import InvokePolicy, RetryPolicy
+from ..response_cache import ResponseCache
+
+
+class FakePool(Pool):
+    def get(self, key: str) -> ConnectionInfo:
+        return ConnectionInfo(key)
+
+
+class EchoImpl(object):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def block(self, seconds):
+        time.sleep(seconds)
+        return current_context().trace_info.span_id
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+        return current_context().trace_info.span_id
+
+
+def build_context(timeout=None) -> AsyncContext:
+    cache = ContextCache(FakePool())
+    cache.set("echo", EchoImpl)
+    return AsyncContext(TraceInfo("root"), client_cache=cache, timeout=timeout)
+
+
+def test_gather_runs_concurrently_with_ordered_spans():
+    async def main():
+        ctx = build_context()
+        start = time.perf_counter()
+        spans = await ctx.gather(
+            ("echo", "sleep", 0.1),
+            ("echo", "block", 0.1),
+            ("echo", "sleep", 0.05),
+        )
+        assert time.perf_counter() - start < 0.18
+        assert spans == ["1,0", "1,1", "1,2"]
+        assert await ctx.call("echo", "sleep", 0) == "1,3"
+
+    asyncio.run(main())
+
+
+def test_timeout_propagates_through_prev_chain():
+    async def main():
+        ctx = build_context(timeout=0.1)
+        child = ctx.child("nested", timeout=10)
+        assert child.remaining() <= 0.1
+
+        start = time.perf_counter()
+        with pytest.raises(asyncio.TimeoutError):
+            await child.call("echo", "sleep", 1)
+        assert time.perf_counter() - start < 0.3
+
+    asyncio.run(main())
+
+
+def test_cancel_and_gather_failure():
+    async def main():
+        ctx = build_context()
+        task = asyncio.ensure_future(ctx.call("echo", "sleep", 1))
+        await asyncio.sleep(0.02)
+        ctx.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        with pytest.raises(asyncio.CancelledError):
+            await ctx.call("echo", "sleep", 0)
+
+        ctx = build_context()
+        slow = asyncio.ensure_future(ctx.call("echo", "sleep", 1))
+        with pytest.raises(KeyError):
+            await ctx.gather(slow, ("echo", "missing", None))
+        assert slow.cancelled()
+
+        results = await ctx.gather(("echo", "sleep", 0), ("echo", "missing", None), return_exceptions=True)
+        assert isinstance(results[1], KeyError)
+
+    asyncio.run(main())
+
+
+class FlakyImpl(object):
+    calls = 0
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def get(self, value):
+        FlakyImpl.calls += 1
+        await asyncio.sleep(0.02)
+        if FlakyImpl.calls == 1:
+            raise ConnectionError("reset")
+        return value
+
+
+def test_coroutine_action_runs_inside_policy_and_statistic():
+    async def main():
+        delays = []
+
+        async def asleep(seconds):
+            delays.append(seconds)
+
+        policy = InvokePolicy(retry=RetryPolicy(retry_on=(ConnectionError,), asleep=asleep))
+        cache = ContextCache(FakePool(), policy=policy, coalescer=Coalescer(True), response_cache=ResponseCache())
+        cache.set("flaky", FlakyImpl)
+        cache.response_cache.register("flaky", "get", ttl=60)
+        ctx = AsyncContext(TraceInfo("root"), client_cache=cache)
+
+        assert await ctx.gather(("flaky", "get", 1), ("flaky", "get", 1)) == [1, 1]
+        assert await ctx.call("flaky", "get", 1) == 1
+        # 重试了一次, 并发的调用被合并, 之后的调用使用缓存
+        assert FlakyImpl.calls == 2 and len(delays) == 1
+        assert cache.coalescer.saved() == 1 and cache.response_cache.hits == 1
+
+        stat = cache.get_statistic("flaky").action("get").snapshot()
+        assert stat["calls"] == 1 and stat["errors"] == 0 and stat["sum"] >= 0.04
+
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from ...pool import ConnectionInfo, Pool, ConnectionPool
+from ..cache import ContextCache
+
+
+class CountingPool(Pool):
+    def __init__(self):
+        self.gets = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> ConnectionInfo:
+        with self.lock:
+            self.gets += 1
+        return ConnectionInfo(key)
+
+
+class SlowImpl(object):
+    created = 0
+    lock = threading.Lock()
+
+    def __init__(self, conn):
+        time.sleep(0.05)
+        with SlowImpl.lock:
+            SlowImpl.created += 1
+        self.conn = conn
+
+    def hello(self, args):
+        return args
+
+
+def test_single_flight_under_contention():
+    pool = CountingPool()
+    cache = ContextCache(pool)
+    cache.set("slow", SlowImpl)
+    SlowImpl.created = 0
+
+    barrier = threading.Barrier(64)
+    actions, errors = [], []
+
+    def worker(i):
+        barrier.wait()
+        try:
+            actions.append(cache.get("slow", "hello", identity="" if i % 2 else "slow"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(64)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+    assert not errors
+    assert pool.gets == 1
+    assert len({id(a.impl) for a in actions}) == 1
+    # impl 的实例在调用时才按连接创建
+    assert SlowImpl.created == 0
+    assert actions[0]("x") == "x" and actions[1]("y") == "y"
+    assert SlowImpl.created == 1
+    assert list(cache.servicer_cache.keys()) == [("slow", "slow")]
+
+    # 不同的 identity 使用不同的缓存
+    cache.get("slow", "hello", identity="shard-1")
+    assert pool.gets == 2
+
+
+def test_failed_build_is_retried():
+    class FlakyPool(CountingPool):
+        fail = True
+
+        def get(self, key: str) -> ConnectionInfo:
+            if self.fail:
+                raise ConnectionError("down")
+            return super().get(key)
+
+    pool = FlakyPool()
+    cache = ContextCache(pool)
+    cache.set("slow", SlowImpl)
+    with pytest.raises(ConnectionError):
+        cache.get("slow", "hello")
+    pool.fail = False
+    assert cache.get("slow", "hello")("x") == "x"
+
+    with pytest.raises(KeyError):
+        cache.get("missing", "hello")
+
+
+def test_connections_are_leased_per_call():
+    class Conn(object):
+        def __init__(self, key):
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    class Impl(object):
+        def __init__(self, conn):
+            self.conn = conn
+
+        def hello(self, args):
+            assert not self.conn.closed
+            if args == "down":
+                raise ConnectionError(args)
+            time.sleep(0.01)
+            return args
+
+    pool = ConnectionPool(Conn, max_size=4)
+    cache = ContextCache(pool)
+    cache.set("impl", Impl)
+    action = cache.get("impl", "hello")
+
+    def work(i):
+        for _ in range(5):
+            assert action(i) == i
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+    [t.start() for t in threads]
+    with pytest.raises(ConnectionError):
+        action("down")
+    [t.join() for t in threads]
+    # 每次调用后归还连接, 出错的连接只在出错的线程中被关闭
+    assert pool.stat("impl").leased == 0
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from ...pool import ConnectionInfo, Pool
+from ...trace import TraceInfo
+from ..cache import ContextCache
+from ..canonical import canonical, NotCanonicalError
+from ..coalesce import Coalescer
+from ..context import Context
+
+
+class FakePool(Pool):
+    def get(self, key: str) -> ConnectionInfo:
+        return ConnectionInfo(key)
+
+
+class Args(object):
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+        self._private = object()
+
+
+class SlowImpl(object):
+    calls = 0
+    lock = threading.Lock()
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def get(self, args):
+        with SlowImpl.lock:
+            SlowImpl.calls += 1
+        time.sleep(0.1)
+        return {"value": args.a}
+
+    def fail(self, args):
+        time.sleep(0.1)
+        raise ValueError(args.a)
+
+
+def test_canonical():
+    assert canonical({"a": 1, "b": [1, 2]}) == canonical({"b": [1, 2], "a": 1})
+    assert canonical(Args(1, "x")) == canonical(Args(1, "x"))
+    assert canonical(Args(1, "x")) != canonical(Args(1, "y"))
+    assert canonical(1) != canonical(1.0) != canonical("1") != canonical(True)
+    assert canonical({1, 2, 3}) == canonical({3, 2, 1})
+
+    loop = []
+    loop.append(loop)
+    with pytest.raises(NotCanonicalError):
+        canonical(loop)
+    with pytest.raises(NotCanonicalError):
+        canonical({1: 2})
+
+
+def run_concurrent(ctx, action, args_list):
+    results = [None] * len(args_list)
+
+    def worker(i):
+        try:
+            results[i] = ctx.call("slow", action, args_list[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(args_list))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_coalesce_identical_calls():
+    coalescer = Coalescer({"slow.get"})
+    cache = ContextCache(FakePool(), coalescer=coalescer)
+    cache.set("slow", SlowImpl)
+    ctx = Context(TraceInfo("root"), client_cache=cache)
+    SlowImpl.calls = 0
+
+    results = run_concurrent(ctx, "get", [Args(1, "x") for _ in range(10)] + [Args(2, "x")])
+    assert SlowImpl.calls == 2
+    assert results[:10] == [{"value": 1}] * 10
+    assert results[10] == {"value": 2}
+    assert coalescer.snapshot()["slow.get"] == {"calls": 11, "saved": 9}
+    assert coalescer.in_flight() == 0
+
+    # 调用结束后不再合并
+    ctx.call("slow", "get", Args(1, "x"))
+    assert SlowImpl.calls == 3
+
+
+def test_coalesce_shares_errors_and_respects_enablement():
+    coalescer = Coalescer()
+    cache = ContextCache(FakePool(), coalescer=coalescer)
+    cache.set("slow", SlowImpl)
+    ctx = Context(TraceInfo("root"), client_cache=cache)
+
+    SlowImpl.calls = 0
+    run_concurrent(ctx, "get", [Args(1, "x") for _ in range(5)])
+    assert SlowImpl.calls == 5
+
+    coalescer.enable("slow")
+    results = run_concurrent(ctx, "fail", [Args(3, "x") for _ in range(5)])
+    assert all(isinstance(r, ValueError) for r in results)
+    assert coalescer.saved() == 4
@@ -0,0 +1,120 @@
+import time
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from ...pool import ConnectionInfo, Pool
+from ...trace import TraceInfo
+from ..cache import ContextCache
+from ..context import Context, current_context
+
+
+class FakePool(Pool):
+    def get(self, key: str) -> ConnectionInfo:
+        return ConnectionInfo(key)
+
+
+class EchoImpl(object):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def block(self, seconds):
+        time.sleep(seconds)
+        return current_context().trace_info.span_id
+
+    def fail(self, args):
+        raise ValueError(args)
+
+    def nested(self, executor):
+        results = current_context().call_many([("echo", "block", 0), ("echo", "block", 0)], executor=executor)
+        return [r.value for r in results]
+
+
+def build_context() -> Context:
+    cache = ContextCache(FakePool())
+    cache.set("echo", EchoImpl)
+    return Context(TraceInfo("root"), client_cache=cache)
+
+
+def test_call_many():
+    ctx = build_context()
+    start = time.perf_counter()
+    results = ctx.call_many([
+        ("echo", "block", 0.1),
+        ("echo", "fail", "bad"),
+        ("echo", "block", 0.05),
+    ], executor=ThreadPoolExecutor(4))
+    assert time.perf_counter() - start < 0.18
+    assert [r.ok for r in results] == [True, False, True]
+    assert [r.value for r in results] == ["1,0", None, "1,2"]
+    assert isinstance(results[1].error, ValueError)
+    assert results[0].trace_info.trace_id == ctx.trace_info.trace_id
+
+
+def test_call_many_deadlines():
+    ctx = build_context()
+    executor = ThreadPoolExecutor(1)
+    start = time.perf_counter()
+    results = ctx.call_many([
+        ("echo", "block", 0.01),
+        ("echo", "block", 0.5),
+        ("echo", "block", 0.01),
+    ], call_timeout=0.1, executor=executor)
+    assert time.perf_counter() - start < 0.7
+    assert results[0].ok
+    assert isinstance(results[1].error, FutureTimeoutError)
+    # 排队的时间不计算在单个调用的时限内
+    assert results[2].ok and results[2].seconds < 0.1
+
+    # 超过总时限后, 排队中的调用不会再执行
+    results = ctx.call_many([("echo", "block", 0.2), ("echo", "block", 0)], timeout=0.05, executor=executor)
+    assert [type(r.error) for r in results] == [FutureTimeoutError, FutureTimeoutError]
+    time.sleep(0.2)
+    # 超时后完成的调用不会覆盖超时的结果
+    assert isinstance(results[0].error, FutureTimeoutError) and results[0].value is None
+
+    # 占满线程池的嵌套调用在当前线程中执行尚未开始的调用
+    results = ctx.call_many([("echo", "nested", executor)], timeout=1, executor=executor)
+    assert results[0].value == ["1,5,0", "1,5,1"]
+    executor.shutdown()
+
+    results = ctx.call_many([("echo", "block", 0.3), ("echo", "block", 0)], timeout=0.1)
+    assert not results[0].ok and results[1].ok
+
+
+def test_flattened_lookup_and_root_gc():
+    import gc
+    import logging
+    import weakref
+
+    log = logging.getLogger("ctx-test")
+    cache = ContextCache(FakePool())
+    root = Context(TraceInfo("root"), client_cache=cache, servicer_cache=ContextCache(FakePool()),
+                   logger=lambda: log)
+    chain = [root]
+    for i in range(30):
+        chain.append(chain[-1].child(f"level{i}"))
+    leaf = chain[-1]
+
+    leaf.reg_client_impl("echo", EchoImpl)
+    assert cache.servicer_map["echo"] is EchoImpl
+    assert leaf.logger is log
+    assert leaf.get_client_impl("echo", "block").impl.impl is EchoImpl
+
+    # root 及中间的上下文被回收后, 子上下文仍然使用 root 的缓存管理器
+    leaf_ref = weakref.ref(leaf)
+    del chain, root
+    gc.collect()
+    assert leaf_ref() is leaf
+    with pytest.raises(ValueError):
+        leaf.call("echo", "fail", 1)
+    assert Context(TraceInfo("orphan"), weakref.ref(leaf)).get_client_impl("echo", "block")
+
+    # 子上下文的 logger 被回收后使用上一级的 logger
+    # logging.getLogger 返回的 logger 不会被回收, 因此使用单独的对象
+    child_log = logging.Logger("ctx-test-child")
+    child = Context(TraceInfo("child"), weakref.ref(leaf), logger=weakref.ref(child_log))
+    assert child.logger is child_log
+    del child_log
+    gc.collect()
+    assert child.logger is log
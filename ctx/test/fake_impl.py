@@ -0,0 +1,72 @@
+"""
+进程内的假服务, 可为每个节点注入耗时及失败, 用于测试调用策略
+"""
+
+import threading
+import time
+import typing
+
+from ...pool import ConnectionInfo
+
+
+class FakeEndpoint(object):
+    """
+    latency 为每次调用的耗时, 可以是按调用序号返回耗时的函数, failures 为接下来会失败的调用次数
+    """
+
+    def __init__(self, address: str, latency: typing.Union[float, typing.Callable[[int], float]] = 0.0,
+                 failures: int = 0):
+        self.address = address
+        self.latency = latency
+        self.failures = failures
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def handle(self, args):
+        with self._lock:
+            n = self.calls
+            self.calls += 1
+            fail = self.failures > 0
+            if fail:
+                self.failures -= 1
+        latency = self.latency(n) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        if fail:
+            raise ConnectionError(f"{self.address} 调用失败")
+        return {"endpoint": self.address, "args": args}
+
+
+class FakeConnectionInfo(ConnectionInfo):
+    """
+    按顺序使用多个节点, useless 时切换到下一个节点
+    """
+
+    def __init__(self, endpoints: typing.List[FakeEndpoint]):
+        super(FakeConnectionInfo, self).__init__(endpoints[0])
+        self.endpoints = endpoints
+        self.index = 0
+        self.useless_count = 0
+
+    @property
+    def endpoint(self) -> FakeEndpoint:
+        return self.conn
+
+    def useless(self):
+        self.useless_count += 1
+        self.index = (self.index + 1) % len(self.endpoints)
+        self.conn = self.endpoints[self.index]
+
+
+class FakeImpl(object):
+    def __init__(self, conn: FakeEndpoint):
+        self.conn = conn
+
+    def get(self, args):
+        return self.conn.handle(args)
+
+    def put(self, args):
+        return self.conn.handle(args)
+
+    def bad_request(self, args):
+        raise ValueError(args)
@@ -0,0 +1,164 @@
+import random
+import time
+
+import pytest
+
+from ...pool import Pool, Balancer, ConnectionPool, RoundRobin
+from ..callable_impl import CallableImpl
+from ..policy import InvokePolicy, RetryPolicy, HedgePolicy, CircuitBreaker, CircuitOpenError
+from .fake_impl import FakeEndpoint, FakeConnectionInfo, FakeImpl
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def build(endpoints, policy):
+    return CallableImpl(FakeImpl, FakeConnectionInfo(endpoints), Pool(), policy=policy)
+
+
+def test_retry_switches_endpoint():
+    a, b = FakeEndpoint("a", failures=10), FakeEndpoint("b")
+    sleeps = []
+    retry = RetryPolicy(max_attempts=3, retry_on=(ConnectionError,), rand=random.Random(1), sleep=sleeps.append)
+    impl = build([a, b], InvokePolicy(retry))
+
+    assert impl("get", 1) == {"endpoint": "b", "args": 1}
+    assert a.calls == 1 and b.calls == 1
+    assert impl.conn.useless_count == 1
+    assert len(sleeps) == 1 and 0 <= sleeps[0] < 0.05
+
+    # 不可重试的异常直接抛出
+    with pytest.raises(ValueError):
+        impl("bad_request", 2)
+    assert impl.conn.useless_count == 1
+
+    # 超过重试次数时抛出最后一次的异常
+    a.failures, b.failures = 10, 10
+    with pytest.raises(ConnectionError):
+        impl("get", 3)
+    assert (a.calls, b.calls) == (2, 3)
+
+
+def test_hedging_cuts_tail_latency():
+    # 每 10 次调用中有一次耗时 0.3s
+    endpoint = FakeEndpoint("a", latency=lambda n: 0.3 if n % 10 == 9 else 0.002)
+    hedge = HedgePolicy(min_samples=5, initial_delay=0.02)
+    impl = build([endpoint], InvokePolicy(hedge=hedge, idempotent={"get"}))
+
+    seconds = []
+    for i in range(30):
+        start = time.perf_counter()
+        impl("get", i)
+        seconds.append(time.perf_counter() - start)
+
+    assert max(seconds) < 0.2
+    assert endpoint.calls > 30
+
+    # 非幂等的 action 不会对冲
+    calls = endpoint.calls
+    for i in range(10):
+        impl("put", i)
+    assert endpoint.calls == calls + 10
+
+
+def test_breaker_open_half_open_closed():
+    clock = FakeClock()
+    a = FakeEndpoint("a", failures=2)
+    policy = InvokePolicy(breaker=lambda: CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock))
+    impl = build([a], policy)
+    breaker = impl.policy_state.breaker("a")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            impl("get", 1)
+    assert breaker.state == CircuitBreaker.Open
+
+    with pytest.raises(CircuitOpenError):
+        impl("get", 1)
+    assert a.calls == 2
+
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HalfOpen
+    # 半开状态只放行一个探测请求
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.Open
+
+    clock.now = 20
+    assert impl("get", 1)["endpoint"] == "a"
+    assert breaker.state == CircuitBreaker.Closed
+
+
+def test_open_breaker_keeps_connection():
+    clock = FakeClock()
+    a, b = FakeEndpoint("a", failures=1), FakeEndpoint("b")
+    sleeps = []
+    policy = InvokePolicy(RetryPolicy(max_attempts=3, rand=random.Random(1), sleep=sleeps.append),
+                          breaker=lambda: CircuitBreaker(failure_threshold=1, clock=clock))
+    impl = build([a, b], policy)
+
+    assert impl("get", 1)["endpoint"] == "b"
+    assert impl.policy_state.breaker("a").state == CircuitBreaker.Open
+
+    # 切回 a 时熔断器打开, 不发送请求, 连接正常归还而不是被移除, 每次重试前同样等待退避时间
+    impl.try_pool_again()
+    useless, sleeps[:] = impl.conn.useless_count, []
+    with pytest.raises(CircuitOpenError):
+        impl("get", 2)
+    assert a.calls == 1
+    assert impl.conn.useless_count == useless
+    assert len(sleeps) == 2
+
+
+def test_application_error_releases_probe():
+    clock = FakeClock()
+    a = FakeEndpoint("a", failures=1)
+    policy = InvokePolicy(RetryPolicy(max_attempts=3, sleep=lambda s: None),
+                          breaker=lambda: CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock))
+    impl = build([a], policy)
+    breaker = impl.policy_state.breaker("a")
+
+    with pytest.raises(CircuitOpenError):
+        impl("get", 1)
+    assert breaker.state == CircuitBreaker.Open
+
+    # 默认不重试业务异常, 半开状态的探测请求抛出业务异常后释放探测名额
+    clock.now = 10
+    with pytest.raises(ValueError):
+        impl("bad_request", 1)
+    assert breaker.state == CircuitBreaker.HalfOpen and breaker.probes == 0
+    assert impl("get", 2)["endpoint"] == "a"
+    assert breaker.state == CircuitBreaker.Closed
+
+
+def test_hedge_uses_another_lease():
+    class Conn(object):
+        def __init__(self, address):
+            self.address = address
+
+        def close(self):
+            pass
+
+    class Impl(object):
+        def __init__(self, conn):
+            self.conn = conn
+
+        def get(self, args):
+            time.sleep(0.3 if self.conn.address == "slow" else 0.001)
+            return self.conn.address
+
+    balancer = Balancer(["slow", "fast"], ConnectionPool(Conn), RoundRobin())
+    hedge = HedgePolicy(initial_delay=0.02)
+    impl = CallableImpl(Impl, balancer.get("x"), balancer, policy=InvokePolicy(hedge=hedge, idempotent=True))
+
+    start = time.perf_counter()
+    assert impl("get", 1) == "fast"
+    assert time.perf_counter() - start < 0.2
+    time.sleep(0.4)
+    assert all(e.outstanding == 0 for e in balancer.endpoints)
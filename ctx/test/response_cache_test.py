@@ -0,0 +1,131 @@
+import threading
+
+from ...base import CommonBase
+from ...pool import ConnectionInfo, Pool
+from ...type_def import fields
+from ..cache import ContextCache
+from ..callable_impl import CallableAction
+from ..response_cache import ResponseCache, CachedCallableAction, cache_spec
+
+
+class FakePool(Pool):
+    def get(self, key: str) -> ConnectionInfo:
+        return ConnectionInfo(key)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class UserApi(CommonBase):
+    @fields.cacheable(ttl=10, stale=20)
+    @fields.args(fields.Model("UserArgs", dict(id=fields.Integer())))
+    @fields.resp(fields.Dict(dict(name=fields.String())))
+    def get_user(self, args):
+        pass
+
+    def rename(self, args):
+        pass
+
+
+class UserImpl(UserApi):
+    calls = 0
+    fail = False
+    names = {1: "a", 2: "b"}
+    refreshed = threading.Event()
+
+    def __init__(self, conn):
+        super(UserImpl, self).__init__()
+        self.conn = conn
+
+    def get_user(self, args):
+        UserImpl.calls += 1
+        if UserImpl.fail:
+            UserImpl.refreshed.set()
+            raise ConnectionError(args)
+        result = {"name": UserImpl.names[args["id"]]}
+        UserImpl.refreshed.set()
+        return result
+
+    def rename(self, args):
+        UserImpl.names[args["id"]] = args["name"]
+
+
+def build(clock, **kwargs):
+    cache = ResponseCache(clock=clock, **kwargs)
+    ctx_cache = ContextCache(FakePool(), response_cache=cache)
+    ctx_cache.set("user", UserImpl)
+    UserImpl.calls, UserImpl.fail, UserImpl.names = 0, False, {1: "a", 2: "b"}
+    return cache, ctx_cache
+
+
+def test_cacheable_marks():
+    spec = cache_spec(UserImpl, "get_user")
+    assert (spec.ttl, spec.stale) == (10, 20)
+    assert cache_spec(UserImpl, "rename") is None
+
+    _, ctx_cache = build(FakeClock())
+    assert isinstance(ctx_cache.get("user", "get_user"), CachedCallableAction)
+    assert type(ctx_cache.get("user", "rename")) is CallableAction
+
+
+def test_ttl_and_stale_while_revalidate():
+    clock = FakeClock()
+    cache, ctx_cache = build(clock)
+    get_user = ctx_cache.get("user", "get_user")
+
+    assert get_user({"id": 1}) == {"name": "a"}
+    assert get_user({"id": 1}) == {"name": "a"}
+    assert get_user({"id": 2}) == {"name": "b"}
+    assert UserImpl.calls == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # 过期后在 stale 期间返回旧的结果, 并在后台刷新
+    ctx_cache.get("user", "rename")({"id": 1, "name": "c"})
+    clock.now = 15
+    UserImpl.refreshed.clear()
+    assert get_user({"id": 1}) == {"name": "a"}
+    assert UserImpl.refreshed.wait(1)
+    cache.executor().submit(lambda: None).result()
+    assert get_user({"id": 1}) == {"name": "c"}
+    assert cache.refreshes == 1
+
+    # 刷新失败时保留旧的结果
+    clock.now = 30
+    UserImpl.fail = True
+    UserImpl.refreshed.clear()
+    assert get_user({"id": 1}) == {"name": "c"}
+    assert UserImpl.refreshed.wait(1)
+    cache.executor().submit(lambda: None).result()
+    assert get_user({"id": 1}) == {"name": "c"}
+
+    # 超过 stale 期间后同步调用
+    clock.now = 100
+    UserImpl.fail = False
+    calls = UserImpl.calls
+    assert get_user({"id": 2}) == {"name": "b"}
+    assert UserImpl.calls == calls + 1
+
+    cache.invalidate("user")
+    assert len(cache) == 0
+
+
+def test_lru_byte_budget():
+    clock = FakeClock()
+    cache, ctx_cache = build(clock, max_bytes=60)
+    UserImpl.names = {i: "x" * 10 for i in range(10)}
+    get_user = ctx_cache.get("user", "get_user")
+    for i in range(10):
+        get_user({"id": i})
+    assert cache.size <= 60
+    assert 0 < len(cache) < 10
+
+    calls = UserImpl.calls
+    get_user({"id": 9})
+    assert UserImpl.calls == calls
+    get_user({"id": 0})
+    assert UserImpl.calls == calls + 1
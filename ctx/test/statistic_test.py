@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from ...pool import ConnectionInfo, Pool
+from ..cache import ContextCache
+from ..statistic import ActionStatistic, SHARDS, bucket_of, bucket_value
+
+
+class SimplePool(Pool):
+    def get(self, key: str) -> ConnectionInfo:
+        return ConnectionInfo(key)
+
+
+class EchoImpl(object):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def echo(self, args):
+        return args
+
+    def fail(self, args):
+        raise ValueError(args)
+
+
+def test_bucket_error():
+    for nanos in [0, 1, 31, 32, 33, 100, 1000, 123456, 10 ** 9, 10 ** 12]:
+        value = bucket_value(bucket_of(nanos))
+        assert abs(value - nanos) <= max(nanos / 16, 1)
+
+
+def test_quantiles():
+    stat = ActionStatistic("impl", "action")
+    shard = stat._shard()
+    for i in range(1, 101):
+        shard.calls += 1
+        shard.buckets[bucket_of(i * 1000000)] += 1
+    snap = stat.snapshot()
+    assert snap["p50"] == pytest.approx(0.050, rel=0.07)
+    assert snap["p95"] == pytest.approx(0.095, rel=0.07)
+    assert snap["p99"] == pytest.approx(0.099, rel=0.07)
+
+
+def test_statistic_from_cache():
+    cache = ContextCache(SimplePool())
+    cache.set("echo", EchoImpl)
+
+    def worker():
+        action = cache.get("echo", "echo")
+        for i in range(1000):
+            action(i)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    fail = cache.get("echo", "fail", identity="other")
+    for i in range(3):
+        with pytest.raises(ValueError):
+            fail(i)
+
+    echo = cache.get("echo", "echo").statistic.snapshot()
+    assert echo["calls"] == 8000
+    # 分片数固定, 不随线程数增长
+    assert len(cache.get("echo", "echo").statistic._shards) == SHARDS
+    assert echo["errors"] == 0
+    assert echo["in_flight"] == 0
+    assert 0 < echo["p50"] <= echo["p99"] <= max(echo["max"] * 1.07, 1e-6)
+
+    snap = cache.snapshot()
+    assert snap["echo"]["fail"]["calls"] == 3
+    assert snap["echo"]["fail"]["errors"] == 3
+
+    text = cache.prometheus()
+    assert "# TYPE rpc_client_calls_total counter" in text
+    assert 'rpc_client_calls_total{impl="echo",action="echo"} 8000' in text
+    assert 'rpc_client_errors_total{impl="echo",action="fail"} 3' in text
+    assert 'rpc_client_latency_seconds{impl="echo",action="echo",quantile="0.99"}' in text
+
+
+def test_statistic_disabled():
+    cache = ContextCache(SimplePool(), statistic=False)
+    cache.set("echo", EchoImpl)
+    action = cache.get("echo", "echo")
+    assert action(1) == 1
+    assert action.statistic is None
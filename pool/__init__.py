@@ -1,2 +1,5 @@
-from .pool import ConnectionInfo, Pool
+from .pool import ConnectionInfo, Pool, NoUsefulConnectionError, CONNECTION_ERRORS
+from .connection_pool import ConnectionPool, PooledConnectionInfo, PoolStat
+from .balancer import Balancer, BalancedConnectionInfo, Endpoint, Strategy, \
+    RoundRobin, LeastOutstanding, PowerOfTwoChoices, ConsistentHash
 from .host_info import HostInfo
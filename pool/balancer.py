@@ -0,0 +1,297 @@
+"""
+多节点的负载均衡, Balancer 作为 Pool 为每个 identity 提供 BalancedConnectionInfo,
+get_conn 时根据负载均衡策略选择节点并从 ConnectionPool 中租借该节点的连接,
+useless 时会以指数退避的方式将节点暂时移出可用列表
+"""
+
+import bisect
+import hashlib
+import random
+import threading
+import time
+import typing
+
+from .pool import ConnectionInfo, Pool, NoUsefulConnectionError, LeaseLocal
+from .connection_pool import ConnectionPool, PooledConnection
+
+
+class Endpoint(object):
+    """
+    服务节点, address 同时作为 ConnectionPool 的 key, weight 为一致性 hash 中的权重,
+    outstanding 为正在进行中的请求数, latency 为请求耗时的 EWMA(秒), 没有记录时为 None
+    """
+
+    def __init__(self, address: str, weight: int = 1):
+        self.address = address
+        self.weight = weight
+        self.outstanding = 0
+        self.latency: typing.Union[float, None] = None
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def observe(self, seconds: float, alpha: float):
+        self.latency = seconds if self.latency is None else alpha * seconds + (1 - alpha) * self.latency
+
+    def cost(self) -> float:
+        """
+        节点的负载, 即预计的排队耗时, 没有耗时记录的节点优先被选择
+        """
+        return (self.outstanding + 1) * (self.latency or 0.0)
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def __repr__(self):
+        return f"Endpoint({self.address}, outstanding: {self.outstanding}, latency: {self.latency}, " \
+               f"failures: {self.failures})"
+
+
+class Strategy(object):
+    """
+    负载均衡策略的基类
+    """
+
+    def prepare(self, endpoints: typing.List[Endpoint]):
+        """
+        节点列表发生变化时调用
+        """
+        pass
+
+    def select(self, available: typing.List[Endpoint], identity: str) -> Endpoint:
+        """
+        从可用的节点中选择一个, available 不会为空, identity 为调用方的标识
+        """
+        raise NotImplementedError
+
+
+class RoundRobin(Strategy):
+    """
+    轮询
+    """
+
+    def __init__(self):
+        self._n = 0
+        self._lock = threading.Lock()
+
+    def select(self, available: typing.List[Endpoint], identity: str) -> Endpoint:
+        with self._lock:
+            n = self._n
+            self._n += 1
+        return available[n % len(available)]
+
+
+class LeastOutstanding(Strategy):
+    """
+    选择进行中请求最少的节点, 相同时选择耗时更低的节点
+    """
+
+    def select(self, available: typing.List[Endpoint], identity: str) -> Endpoint:
+        return min(available, key=lambda e: (e.outstanding, e.latency or 0.0))
+
+
+class PowerOfTwoChoices(Strategy):
+    """
+    随机选择两个节点, 使用其中负载更低的节点
+    """
+
+    def __init__(self, rand: random.Random = None):
+        self._rand = rand or random.Random()
+
+    def select(self, available: typing.List[Endpoint], identity: str) -> Endpoint:
+        if len(available) == 1:
+            return available[0]
+        a, b = self._rand.sample(available, 2)
+        return a if a.cost() <= b.cost() else b
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class ConsistentHash(Strategy):
+    """
+    以 identity 进行一致性 hash, 相同的 identity 总是选择相同的节点,
+    节点不可用时顺延至环上的下一个可用节点, replicas 为每个权重的虚拟节点数
+    """
+
+    def __init__(self, replicas: int = 100):
+        self.replicas = replicas
+        self._keys: typing.List[int] = []
+        self._ring: typing.List[Endpoint] = []
+
+    def prepare(self, endpoints: typing.List[Endpoint]):
+        points = []
+        for e in endpoints:
+            for i in range(self.replicas * max(e.weight, 1)):
+                points.append((_hash(f"{e.address}#{i}"), e))
+        points.sort(key=lambda p: p[0])
+        self._keys = [p[0] for p in points]
+        self._ring = [p[1] for p in points]
+
+    def select(self, available: typing.List[Endpoint], identity: str) -> Endpoint:
+        ids = {id(e) for e in available}
+        start = bisect.bisect(self._keys, _hash(identity))
+        for i in range(len(self._ring)):
+            e = self._ring[(start + i) % len(self._ring)]
+            if id(e) in ids:
+                return e
+        return available[0]
+
+
+class Lease(object):
+    __slots__ = ("endpoint", "conn", "start")
+
+    def __init__(self, endpoint: Endpoint, conn: PooledConnection, start: float):
+        self.endpoint = endpoint
+        self.conn = conn
+        self.start = start
+
+
+class Balancer(Pool):
+    """
+    多节点的连接管理器, addresses 为所有节点的地址, 连接通过 pool 按地址创建及复用,
+    strategy 为负载均衡策略, 默认为 PowerOfTwoChoices,
+    节点被报告不可用时移出可用列表 backoff * 2^(连续失败次数 - 1) 秒, 最长为 max_backoff 秒,
+    alpha 为耗时 EWMA 的平滑系数
+    """
+
+    def __init__(self, addresses: typing.List[typing.Union[str, Endpoint]],
+                 pool: ConnectionPool,
+                 strategy: Strategy = None,
+                 backoff: float = 1,
+                 max_backoff: float = 60,
+                 alpha: float = 0.3,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        self.endpoints = [a if isinstance(a, Endpoint) else Endpoint(a) for a in addresses]
+        if not self.endpoints:
+            raise ValueError("Balancer 至少需要一个节点")
+
+        self.pool = pool
+        self.strategy = strategy or PowerOfTwoChoices()
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.alpha = alpha
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.strategy.prepare(self.endpoints)
+
+    def get(self, key: str) -> 'BalancedConnectionInfo':
+        return BalancedConnectionInfo(self, key)
+
+    def acquire(self, identity: str) -> Lease:
+        """
+        选择节点并租借连接, 所有节点都不可用时抛出 NoUsefulConnectionError
+        """
+        while True:
+            now = self._clock()
+            with self._lock:
+                available = [e for e in self.endpoints if e.available(now)]
+                if not available:
+                    retry = min(e.ejected_until for e in self.endpoints) - now
+                    raise NoUsefulConnectionError(f"{identity} 没有可用的节点, {retry:.1f}s 后重试")
+                endpoint = self.strategy.select(available, identity)
+                endpoint.outstanding += 1
+
+            try:
+                conn = self.pool.acquire(endpoint.address)
+            except NoUsefulConnectionError:
+                with self._lock:
+                    endpoint.outstanding -= 1
+                self.eject(endpoint)
+                continue
+            return Lease(endpoint, conn, self._clock())
+
+    def restart(self, lease: Lease):
+        """
+        继续使用租借的连接发送新的请求, 重新开始计时
+        """
+        lease.start = self._clock()
+
+    def release(self, lease: Lease, ok: bool = True):
+        """
+        归还连接, 成功时以 lease.start 至今的时间更新节点耗时的 EWMA
+        """
+        seconds = self._clock() - lease.start
+        with self._lock:
+            lease.endpoint.outstanding -= 1
+            if ok:
+                lease.endpoint.observe(seconds, self.alpha)
+                lease.endpoint.failures = 0
+        self.pool.release(lease.conn)
+
+    def fail(self, lease: Lease):
+        """
+        连接不可用, 关闭连接并暂时移除该节点
+        """
+        with self._lock:
+            lease.endpoint.outstanding -= 1
+        self.pool.evict(lease.conn)
+        self.eject(lease.endpoint)
+
+    def eject(self, endpoint: Endpoint):
+        with self._lock:
+            endpoint.failures += 1
+            delay = min(self.backoff * 2 ** (endpoint.failures - 1), self.max_backoff)
+            endpoint.ejected_until = self._clock() + delay
+
+    def close(self):
+        self.pool.close()
+
+
+class BalancedConnectionInfo(ConnectionInfo):
+    """
+    来自 Balancer 的连接信息, 每个线程(或 asyncio 任务)在 release 之前使用同一个节点的连接, 因此可以被多个线程共享,
+    CallableImpl 在每次调用时 get_conn 并在调用结束后 release, 节点的 outstanding 即为进行中的请求数,
+    耗时从最近一次 get_conn 开始计算, 即单次请求的耗时,
+    useless 会移除当前的节点并关闭连接, 之后的 get_conn 将选择其他可用的节点,
+    使用 with 语句时会自动归还连接并记录耗时
+    """
+
+    def __init__(self, balancer: Balancer, identity: str, meta=None):
+        self.meta = meta
+        self.balancer = balancer
+        self.identity = identity
+        self._lease = LeaseLocal()
+
+    def __repr__(self):
+        return f"BalancedConnectionInfo({self.identity}, {self.endpoint}, meta: {self.meta})"
+
+    @property
+    def endpoint(self) -> typing.Union[Endpoint, None]:
+        lease = self._lease.get()
+        return lease and lease.endpoint
+
+    @property
+    def conn(self):
+        """
+        当前线程或任务租借的连接, 没有租借时为 None
+        """
+        lease = self._lease.get()
+        return lease and lease.conn.conn
+
+    def get_conn(self):
+        lease = self._lease.get()
+        if lease is None:
+            lease = self.balancer.acquire(self.identity)
+            self._lease.set(lease)
+        else:
+            self.balancer.restart(lease)
+        return lease.conn.conn
+
+    def release(self, ok: bool = True):
+        lease = self._lease.get()
+        if lease is not None:
+            self._lease.set(None)
+            self.balancer.release(lease, ok)
+
+    def useless(self):
+        lease = self._lease.get()
+        if lease is not None:
+            self._lease.set(None)
+            self.balancer.fail(lease)
+
+    def __enter__(self):
+        return self.get_conn()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release(exc_type is None)
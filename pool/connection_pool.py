@@ -0,0 +1,385 @@
+"""
+线程安全的连接池实现, 每个 key(一般为服务的 identity) 对应一组连接,
+通过 PooledConnectionInfo 以 租借/归还 的方式使用连接, 调用 useless 时会关闭并移除当前连接
+"""
+
+import threading
+import time
+import typing
+from collections import deque
+
+from .pool import ConnectionInfo, Pool, NoUsefulConnectionError, LeaseLocal
+
+# 创建连接, 参数为连接池的 key
+ConnectionFactory = typing.Callable[[str], typing.Any]
+# 检查连接是否可用
+HealthCheck = typing.Callable[[typing.Any], bool]
+
+
+def close_connection(conn: typing.Any):
+    """
+    默认的关闭连接的方式, 调用连接的 close 方法
+    """
+    close = getattr(conn, "close", None)
+    if close:
+        close()
+
+
+class PooledConnection(object):
+    """
+    连接池中的单个连接及其状态
+    """
+    __slots__ = ("key", "conn", "created", "last_used", "last_checked", "evicted")
+
+    def __init__(self, key: str, conn: typing.Any, now: float):
+        self.key = key
+        self.conn = conn
+        self.created = now
+        self.last_used = now
+        self.last_checked = now
+        self.evicted = False
+
+    def __repr__(self):
+        return f"PooledConnection({self.key}, {self.conn})"
+
+
+class KeyedPool(object):
+    """
+    单个 key 的连接集合, idle 中为空闲的连接, size 为已创建(包括已租借)的连接数
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.cond = threading.Condition()
+        self.idle: typing.Deque[PooledConnection] = deque()
+        self.size = 0
+        self.leased = 0
+        self.prefilled = False
+
+
+class PoolStat(object):
+    """
+    单个 key 的连接池状态
+    """
+
+    def __init__(self, key: str, size: int, idle: int, leased: int):
+        self.key = key
+        self.size = size
+        self.idle = idle
+        self.leased = leased
+
+    def __repr__(self):
+        return f"PoolStat({self.key}, size: {self.size}, idle: {self.idle}, leased: {self.leased})"
+
+
+class ConnectionPool(Pool):
+    """
+    线程安全的连接池, factory 用于为指定的 key 创建新的连接,
+    min_size 为每个 key 保持的最少连接数, max_size 为每个 key 的最大连接数,
+    idle_timeout 为空闲连接的最长保留时间, 超过后会被关闭(不会低于 min_size),
+    health_check 用于在租借空闲时间超过 check_interval 的连接前检查其是否可用,
+    acquire_timeout 为连接数已达上限时等待归还的最长时间, 超时抛出 NoUsefulConnectionError,
+    reap_interval 大于 0 时会启动后台线程定期关闭超时的空闲连接
+    """
+
+    def __init__(self, factory: ConnectionFactory,
+                 min_size: int = 0,
+                 max_size: int = 10,
+                 idle_timeout: float = 300,
+                 acquire_timeout: float = 5,
+                 health_check: typing.Union[HealthCheck, None] = None,
+                 check_interval: float = 30,
+                 close: typing.Callable[[typing.Any], None] = close_connection,
+                 reap_interval: float = 0,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"连接池大小配置错误, min_size: {min_size}, max_size: {max_size}")
+
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._health_check = health_check
+        self.check_interval = check_interval
+        self._close = close
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pools: typing.Dict[str, KeyedPool] = {}
+        self._closed = False
+
+        self._reaper: typing.Union[threading.Thread, None] = None
+        self._reaper_stop = threading.Event()
+        if reap_interval > 0:
+            self._reaper = threading.Thread(target=self._reap, args=(reap_interval,),
+                                            name="connection-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def get(self, key: str) -> 'PooledConnectionInfo':
+        """
+        获取 key 对应的连接信息, 连接会在调用 get_conn 时才从连接池中租借
+        """
+        return PooledConnectionInfo(self, key)
+
+    def keyed(self, key: str) -> KeyedPool:
+        with self._lock:
+            if self._closed:
+                raise NoUsefulConnectionError("连接池已关闭")
+            kp = self._pools.get(key)
+            if kp is None:
+                kp = KeyedPool(key)
+                self._pools[key] = kp
+
+        if not kp.prefilled:
+            self.prefill(kp)
+        return kp
+
+    def prefill(self, kp: KeyedPool):
+        """
+        为 key 预先创建 min_size 个连接
+        """
+        with kp.cond:
+            if kp.prefilled:
+                return
+            kp.prefilled = True
+            n = self.min_size - kp.size
+            kp.size += max(n, 0)
+
+        for i in range(n):
+            try:
+                pc = self.create(kp.key)
+            except NoUsefulConnectionError:
+                with kp.cond:
+                    kp.size -= n - i
+                    kp.cond.notify_all()
+                raise
+            with kp.cond:
+                kp.idle.append(pc)
+                kp.cond.notify()
+
+    def create(self, key: str) -> PooledConnection:
+        try:
+            conn = self._factory(key)
+        except Exception as e:
+            raise NoUsefulConnectionError(f"无法为 {key} 创建连接: {e}") from e
+        return PooledConnection(key, conn, self._clock())
+
+    def acquire(self, key: str, timeout: typing.Union[float, None] = None) -> PooledConnection:
+        """
+        租借一个连接, 优先使用最近归还的空闲连接, 没有空闲连接且未达到 max_size 时创建新的连接,
+        否则等待其他线程归还连接, 最多等待 timeout 秒(默认为 acquire_timeout)
+        """
+        kp = self.keyed(key)
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = self._clock() + timeout
+
+        while True:
+            pc, create, expired = None, False, []
+            with kp.cond:
+                expired = self.take_expired(kp)
+                while not kp.idle and kp.size >= self.max_size:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        break
+                    kp.cond.wait(remaining)
+
+                if kp.idle:
+                    pc = kp.idle.pop()
+                    kp.leased += 1
+                elif kp.size < self.max_size:
+                    kp.size += 1
+                    kp.leased += 1
+                    create = True
+
+            self.close_all(expired)
+            if pc is None and not create:
+                raise NoUsefulConnectionError(f"等待 {key} 的可用连接超时({timeout}s)")
+
+            if create:
+                try:
+                    return self.create(key)
+                except NoUsefulConnectionError:
+                    with kp.cond:
+                        kp.size -= 1
+                        kp.leased -= 1
+                        kp.cond.notify()
+                    raise
+
+            if self.healthy(pc):
+                return pc
+            self.evict(pc)
+
+    def healthy(self, pc: PooledConnection) -> bool:
+        """
+        距离上次检查超过 check_interval 时重新检查连接是否可用
+        """
+        if self._health_check is None:
+            return True
+
+        now = self._clock()
+        if now - pc.last_checked < self.check_interval:
+            return True
+
+        try:
+            ok = self._health_check(pc.conn)
+        except Exception:
+            ok = False
+        pc.last_checked = now
+        return bool(ok)
+
+    def release(self, pc: PooledConnection):
+        """
+        归还租借的连接
+        """
+        if pc.evicted:
+            return
+
+        kp = self._pools.get(pc.key)
+        if kp is None or self._closed:
+            pc.evicted = True
+            self._close_quietly(pc.conn)
+            return
+
+        with kp.cond:
+            pc.last_used = self._clock()
+            kp.leased -= 1
+            kp.idle.append(pc)
+            kp.cond.notify()
+
+    def evict(self, pc: PooledConnection):
+        """
+        关闭并移除租借的连接, 等待中的线程可以因此创建新的连接
+        """
+        if pc.evicted:
+            return
+        pc.evicted = True
+
+        kp = self._pools.get(pc.key)
+        if kp is not None:
+            with kp.cond:
+                kp.size -= 1
+                kp.leased -= 1
+                kp.cond.notify()
+        self._close_quietly(pc.conn)
+
+    def take_expired(self, kp: KeyedPool) -> typing.List[PooledConnection]:
+        """
+        移除空闲时间超过 idle_timeout 的连接并返回, 调用时需要持有 kp.cond
+        空闲连接按归还时间排列, 最早归还的连接在最左边
+        """
+        expired = []
+        now = self._clock()
+        while kp.idle and kp.size > self.min_size and now - kp.idle[0].last_used >= self.idle_timeout:
+            pc = kp.idle.popleft()
+            pc.evicted = True
+            kp.size -= 1
+            expired.append(pc)
+        return expired
+
+    def evict_idle(self):
+        """
+        关闭所有 key 中超时的空闲连接
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+
+        for kp in pools:
+            with kp.cond:
+                expired = self.take_expired(kp)
+            self.close_all(expired)
+
+    def _reap(self, interval: float):
+        while not self._reaper_stop.wait(interval):
+            self.evict_idle()
+
+    def close_all(self, conns: typing.List[PooledConnection]):
+        for pc in conns:
+            self._close_quietly(pc.conn)
+
+    def _close_quietly(self, conn: typing.Any):
+        try:
+            self._close(conn)
+        except Exception:
+            pass
+
+    def stat(self, key: str) -> PoolStat:
+        kp = self._pools.get(key)
+        if kp is None:
+            return PoolStat(key, 0, 0, 0)
+        with kp.cond:
+            return PoolStat(key, kp.size, len(kp.idle), kp.leased)
+
+    def close(self):
+        """
+        关闭连接池及所有空闲的连接, 仍在租借中的连接会在归还时关闭
+        """
+        self._reaper_stop.set()
+        with self._lock:
+            self._closed = True
+            pools = list(self._pools.values())
+            self._pools.clear()
+
+        for kp in pools:
+            with kp.cond:
+                idle = list(kp.idle)
+                kp.idle.clear()
+                kp.size -= len(idle)
+                kp.cond.notify_all()
+            for pc in idle:
+                pc.evicted = True
+            self.close_all(idle)
+
+
+class PooledConnectionInfo(ConnectionInfo):
+    """
+    来自 ConnectionPool 的连接信息, 每个线程(或 asyncio 任务)在 get_conn 时租借连接, 并在 release 前一直使用同一个连接,
+    因此同一个 PooledConnectionInfo 可以被多个线程共享, useless 会关闭并移除当前线程的连接,
+    之后的 get_conn 将租借新的连接, 也可以使用 with 语句自动归还连接:
+
+    ```
+    with pool.get("user") as conn:
+        ...
+    ```
+    """
+
+    def __init__(self, pool: ConnectionPool, key: str, meta=None):
+        self.meta = meta
+        self.pool = pool
+        self.key = key
+        self._lease = LeaseLocal()
+
+    def __repr__(self):
+        return f"PooledConnectionInfo({self.key}, {self.conn}, meta: {self.meta})"
+
+    @property
+    def conn(self):
+        """
+        当前线程或任务租借的连接, 没有租借时为 None
+        """
+        lease = self._lease.get()
+        return lease and lease.conn
+
+    def get_conn(self):
+        lease = self._lease.get()
+        if lease is None:
+            lease = self.pool.acquire(self.key)
+            self._lease.set(lease)
+        return lease.conn
+
+    def release(self, ok: bool = True):
+        lease = self._lease.get()
+        if lease is not None:
+            self._lease.set(None)
+            self.pool.release(lease)
+
+    def useless(self):
+        lease = self._lease.get()
+        if lease is not None:
+            self._lease.set(None)
+            self.pool.evict(lease)
+
+    def __enter__(self):
+        return self.get_conn()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release(exc_type is None)
@@ -1,8 +1,17 @@
 
+import contextvars
+import socket
+import typing
+
+
 class NoUsefulConnectionError(Exception):
     pass
 
 
+# 说明连接已不可用的异常, 调用出现这些异常时会通过 useless 关闭当前连接
+CONNECTION_ERRORS = (ConnectionError, TimeoutError, socket.timeout)
+
+
 class ConnectionInfo(object):
     """
     用于表示一个可复用的连接信息,
@@ -35,6 +44,45 @@ class ConnectionInfo(object):
         """
         pass
 
+    def release(self, ok: bool = True):
+        """
+        归还当前使用的连接, 来自连接池的连接使用完毕后需要归还, ok 为本次调用是否成功
+        """
+        pass
+
+
+# 当前上下文租借的连接, LeaseLocal -> 租借信息, 所有的 LeaseLocal 共用一个 ContextVar,
+# ContextVar 不会被回收, 因此不能为每个连接信息创建一个
+_leases: contextvars.ContextVar = contextvars.ContextVar("pool_leases", default=None)
+
+
+class LeaseLocal(object):
+    """
+    当前租借的连接, 按线程及 asyncio 的任务隔离, 同一个线程中并发执行的协程也会各自租借连接,
+    修改时复制字典, 因此任务中的租借不会影响创建任务的上下文
+    """
+
+    def get(self) -> typing.Any:
+        leases = _leases.get()
+        return None if leases is None else leases.get(self)
+
+    def set(self, lease: typing.Any):
+        leases = dict(_leases.get() or ())
+        if lease is None:
+            leases.pop(self, None)
+        else:
+            leases[self] = lease
+        _leases.set(leases or None)
+
+
+def detached_context() -> contextvars.Context:
+    """
+    复制当前的 context 用于在线程池中执行, 不继承当前租借的连接, 避免同一个连接被重复使用或归还
+    """
+    ctx = contextvars.copy_context()
+    ctx.run(_leases.set, None)
+    return ctx
+
 
 class Pool(object):
     def get(self, key: str) -> ConnectionInfo:
@@ -0,0 +1,132 @@
+import random
+import socket
+
+import pytest
+
+from ..balancer import Balancer, RoundRobin, LeastOutstanding, PowerOfTwoChoices, ConsistentHash
+from ..connection_pool import ConnectionPool
+from ..pool import NoUsefulConnectionError
+from ...bench.local_server import LocalServer, LineClient
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeConn(object):
+    def __init__(self, address):
+        self.address = address
+
+    def close(self):
+        pass
+
+
+def build(strategy, n=3, clock=None):
+    clock = clock or FakeClock()
+    pool = ConnectionPool(FakeConn, max_size=10, clock=clock)
+    return Balancer([f"node{i}" for i in range(n)], pool, strategy, backoff=1, max_backoff=4, clock=clock), clock
+
+
+def test_round_robin_over_sockets():
+    servers = [LocalServer().start() for _ in range(3)]
+    try:
+        def connect(address):
+            host, port = address.rsplit(":", 1)
+            return LineClient(socket.create_connection((host, int(port))))
+
+        addresses = [f"{s.address[0]}:{s.address[1]}" for s in servers]
+        balancer = Balancer(addresses, ConnectionPool(connect), RoundRobin())
+        info = balancer.get("echo")
+        for _ in range(6):
+            with info as conn:
+                assert conn.request(b"x") == b"x"
+        assert [s.accepted for s in servers] == [1, 1, 1]
+        balancer.close()
+    finally:
+        [s.stop() for s in servers]
+
+
+def test_least_outstanding_and_ewma():
+    balancer, clock = build(LeastOutstanding())
+    a, b = balancer.get("x"), balancer.get("x")
+    assert a.get_conn().address == "node0"
+    assert b.get_conn().address == "node1"
+    a.release(), b.release()
+
+    # 延迟更低的节点更容易被 PowerOfTwoChoices 选中
+    balancer.strategy = PowerOfTwoChoices(random.Random(1))
+    balancer.endpoints[0].latency = 0.5
+    balancer.endpoints[1].latency = 0.001
+    balancer.endpoints[2].latency = 0.5
+    picks = []
+    for _ in range(30):
+        with balancer.get("x") as conn:
+            clock.now += 0.01
+            picks.append(conn.address)
+    assert picks.count("node1") > 15
+    assert balancer.endpoints[1].latency < 0.5
+
+
+def test_consistent_hash_and_ejection():
+    balancer, clock = build(ConsistentHash())
+    info = balancer.get("user-42")
+    first = info.get_conn().address
+    info.release()
+    assert all(balancer.get("user-42").get_conn().address == first for _ in range(5))
+
+    info = balancer.get("user-42")
+    info.get_conn()
+    info.useless()
+    second = info.get_conn().address
+    assert second != first
+    info.release()
+
+    # 退避时间按失败次数指数增长, 恢复后重新使用原来的节点
+    endpoint = [e for e in balancer.endpoints if e.address == first][0]
+    assert endpoint.ejected_until == 1
+    balancer.eject(endpoint)
+    assert endpoint.ejected_until == 2
+    clock.now = 2
+    assert balancer.get("user-42").get_conn().address == first
+
+    for e in balancer.endpoints:
+        balancer.eject(e)
+    with pytest.raises(NoUsefulConnectionError):
+        balancer.get("user-42").get_conn()
+
+
+
+def test_repeated_get_conn():
+    balancer, clock = build(RoundRobin())
+    info = balancer.get("x")
+    conn = info.get_conn()
+    clock.now = 5
+    # 未归还时再次 get_conn 使用同一个连接, 耗时从最近一次 get_conn 开始计算
+    assert info.get_conn() is conn
+    clock.now = 5.5
+    info.release()
+    assert balancer.endpoints[0].latency == 0.5
+    assert all(e.outstanding == 0 for e in balancer.endpoints)
+
+def test_callable_impl_releases_per_call():
+    from ...ctx.callable_impl import CallableImpl
+
+    class Impl(object):
+        def __init__(self, conn):
+            self.conn = conn
+
+        def hello(self, clock):
+            clock.now += 0.01 if self.conn.address == "node0" else 0.1
+            return self.conn.address
+
+    balancer, clock = build(LeastOutstanding())
+    impl = CallableImpl(Impl, balancer.get("x"), balancer)
+    picks = [impl("hello", clock) for _ in range(20)]
+    # 每次调用后归还连接并记录单次请求的耗时, 耗时低的节点被更多地选中
+    assert all(e.outstanding == 0 for e in balancer.endpoints)
+    assert abs(balancer.endpoints[0].latency - 0.01) < 1e-9
+    assert picks.count("node0") > 15
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ..connection_pool import ConnectionPool
+from ..pool import NoUsefulConnectionError, detached_context
+from ...bench.local_server import LocalServer
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lease_release_and_useless():
+    with LocalServer() as server:
+        pool = ConnectionPool(server.connect, max_size=2)
+        for _ in range(3):
+            with pool.get("echo") as conn:
+                assert conn.request(b"hi") == b"hi"
+        assert server.accepted == 1
+
+        info = pool.get("echo")
+        conn = info.get_conn()
+        assert info.get_conn() is conn
+        info.useless()
+        assert conn.closed
+        assert info.get_conn() is not conn
+        info.release()
+        assert server.wait_accepted(2) and server.accepted == 2
+        assert pool.stat("echo").size == 1
+        pool.close()
+
+
+def test_acquire_timeout_and_max_size():
+    with LocalServer() as server:
+        pool = ConnectionPool(server.connect, max_size=2, acquire_timeout=0.05)
+        a, b = pool.acquire("echo"), pool.get("echo")
+        b.get_conn()
+        with pytest.raises(NoUsefulConnectionError):
+            pool.get("echo").get_conn()
+
+        # 归还后等待中的线程可以获取到连接
+        threading.Timer(0.02, pool.release, (a,)).start()
+        pool.acquire_timeout = 1
+        c = pool.get("echo")
+        assert c.get_conn().ping()
+
+        peak, lock = [0], threading.Lock()
+
+        def work():
+            for _ in range(20):
+                with pool.get("echo") as conn:
+                    with lock:
+                        peak[0] = max(peak[0], pool.stat("echo").leased)
+                    conn.request(b"x")
+
+        b.release(), c.release()
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        assert peak[0] <= 2 and server.accepted <= 2
+        pool.close()
+
+
+def test_idle_eviction_and_health_check():
+    clock = FakeClock()
+    healthy = [True]
+    with LocalServer() as server:
+        pool = ConnectionPool(server.connect, min_size=1, max_size=3, idle_timeout=10,
+                              health_check=lambda conn: healthy[0], check_interval=5, clock=clock)
+        infos = [pool.get("echo") for _ in range(3)]
+        conns = [info.get_conn() for info in infos]
+        [info.release() for info in infos]
+        assert pool.stat("echo").idle == 3
+
+        clock.now = 11
+        pool.evict_idle()
+        stat = pool.stat("echo")
+        assert stat.size == 1 and stat.idle == 1
+        assert sum(c.closed for c in conns) == 2
+
+        # 检查失败的连接会被关闭, 并创建新的连接
+        healthy[0] = False
+        clock.now = 20
+        with pool.get("echo") as conn:
+            assert conn not in conns
+        assert all(c.closed for c in conns)
+        pool.close()
+
+
+def test_lease_per_thread():
+    with LocalServer() as server:
+        pool = ConnectionPool(server.connect, max_size=4)
+        info = pool.get("echo")
+        conns, barrier = {}, threading.Barrier(3)
+
+        def work(i):
+            with info as conn:
+                conns[i] = conn
+                barrier.wait()
+                assert conn.request(str(i).encode()) == str(i).encode()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(3)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        # 共享的 PooledConnectionInfo 在每个线程中租借各自的连接, 并在使用后归还
+        assert len({id(c) for c in conns.values()}) == 3
+        assert pool.stat("echo").leased == 0 and info.conn is None
+        pool.close()
+
+
+
+def test_lease_per_task_and_detached_context():
+    with LocalServer() as server:
+        pool = ConnectionPool(server.connect, max_size=4)
+        a, b = pool.get("echo"), pool.get("echo")
+        conn = a.get_conn()
+        # 交给线程池执行的函数不继承当前租借的连接
+        assert detached_context().run(lambda: a.conn) is None
+        assert a.conn is conn and b.conn is None
+
+        async def task():
+            # 任务中的租借不会影响创建任务的上下文
+            return b.get_conn()
+
+        assert asyncio.run(task()) is not None
+        assert a.conn is conn and b.conn is None
+        a.release()
+        pool.close()
+
+def test_factory_error():
+    def fail(key):
+        raise ConnectionRefusedError(key)
+
+    pool = ConnectionPool(fail, max_size=1)
+    with pytest.raises(NoUsefulConnectionError):
+        pool.get("x").get_conn()
+    assert pool.stat("x").size == 0
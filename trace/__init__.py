@@ -1 +1,4 @@
-from .trace import TraceInfo
+from .sampling import Sampler, ProbabilitySampler, RateLimitSampler, set_sampler, get_sampler
+from .trace import TraceInfo, TraceInfoError, new_trace_id
+from .span import Span, StatusOK, StatusError
+from .collector import SpanCollector, TailPolicy, JsonlExporter, read_jsonl
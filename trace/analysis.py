@@ -0,0 +1,238 @@
+"""
+span 的分析工具, 根据 span id 的层级关系重建调用树, 计算每个请求的关键路径,
+按 identifier 统计自身耗时与子调用耗时, 并找出 p99 耗时的主要来源,
+可输出火焰图使用的 folded stacks 格式:
+
+    python -m <package>.trace.analysis spans.jsonl --folded out.folded --top 10
+"""
+
+import argparse
+import typing
+
+from .span import Span
+
+
+class SpanNode(object):
+    def __init__(self, span: Span):
+        self.span = span
+        self.children: typing.List[SpanNode] = []
+
+    @property
+    def start(self) -> float:
+        return self.span.start
+
+    @property
+    def end(self) -> float:
+        return self.span.start + (self.span.duration or 0.0)
+
+    @property
+    def identifier(self) -> str:
+        return self.span.identifier
+
+    def self_time(self) -> float:
+        """
+        自身耗时, 即总耗时减去被子调用覆盖的时间, 并发的子调用重叠的部分只计算一次
+        """
+        covered = 0.0
+        cursor = self.start
+        for child in sorted(self.children, key=lambda c: c.start):
+            start, end = max(child.start, cursor), min(child.end, self.end)
+            if end > start:
+                covered += end - start
+                cursor = end
+        return max((self.span.duration or 0.0) - covered, 0.0)
+
+    def walk(self, stack: typing.Tuple[str, ...] = ()) -> typing.Iterator[typing.Tuple[typing.Tuple[str, ...], 'SpanNode']]:
+        stack = stack + (self.identifier,)
+        yield stack, self
+        for child in self.children:
+            yield from child.walk(stack)
+
+    def __repr__(self):
+        return f"SpanNode({self.identifier}, {self.span.span_id}, children: {len(self.children)})"
+
+
+def build_trees(spans: typing.Iterable[Span]) -> typing.Dict[str, typing.List[SpanNode]]:
+    """
+    按 trace_id 重建调用树, 返回每个调用链的根节点, 上一级 span 不存在的节点都会作为根节点,
+    客户端与服务端记录的同一次调用的 span 有相同的 span id, 服务端的 span(local_root)会作为客户端 span 的子节点,
+    下一级的 span 则挂在服务端的 span 上
+    """
+    traces: typing.Dict[str, typing.Dict[str, typing.List[SpanNode]]] = {}
+    for span in spans:
+        traces.setdefault(span.trace_id, {}).setdefault(span.span_id, []).append(SpanNode(span))
+
+    result = {}
+    for trace_id, groups in traces.items():
+        roots = []
+        for group in groups.values():
+            group.sort(key=lambda n: (n.span.local_root, n.start))
+            for outer, inner in zip(group, group[1:]):
+                outer.children.append(inner)
+        for group in groups.values():
+            node = group[0]
+            parent = groups.get(node.span.parent_id)
+            if parent is None:
+                roots.append(node)
+            else:
+                parent[-1].children.append(node)
+        for group in groups.values():
+            for node in group:
+                node.children.sort(key=lambda c: c.start)
+        result[trace_id] = sorted(roots, key=lambda r: r.start)
+    return result
+
+
+def critical_path(root: SpanNode) -> typing.List[typing.Tuple[SpanNode, float]]:
+    """
+    计算关键路径, 从结束时间往前, 每次选择在当前时间点之前最晚结束的子调用,
+    返回关键路径上的节点及其在关键路径上的自身耗时, 各节点的耗时之和等于根节点的耗时
+    """
+    path: typing.List[typing.Tuple[SpanNode, float]] = []
+
+    def visit(node: SpanNode, end: float):
+        entry = len(path)
+        path.append((node, 0.0))
+        own = 0.0
+        cursor = min(node.end, end)
+        for child in sorted(node.children, key=lambda c: c.end, reverse=True):
+            if cursor <= node.start:
+                break
+            if child.start >= cursor:
+                # 在当前时间点之后才开始的子调用不在关键路径上
+                continue
+            child_end = min(child.end, cursor)
+            own += cursor - child_end
+            visit(child, child_end)
+            cursor = max(child.start, node.start)
+        own += max(cursor - node.start, 0.0)
+        path[entry] = (node, own)
+
+    visit(root, root.end)
+    return path
+
+
+class IdentifierStat(object):
+    __slots__ = ("identifier", "count", "total", "self_time", "critical")
+
+    def __init__(self, identifier: str):
+        self.identifier = identifier
+        self.count = 0
+        self.total = 0.0
+        self.self_time = 0.0
+        self.critical = 0.0
+
+    @property
+    def child_time(self) -> float:
+        return self.total - self.self_time
+
+    def __repr__(self):
+        return f"IdentifierStat({self.identifier}, count: {self.count}, self: {self.self_time:.6f}, " \
+               f"child: {self.child_time:.6f}, critical: {self.critical:.6f})"
+
+
+def quantile(values: typing.List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Analysis(object):
+    """
+    对一批 span 的分析结果
+    """
+
+    def __init__(self, spans: typing.Iterable[Span]):
+        self.trees = build_trees(spans)
+        self.roots = [root for roots in self.trees.values() for root in roots]
+
+    def identifiers(self) -> typing.Dict[str, IdentifierStat]:
+        """
+        每个 identifier 的调用次数、总耗时、自身耗时及在关键路径上的耗时
+        """
+        stats: typing.Dict[str, IdentifierStat] = {}
+        for root in self.roots:
+            for _, node in root.walk():
+                stat = stats.get(node.identifier)
+                if stat is None:
+                    stat = stats[node.identifier] = IdentifierStat(node.identifier)
+                stat.count += 1
+                stat.total += node.span.duration or 0.0
+                stat.self_time += node.self_time()
+            for node, own in critical_path(root):
+                stats[node.identifier].critical += own
+        return stats
+
+    def tail_contributors(self, q: float = 0.99, top: int = 10) -> typing.List[typing.Tuple[str, float]]:
+        """
+        耗时不小于 q 分位数的请求中, 关键路径上自身耗时最多的 identifier 及其占这些请求总耗时的比例
+        """
+        threshold = quantile([r.span.duration or 0.0 for r in self.roots], q)
+        slow = [r for r in self.roots if (r.span.duration or 0.0) >= threshold]
+        total = sum(r.span.duration or 0.0 for r in slow)
+        contrib: typing.Dict[str, float] = {}
+        for root in slow:
+            for node, own in critical_path(root):
+                contrib[node.identifier] = contrib.get(node.identifier, 0.0) + own
+        ranked = sorted(contrib.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        return [(identifier, seconds / total if total else 0.0) for identifier, seconds in ranked]
+
+    def folded(self, critical_only: bool = False) -> typing.List[str]:
+        """
+        folded stacks 格式, 每行为 "a;b;c 自身耗时(微秒)", 可直接用于 flamegraph.pl 等工具,
+        critical_only 为 True 时只统计关键路径上的耗时
+        """
+        stacks: typing.Dict[typing.Tuple[str, ...], float] = {}
+        for root in self.roots:
+            if critical_only:
+                on_path = {id(node): own for node, own in critical_path(root)}
+                for stack, node in root.walk():
+                    if id(node) in on_path:
+                        stacks[stack] = stacks.get(stack, 0.0) + on_path[id(node)]
+            else:
+                for stack, node in root.walk():
+                    stacks[stack] = stacks.get(stack, 0.0) + node.self_time()
+
+        return [f"{';'.join(stack)} {int(round(seconds * 1e6))}"
+                for stack, seconds in sorted(stacks.items()) if seconds > 0]
+
+    def report(self, q: float = 0.99, top: int = 10) -> str:
+        durations = [r.span.duration or 0.0 for r in self.roots]
+        lines = [
+            f"requests: {len(self.roots)}, p50: {quantile(durations, 0.5) * 1e3:.3f}ms, "
+            f"p99: {quantile(durations, 0.99) * 1e3:.3f}ms",
+            "",
+            f"{'identifier':<40}{'count':>8}{'self(ms)':>12}{'child(ms)':>12}{'critical(ms)':>14}",
+        ]
+        stats = sorted(self.identifiers().values(), key=lambda s: s.critical, reverse=True)
+        for s in stats[:top]:
+            lines.append(f"{s.identifier:<40}{s.count:>8}{s.self_time * 1e3:>12.3f}"
+                         f"{s.child_time * 1e3:>12.3f}{s.critical * 1e3:>14.3f}")
+        lines.append("")
+        lines.append(f"top contributors to p{int(q * 100)} latency:")
+        for identifier, share in self.tail_contributors(q, top):
+            lines.append(f"  {identifier:<40}{share * 100:>7.1f}%")
+        return "\n".join(lines)
+
+
+def main():
+    from .collector import read_jsonl
+
+    parser = argparse.ArgumentParser(description="critical path analysis of collected spans")
+    parser.add_argument("path", help="JsonlExporter 导出的文件")
+    parser.add_argument("--folded", help="输出 folded stacks 的文件")
+    parser.add_argument("--critical", action="store_true", help="folded stacks 只包含关键路径")
+    parser.add_argument("--quantile", type=float, default=0.99)
+    parser.add_argument("--top", type=int, default=10)
+    opts = parser.parse_args()
+
+    analysis = Analysis(read_jsonl(opts.path))
+    print(analysis.report(opts.quantile, opts.top))
+    if opts.folded:
+        with open(opts.folded, "w", encoding="utf-8") as f:
+            f.write("\n".join(analysis.folded(opts.critical)) + "\n")
+
+
+if __name__ == '__main__':
+    main()
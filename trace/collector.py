@@ -0,0 +1,200 @@
+"""
+进程内的 span 收集器, 结束的 span 写入有界的环形缓冲区, 由后台线程批量导出到本地的 JSON lines 文件
+"""
+
+import json
+import threading
+import time
+import typing
+from collections import deque, OrderedDict
+
+from .span import Span, StatusError
+from .trace import TraceInfo
+
+
+class TailPolicy(object):
+    """
+    尾部采样策略, 未被头部采样的调用链, 当其根节点的耗时不小于 latency 秒, 或 errors 为 True 且存在失败的 span 时保留
+    """
+
+    def __init__(self, latency: typing.Union[float, None] = 1.0, errors: bool = True):
+        self.latency = latency
+        self.errors = errors
+
+    def keep(self, root: Span, spans: typing.List[Span]) -> bool:
+        if self.latency is not None and root.duration is not None and root.duration >= self.latency:
+            return True
+        return self.errors and any(s.status == StatusError for s in spans)
+
+
+class _PendingTrace(object):
+    __slots__ = ("since", "spans")
+
+    def __init__(self, since: float):
+        self.since = since
+        self.spans: typing.List[Span] = []
+
+
+class SpanCollector(object):
+    """
+    环形缓冲区, 超过 capacity 时丢弃最早的 span, dropped 为丢弃的数量,
+    配置了 tail 时, 未被头部采样的调用链的 span 会先暂存, 在当前进程的根节点(如服务端通过 Context.span
+    记录的请求)结束时由 tail 决定是否保留, 只作为客户端的进程中没有根节点, 暂存超过 pending_timeout 秒,
+    或暂存的调用链超过 max_pending 个时, 最早的调用链会以其中最早开始的 span 作为根节点由 tail 决定是否保留
+    """
+
+    def __init__(self, capacity: int = 10000, tail: typing.Union[TailPolicy, None] = None,
+                 max_pending: int = 1000, pending_timeout: float = 10.0,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.tail = tail
+        self.max_pending = max_pending
+        self.pending_timeout = pending_timeout
+        self._clock = clock
+        self._spans: typing.Deque[Span] = deque(maxlen=capacity)
+        self._pending: typing.Dict[str, _PendingTrace] = OrderedDict()
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.tail_kept = 0
+        self.tail_dropped = 0
+
+    def wants(self, trace_info: typing.Union[TraceInfo, None]) -> bool:
+        """
+        是否需要为该 trace_info 记录 span, 未被采样且没有尾部采样时不记录
+        """
+        return trace_info is None or trace_info.sampled or self.tail is not None
+
+    def add(self, span: Span):
+        if not span.sampled:
+            if self.tail is not None:
+                self._add_pending(span)
+            return
+        with self._lock:
+            self._append(span)
+
+    def _append(self, span: Span):
+        # 调用时需要持有 self._lock
+        if len(self._spans) >= self.capacity:
+            self.dropped += 1
+        self._spans.append(span)
+
+    def _add_pending(self, span: Span):
+        now = self._clock()
+        with self._lock:
+            pending = self._pending.get(span.trace_id)
+            if pending is None:
+                pending = self._pending[span.trace_id] = _PendingTrace(now)
+            pending.spans.append(span)
+            if span.local_root:
+                del self._pending[span.trace_id]
+                self._decide(span, pending.spans)
+            self._expire(now)
+
+    def _expire(self, now: float):
+        """
+        对超过 max_pending 或暂存超过 pending_timeout 秒的调用链做出决定, 调用时需要持有 self._lock
+        """
+        while self._pending:
+            trace_id, pending = next(iter(self._pending.items()))
+            if len(self._pending) <= self.max_pending and now - pending.since < self.pending_timeout:
+                break
+            del self._pending[trace_id]
+            self._decide(min(pending.spans, key=lambda s: s.start), pending.spans)
+
+    def _decide(self, root: Span, spans: typing.List[Span]):
+        if self.tail.keep(root, spans):
+            self.tail_kept += 1
+            for s in spans:
+                self._append(s)
+        else:
+            self.tail_dropped += 1
+
+    def flush_pending(self):
+        """
+        对暂存超时的调用链做出决定, 由 JsonlExporter 定期调用, 没有新的 span 时也能及时导出
+        """
+        if self.tail is None:
+            return
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def drain(self, limit: int = 0) -> typing.List[Span]:
+        """
+        取出最多 limit 个 span, limit 为 0 时取出所有的 span
+        """
+        with self._lock:
+            limit = min(limit or len(self._spans), len(self._spans))
+            return [self._spans.popleft() for _ in range(limit)]
+
+    def snapshot(self) -> typing.List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def __len__(self):
+        return len(self._spans)
+
+
+class JsonlExporter(object):
+    """
+    每隔 interval 秒将 collector 中的 span 以 JSON lines 格式追加到 path, 每次最多写入 batch_size 个,
+    同时会定期对 collector 中暂存超时的调用链做出决定, close 时会导出剩余的 span
+    """
+
+    def __init__(self, collector: SpanCollector, path: str, interval: float = 1.0, batch_size: int = 1000):
+        self.collector = collector
+        self.path = path
+        self.interval = interval
+        self.batch_size = batch_size
+        self.exported = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.collector.flush_pending()
+                self.flush()
+            except OSError:
+                # 写入失败的这一批 span 会被丢弃, 之后的 span 在下一次继续导出
+                pass
+
+    def flush(self) -> int:
+        """
+        导出缓冲区中所有的 span, 返回导出的数量
+        """
+        total = 0
+        with self._lock:
+            while True:
+                spans = self.collector.drain(self.batch_size)
+                if not spans:
+                    break
+                lines = "".join(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n" for s in spans)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                total += len(spans)
+            self.exported += total
+        return total
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+
+def read_jsonl(path: str) -> typing.List[Span]:
+    """
+    读取 JsonlExporter 导出的 span
+    """
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                spans.append(Span.from_dict(json.loads(line)))
+    return spans
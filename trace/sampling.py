@@ -0,0 +1,69 @@
+"""
+TraceInfo 的头部采样策略, 在创建根 TraceInfo 时决定整个调用链是否采样, 并随编码传递给下游
+"""
+
+import random
+import threading
+import time
+import typing
+
+
+class Sampler(object):
+    """
+    采样策略的基类, 默认采样所有的调用链
+    """
+
+    def sample(self, identifier: str) -> bool:
+        return True
+
+
+class ProbabilitySampler(Sampler):
+    """
+    以 rate 的概率采样
+    """
+
+    def __init__(self, rate: float, rand: random.Random = None):
+        self.rate = rate
+        self._rand = rand or random.Random()
+
+    def sample(self, identifier: str) -> bool:
+        return self._rand.random() < self.rate
+
+
+class RateLimitSampler(Sampler):
+    """
+    每个 identifier 每秒最多采样 per_second 个调用链, 令牌桶的容量为 burst, 默认与 per_second 相同
+    """
+
+    def __init__(self, per_second: float, burst: float = None,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        self.per_second = per_second
+        self.burst = burst or max(per_second, 1)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # identifier -> (剩余的令牌, 上次补充的时间)
+        self._buckets: typing.Dict[str, typing.Tuple[float, float]] = {}
+
+    def sample(self, identifier: str) -> bool:
+        now = self._clock()
+        with self._lock:
+            tokens, last = self._buckets.get(identifier, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.per_second)
+            sampled = tokens >= 1
+            self._buckets[identifier] = (tokens - 1 if sampled else tokens, now)
+        return sampled
+
+
+_sampler: Sampler = Sampler()
+
+
+def set_sampler(sampler: Sampler):
+    """
+    设置创建根 TraceInfo 时使用的采样策略
+    """
+    global _sampler
+    _sampler = sampler
+
+
+def get_sampler() -> Sampler:
+    return _sampler
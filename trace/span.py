@@ -0,0 +1,85 @@
+"""
+调用的时间跨度(span), 记录一次调用的开始时间、耗时、状态及自定义属性
+"""
+
+import time
+import typing
+
+from .trace import TraceInfo
+
+StatusOK = "ok"
+StatusError = "error"
+
+
+class Span(object):
+    """
+    由 TraceInfo 创建, start 为开始时的时间戳(秒), 耗时使用单调时钟计算,
+    调用 finish 之前 duration 为 None, local_root 表示该 span 是当前进程中调用链的根节点
+    """
+    __slots__ = ("trace_id", "span_id", "identifier", "sampled", "local_root", "start", "duration",
+                 "status", "error", "attributes", "_begin")
+
+    def __init__(self, trace_info: TraceInfo, attributes: typing.Dict[str, typing.Any] = None,
+                 local_root: bool = False):
+        self.trace_id = trace_info.trace_id
+        self.span_id = trace_info.span_id
+        self.identifier = trace_info.identifier
+        self.sampled = trace_info.sampled
+        self.local_root = local_root
+        self.attributes = attributes or {}
+        self.status = StatusOK
+        self.error: typing.Union[str, None] = None
+        self.duration: typing.Union[float, None] = None
+        self.start = time.time()
+        self._begin = time.perf_counter()
+
+    @property
+    def parent_id(self) -> str:
+        """
+        上一级的 span id, 根节点返回空字符串
+        """
+        index = self.span_id.rfind(",")
+        return self.span_id[:index] if index >= 0 else ""
+
+    @property
+    def finished(self) -> bool:
+        return self.duration is not None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def finish(self, error: typing.Union[BaseException, None] = None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._begin
+        if error is not None:
+            self.status = StatusError
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "identifier": self.identifier,
+            "sampled": self.sampled,
+            "local_root": self.local_root,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    @staticmethod
+    def from_dict(d: typing.Dict[str, typing.Any]) -> 'Span':
+        span = Span(TraceInfo(d["identifier"], d["trace_id"], d["span_id"], sampled=d.get("sampled", True)),
+                    d.get("attributes"), d.get("local_root", False))
+        span.start = d["start"]
+        span.duration = d["duration"]
+        span.status = d.get("status", StatusOK)
+        span.error = d.get("error")
+        return span
+
+    def __repr__(self):
+        return f"Span({self.identifier}, {self.span_id}, {self.status}, duration: {self.duration})"
@@ -0,0 +1,83 @@
+import pytest
+
+from ..analysis import Analysis, build_trees, critical_path
+from ..span import Span
+
+
+def span(trace_id, span_id, identifier, start_ms, end_ms, status="ok", local_root=False):
+    return Span.from_dict({
+        "trace_id": trace_id, "span_id": span_id, "identifier": identifier,
+        "start": 1000 + start_ms / 1e3, "duration": (end_ms - start_ms) / 1e3, "status": status,
+        "local_root": local_root,
+    })
+
+
+def request(trace_id, slow_ms=0):
+    """
+    api 调用了并发的 a 及 b, 之后调用 c, c 又调用了 d
+    """
+    return [
+        span(trace_id, "1", "api", 0, 100 + slow_ms),
+        span(trace_id, "1,0", "a.get", 0, 30),
+        span(trace_id, "1,1", "b.get", 10, 60),
+        span(trace_id, "1,2", "c.get", 60, 90 + slow_ms),
+        span(trace_id, "1,2,0", "d.get", 65, 85 + slow_ms),
+    ]
+
+
+def test_critical_path():
+    root, = build_trees(request("t1"))["t1"]
+    assert [c.identifier for c in root.children] == ["a.get", "b.get", "c.get"]
+    assert root.self_time() == pytest.approx(0.010)
+
+    path = {node.identifier: own for node, own in critical_path(root)}
+    assert path == pytest.approx({"api": 0.010, "c.get": 0.010, "d.get": 0.020, "b.get": 0.050, "a.get": 0.010})
+    assert sum(path.values()) == pytest.approx(root.span.duration)
+
+
+def test_analysis_and_folded():
+    spans = []
+    for i in range(99):
+        spans += request(f"t{i}")
+    spans += request("slow", slow_ms=400)
+    analysis = Analysis(spans)
+
+    stats = analysis.identifiers()
+    assert stats["api"].count == 100
+    assert stats["c.get"].child_time == pytest.approx(0.020 * 99 + 0.420)
+
+    top = analysis.tail_contributors(0.99, top=2)
+    assert top[0][0] == "d.get"
+    assert top[0][1] == pytest.approx(0.420 / 0.5)
+
+    folded = Analysis(request("t1")).folded()
+    assert folded == [
+        "api 10000",
+        "api;a.get 30000",
+        "api;b.get 50000",
+        "api;c.get 10000",
+        "api;c.get;d.get 20000",
+    ]
+    assert Analysis(request("t1")).folded(critical_only=True)[1] == "api;a.get 10000"
+    assert "top contributors to p99 latency" in analysis.report()
+
+
+def test_orphan_spans_become_roots():
+    trees = build_trees([span("t", "1,3", "x", 0, 10), span("t", "1,3,0", "y", 1, 5)])
+    root, = trees["t"]
+    assert root.identifier == "x" and root.children[0].identifier == "y"
+
+
+def test_server_span_nested_under_client():
+    trees = build_trees([
+        span("t", "1", "api", 0, 100, local_root=True),
+        span("t", "1,0", "c.get", 10, 90),
+        span("t", "1,0", "c.get", 20, 80, local_root=True),
+        span("t", "1,0,0", "d.get", 30, 70),
+    ])
+    root, = trees["t"]
+    client, = root.children
+    server, = client.children
+    assert not client.span.local_root and server.span.local_root
+    assert [c.identifier for c in server.children] == ["d.get"]
+    assert client.self_time() == pytest.approx(0.020)
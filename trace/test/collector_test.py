@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+
+import pytest
+
+from ...ctx import Context, ContextCache
+from ...pool import ConnectionInfo, Pool
+from ..collector import SpanCollector, JsonlExporter, read_jsonl
+from ..span import StatusError
+from ..trace import TraceInfo
+
+
+class FakePool(Pool):
+    def get(self, key: str) -> ConnectionInfo:
+        return ConnectionInfo(key)
+
+
+class EchoImpl(object):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    def fail(self, args):
+        raise ValueError(args)
+
+
+def test_ring_buffer():
+    collector = SpanCollector(capacity=3)
+    root = TraceInfo("root")
+    ctx = Context(root, client_cache=ContextCache(FakePool()), collector=collector)
+    for i in range(5):
+        with ctx.span({"i": i}):
+            pass
+    assert len(collector) == 3
+    assert collector.dropped == 2
+    assert [s.attributes["i"] for s in collector.drain(2)] == [2, 3]
+    assert [s.attributes["i"] for s in collector.drain()] == [4]
+
+
+def test_context_call_records_spans():
+    cache = ContextCache(FakePool())
+    cache.set("echo", EchoImpl)
+    collector = SpanCollector()
+    ctx = Context(TraceInfo("root"), client_cache=cache, collector=collector)
+
+    with ctx.span():
+        ctx.call("echo", "sleep", 0.02)
+        with pytest.raises(ValueError):
+            ctx.call("echo", "fail", "bad")
+        ctx.call_many([("echo", "sleep", 0.01), ("echo", "sleep", 0.01)])
+
+    spans = {s.span_id: s for s in collector.drain()}
+    assert set(spans) == {"1", "1,0", "1,1", "1,2", "1,3"}
+    assert spans["1,0"].identifier == "echo.sleep"
+    assert spans["1,0"].parent_id == "1"
+    assert spans["1,0"].duration >= 0.02
+    assert spans["1,1"].status == StatusError
+    assert "ValueError" in spans["1,1"].error
+    assert spans["1"].duration >= spans["1,0"].duration + spans["1,2"].duration
+    assert spans["1,3"].attributes == {"impl": "echo", "action": "sleep"}
+
+
+def test_jsonl_exporter():
+    collector = SpanCollector()
+    ctx = Context(TraceInfo("root"), collector=collector)
+    path = os.path.join(tempfile.mkdtemp(), "spans.jsonl")
+    exporter = JsonlExporter(collector, path, interval=0.01, batch_size=2)
+    for i in range(5):
+        with ctx.child(f"child{i}").span({"i": i}):
+            pass
+    time.sleep(0.1)
+    exporter.close()
+
+    spans = read_jsonl(path)
+    assert [s.attributes["i"] for s in spans] == list(range(5))
+    assert [s.span_id for s in spans] == [f"1,{i}" for i in range(5)]
+    assert exporter.exported == 5
@@ -0,0 +1,135 @@
+import random
+import time
+
+from ...ctx import Context, ContextCache
+from ...pool import ConnectionInfo, Pool
+from ..collector import SpanCollector, TailPolicy
+from ..sampling import ProbabilitySampler, RateLimitSampler, Sampler, set_sampler
+from ..trace import TraceInfo
+
+
+class FakePool(Pool):
+    def get(self, key: str) -> ConnectionInfo:
+        return ConnectionInfo(key)
+
+
+class EchoImpl(object):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def fail(self, args):
+        raise ValueError(args)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_head_sampling_propagates():
+    set_sampler(ProbabilitySampler(0.0))
+    try:
+        root = TraceInfo("root")
+    finally:
+        set_sampler(Sampler())
+    root.set_meta("user", "x")
+    assert not root.sampled
+
+    child = TraceInfo.from_exists(root, "a.b")
+    assert not child.sampled
+    for decoded in (TraceInfo.decode(child.to_header()), TraceInfo.from_bytes(child.to_bytes())):
+        assert not decoded.sampled
+        assert decoded.trace_id == root.trace_id
+    # 未采样时不序列化 meta
+    assert TraceInfo.decode(root.to_header()).meta == {}
+    assert TraceInfo.from_bytes(root.to_bytes()).meta == {}
+
+    # 下游收到的 TraceInfo 不会重新采样
+    assert TraceInfo("x", root.trace_id).sampled
+
+
+def test_samplers():
+    sampler = ProbabilitySampler(0.25, random.Random(7))
+    n = sum(sampler.sample("a") for _ in range(10000))
+    assert 2300 < n < 2700
+
+    clock = FakeClock()
+    sampler = RateLimitSampler(2, clock=clock)
+    assert [sampler.sample("a") for _ in range(3)] == [True, True, False]
+    assert sampler.sample("b")
+    clock.now = 0.5
+    assert sampler.sample("a")
+    assert not sampler.sample("a")
+
+
+def build(collector: SpanCollector, sampled: bool) -> Context:
+    cache = ContextCache(FakePool())
+    cache.set("echo", EchoImpl)
+    return Context(TraceInfo("root", sampled=sampled), client_cache=cache, collector=collector)
+
+
+def test_unsampled_skips_spans():
+    collector = SpanCollector()
+    ctx = build(collector, sampled=False)
+    with ctx.span() as span:
+        ctx.call("echo", "sleep", 0)
+    assert span is None
+    assert len(collector) == 0
+
+
+def test_tail_sampling():
+    collector = SpanCollector(tail=TailPolicy(latency=0.05))
+
+    # 快且成功的调用链被丢弃
+    ctx = build(collector, sampled=False)
+    with ctx.span():
+        ctx.call("echo", "sleep", 0)
+    assert len(collector) == 0 and collector.pending() == 0
+
+    # 失败的调用链被保留
+    ctx = build(collector, sampled=False)
+    with ctx.span():
+        try:
+            ctx.call("echo", "fail", 1)
+        except ValueError:
+            pass
+    assert len(collector) == 2
+
+    # 慢的调用链被保留
+    ctx = build(collector, sampled=False)
+    with ctx.span():
+        ctx.call("echo", "sleep", 0.06)
+    assert len(collector) == 4
+    assert (collector.tail_kept, collector.tail_dropped) == (2, 1)
+
+    # 头部采样的调用链直接保留
+    ctx = build(collector, sampled=True)
+    with ctx.span():
+        ctx.call("echo", "sleep", 0)
+    assert len(collector) == 6
+
+
+def test_tail_pending_flush():
+    clock = FakeClock()
+    collector = SpanCollector(tail=TailPolicy(latency=None), max_pending=2, pending_timeout=5, clock=clock)
+
+    # 只作为客户端时没有根节点, 失败的调用链在超时后保留
+    ctx = Context(TraceInfo("client", sampled=False), collector=collector)
+    ctx.finish_span(ctx.child("a").start_span(), ValueError("x"))
+    assert collector.pending() == 1 and len(collector) == 0
+    clock.now = 5
+    collector.flush_pending()
+    assert collector.pending() == 0 and len(collector) == 1
+
+    # 超过 max_pending 时最早的调用链同样由 tail 决定, 而不是直接丢弃
+    for i in range(3):
+        ctx = Context(TraceInfo(f"c{i}", sampled=False), collector=collector)
+        ctx.finish_span(ctx.child("a").start_span(), ValueError("x") if i == 0 else None)
+    assert collector.pending() == 2 and len(collector) == 2
+    assert (collector.tail_kept, collector.tail_dropped) == (2, 0)
@@ -0,0 +1,50 @@
+import pytest
+
+from ..trace import TraceInfo, TraceInfoError, new_trace_id, SPLITTER
+
+
+def test_trace_id():
+    ids = {new_trace_id() for _ in range(10000)}
+    assert len(ids) == 10000
+    for trace_id in list(ids)[:10]:
+        assert len(trace_id) == 32
+        int(trace_id, 16)
+
+
+def test_header_and_bytes_roundtrip():
+    root = TraceInfo("root")
+    child = TraceInfo.from_exists(TraceInfo.from_exists(root, "a.b"), "c.d")
+    child.set_meta("user", "中文")
+
+    for decoded in (TraceInfo.decode(child.to_header()), TraceInfo.from_bytes(child.to_bytes())):
+        assert decoded.identifier == "c.d"
+        assert decoded.trace_id == root.trace_id
+        assert decoded.span_id == child.span_id
+        assert decoded.meta == {"user": "中文"}
+
+    # meta 为空时不进行序列化
+    assert root.to_header() == f"{root.trace_id};1;root"
+    assert len(root.to_bytes()) < 30
+
+    # 非十六进制的 trace id
+    custom = TraceInfo("x", trace_id="legacy-id", span_id="1,300,2")
+    assert TraceInfo.from_bytes(custom.to_bytes()).span_id == "1,300,2"
+    assert TraceInfo.from_bytes(custom.to_bytes()).trace_id == "legacy-id"
+
+
+def test_legacy_encoding():
+    t = TraceInfo("root", "5e8c1b2f9d1e8a0001a2b3c4", "1,2", {"k": 1})
+    encoded = t.encode()
+    assert encoded.count(SPLITTER) == 3
+    decoded = TraceInfo.decode(encoded)
+    assert (decoded.identifier, decoded.trace_id, decoded.span_id, decoded.meta) == \
+        ("root", t.trace_id, "1,2", {"k": 1})
+
+
+def test_invalid():
+    with pytest.raises(TraceInfoError):
+        TraceInfo.decode("only-trace-id")
+    with pytest.raises(TraceInfoError):
+        TraceInfo.from_bytes(b"\x01\x01\x00")
+    with pytest.raises(TraceInfoError):
+        TraceInfo("a;b").to_header()
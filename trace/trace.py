@@ -1,7 +1,81 @@
+import itertools
 import json
-import bson
+import os
+import random
+import typing
+
+from .sampling import get_sampler
 
 SPLITTER: str = "[SPLITTER]"
+# to_header 使用的分隔符, identifier 中不能包含该字符
+HEADER_SPLITTER: str = ";"
+# 二进制编码的版本
+BINARY_VERSION = 1
+_FLAG_RAW_TRACE_ID = 0x01
+_FLAG_NOT_SAMPLED = 0x02
+# to_header 中未采样的 trace id 的后缀, 与 W3C traceparent 的 flags 一致
+NOT_SAMPLED_SUFFIX = "-00"
+
+_id_prefix = ""
+_id_counter = itertools.count()
+
+
+def _reset_trace_ids():
+    """
+    重新生成进程的随机前缀, fork 出的子进程也会重新生成, 避免与父进程产生相同的 id
+    """
+    global _id_prefix, _id_counter
+    _id_prefix = "%016x" % random.SystemRandom().getrandbits(64)
+    _id_counter = itertools.count(1)
+
+
+_reset_trace_ids()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_trace_ids)
+
+
+def new_trace_id() -> str:
+    """
+    生成 32 位十六进制的 trace id, 与 W3C traceparent 中的 trace-id 格式一致,
+    前 64 位为进程的随机前缀, 后 64 位为递增的计数
+    """
+    return "%s%016x" % (_id_prefix, next(_id_counter))
+
+
+def _write_varint(out: bytearray, n: int):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data: bytes, pos: int) -> typing.Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _write_str(out: bytearray, s: str):
+    data = s.encode("utf-8")
+    if len(data) < 0x80:
+        out.append(len(data))
+    else:
+        _write_varint(out, len(data))
+    out += data
+
+
+def _read_str(data: bytes, pos: int) -> typing.Tuple[str, int]:
+    n = data[pos]
+    if n < 0x80:
+        pos += 1
+    else:
+        n, pos = _read_varint(data, pos)
+    return data[pos:pos + n].decode("utf-8"), pos + n
 
 
 class TraceInfoError(Exception):
@@ -12,7 +86,8 @@ class TraceInfo(object):
     """
     TODO: 用于实现 open tracing 相关的接口
     """
-    def __init__(self, identifier: str, trace_id: str = "", span_id: str = "1", meta=None):
+    def __init__(self, identifier: str, trace_id: str = "", span_id: str = "1", meta=None,
+                 sampled: typing.Union[bool, None] = None):
         """
         identifier 用于作为该 TraceInfo 的当前标识符，比如使用当前调用的服务名
         meta 用于记录自定义信息，比如调用时间，及调用的接口名称等等
@@ -35,13 +110,20 @@ class TraceInfo(object):
         11 依赖于 111、112、113
         12 依赖于 121、122、123
 
+        sampled 表示该调用链是否被采样, 未传递时, 根 TraceInfo 由 get_sampler 决定, 其他的默认为采样,
+        未采样的调用链在编码时不会序列化 meta
+
         :param identifier
         :param trace_id:
         :param span_id:
         :param meta
+        :param sampled
         """
         self.identifier = identifier or "UNKNOWN.UNKNOWN"
-        self.trace_id = trace_id or str(bson.ObjectId())
+        if sampled is None:
+            sampled = get_sampler().sample(self.identifier) if not trace_id else True
+        self.sampled = sampled
+        self.trace_id = trace_id or new_trace_id()
         self.span_id = span_id
         self.next_id = -1
         self.meta = meta or {}
@@ -72,29 +154,110 @@ class TraceInfo(object):
     def from_exists(prev: 'TraceInfo', new_identifier: str, step_in: bool = True):
         if step_in:
             prev.increase_span()
-        t = TraceInfo(new_identifier, prev.trace_id, step_in and prev.next_span() or prev.span_id)
+        t = TraceInfo(new_identifier, prev.trace_id, step_in and prev.next_span() or prev.span_id,
+                      sampled=prev.sampled)
         return t
 
     def encode(self) -> str:
+        """
+        旧的以 SPLITTER 分隔的编码, 用于兼容尚未升级的服务, 新的服务应使用 to_header 或 to_bytes,
+        该编码不包含采样信息
+        """
         return SPLITTER.join([
             self.identifier,
             self.trace_id,
             self.span_id,
-            json.dumps(self.meta)
+            json.dumps(self.meta) if self.meta and self.sampled else "{}"
         ])
 
     @staticmethod
     def decode(ts: str) -> 'TraceInfo':
+        """
+        解码 encode 或 to_header 的结果
+        """
+        if SPLITTER not in ts:
+            return TraceInfo.from_header(ts)
+
         segments = ts.split(SPLITTER)
         if len(segments) != 4:
             raise TraceInfoError(f"接收到的 TraceInfo 的格式不正确, 错误的格式为: {ts}")
 
         return TraceInfo(segments[0], segments[1], segments[2], json.loads(segments[3]))
 
+    def to_header(self) -> str:
+        """
+        适合放在 HTTP header 或 gRPC metadata 中的紧凑编码, 格式为 trace_id[-00];span_id;identifier[;meta],
+        未采样时 trace_id 带有 -00 后缀, meta 为空或未采样时不进行序列化
+        """
+        if HEADER_SPLITTER in self.identifier:
+            raise TraceInfoError(f"identifier 中不能包含 {HEADER_SPLITTER}: {self.identifier}")
+        if not self.sampled:
+            return f"{self.trace_id}{NOT_SAMPLED_SUFFIX};{self.span_id};{self.identifier}"
+        header = f"{self.trace_id};{self.span_id};{self.identifier}"
+        if self.meta:
+            header += HEADER_SPLITTER + json.dumps(self.meta, separators=(",", ":"))
+        return header
+
+    @staticmethod
+    def from_header(header: str) -> 'TraceInfo':
+        segments = header.split(HEADER_SPLITTER, 3)
+        if len(segments) < 3 or not segments[0] or not segments[1]:
+            raise TraceInfoError(f"接收到的 TraceInfo 的格式不正确, 错误的格式为: {header}")
+        meta = json.loads(segments[3]) if len(segments) == 4 else None
+        trace_id = segments[0]
+        sampled = not trace_id.endswith(NOT_SAMPLED_SUFFIX)
+        if not sampled:
+            trace_id = trace_id[:-len(NOT_SAMPLED_SUFFIX)]
+        return TraceInfo(segments[2], trace_id, segments[1], meta, sampled)
+
+    def to_bytes(self) -> bytes:
+        """
+        二进制编码, 32 位十六进制的 trace id 以 16 字节存储, 其余字段以 varint 长度前缀的 utf-8 存储,
+        meta 为空或未采样时不进行序列化
+        """
+        trace_id = self.trace_id
+        out = bytearray((BINARY_VERSION, 0 if self.sampled else _FLAG_NOT_SAMPLED))
+        if len(trace_id) == 32:
+            try:
+                out += bytes.fromhex(trace_id)
+                out[1] |= _FLAG_RAW_TRACE_ID
+            except ValueError:
+                _write_str(out, trace_id)
+        else:
+            _write_str(out, trace_id)
+
+        _write_str(out, self.span_id)
+        _write_str(out, self.identifier)
+        _write_str(out, json.dumps(self.meta, separators=(",", ":")) if self.meta and self.sampled else "")
+        return bytes(out)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'TraceInfo':
+        try:
+            if data[0] != BINARY_VERSION:
+                raise TraceInfoError(f"不支持的 TraceInfo 编码版本: {data[0]}")
+            if data[1] & _FLAG_RAW_TRACE_ID:
+                trace_id, pos = data[2:18].hex(), 18
+                if pos > len(data):
+                    raise IndexError("trace id 不完整")
+            else:
+                trace_id, pos = _read_str(data, 2)
+
+            span_id, pos = _read_str(data, pos)
+            identifier, pos = _read_str(data, pos)
+            meta, pos = _read_str(data, pos)
+        except (IndexError, UnicodeDecodeError) as e:
+            raise TraceInfoError(f"接收到的 TraceInfo 的格式不正确: {e}")
+        if pos > len(data):
+            raise TraceInfoError("接收到的 TraceInfo 的格式不正确: 数据不完整")
+        return TraceInfo(identifier, trace_id, span_id, json.loads(meta) if meta else None,
+                         not data[1] & _FLAG_NOT_SAMPLED)
+
     def __repr__(self):
         """
         """
-        return f"TraceInfo: I({self.identifier}) S({self.span_id}) T({self.trace_id}) N({self.next_id})"
+        return f"TraceInfo: I({self.identifier}) S({self.span_id}) T({self.trace_id}) N({self.next_id})" \
+               f"{'' if self.sampled else ' unsampled'}"
 
 
 def __test_trace_id__():
@@ -10,5 +10,11 @@ from .type_def import RpcType, Integer, Float, String, List, Bool, \
 from .type_check import is_base_type, is_boolean, is_dict, is_list, \
     is_numeric, is_string, is_enum
 
-from .type_util import rpc_doc_args_key, rpc_doc_resp_key, rpc_doc_type_key, \
+from .type_util import rpc_doc_args_key, rpc_doc_resp_key, rpc_doc_type_key, rpc_doc_cache_key, \
     Model, Fields, fields
+
+from .type_profile import Profiler, profiler
+
+from .type_gen import PayloadGenerator, GeneratorError
+
+from .type_codec import DictCodec, codec_of
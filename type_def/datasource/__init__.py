@@ -1,8 +1,13 @@
 from .ds_base import Operator
-from .ds_error import DataSourceInvalidError, DataSourceEmptyError
-from .ds_field import ModelFieldOp, ModelField, FieldMode, ArgItem, Args, args
+from .ds_error import DataSourceInvalidError, DataSourceEmptyError, DataSourceCursorError
+from .ds_field import ModelFieldOp, ModelField, FieldMode, ArgItem, Args, args, resolve_arg
 from .ds_stm import EntryDataSource as DataSource
 from .ds_pipe import Pipe
+from .ds_runner import PipeRunner, PipeResult, NodeResult, StageStat
 from .ds_func import func
-from .ds_sql_info import SQLInfo
+from .ds_sql_info import SQLInfo, KeysetInfo, BulkInfo
+from .ds_compiler import SQLCompiler, CompiledSQL, CompiledBulk, MYSQL, SQLITE, POSTGRESQL
+from .ds_engine import Engine, DBAPIEngine, BulkResult, ChunkStat
+from .ds_cache import ResultCache
+from .ds_cursor import encode_cursor, decode_cursor
 from .ds_loop import Loop
@@ -13,8 +13,17 @@ class Operator:
     def get_source(self) -> 'DataSource':
         return self._source
 
-    def analyse(self):
-        raise NotImplemented
+    def changed(self):
+        """
+        状态的定义发生了变化, 修改定义的接口都需要调用
+        """
+        self._source.changed()
+
+    def analyse(self, info: 'SQLInfo'):
+        """
+        将当前操作的定义信息写入 info 中，每个状态都需要实现该接口
+        """
+        raise NotImplementedError
 
 
 class DataSource(object):
@@ -27,6 +36,13 @@ class DataSource(object):
 
     def add_exp(self, exp: Operator):
         self._ops.append(exp)
+        self.changed()
+
+    def changed(self):
+        """
+        定义发生变化时调用, 子类可在此清除缓存的编译结果
+        """
+        pass
 
     def get_exps(self) -> typing.List[Operator]:
         return self._ops
@@ -0,0 +1,153 @@
+"""
+DataSource 的查询结果缓存, 以编译后的语句及绑定后的参数作为缓存的 key,
+支持 TTL 过期、LRU 淘汰及按字节数限制缓存大小, 并记录每条缓存所涉及的表,
+以便在写入这些表时使其失效
+"""
+
+import sys
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+
+def _freeze(value: typing.Any) -> typing.Hashable:
+    """
+    将参数转换为可 hash 的形式
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        # 集合的迭代顺序不固定, 相同的集合需要得到相同的 key
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _sizeof(value: typing.Any) -> int:
+    """
+    估算查询结果所占用的字节数
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_sizeof(v) for v in value)
+    return size
+
+
+class CacheEntry(object):
+    __slots__ = ("value", "expires", "size", "tables")
+
+    def __init__(self, value: typing.Any, expires: float, size: int, tables: typing.List[str]):
+        self.value = value
+        self.expires = expires
+        self.size = size
+        self.tables = tables
+
+
+class ResultCache(object):
+    """
+    线程安全的查询结果缓存, max_bytes 为所有缓存结果的估算字节数上限,
+    max_entries 为缓存条数的上限, 超出任一上限时淘汰最久未使用的缓存
+    缓存的结果会直接返回给所有的调用方, 调用方不应修改返回的结果
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 10000,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: typing.Dict[typing.Hashable, CacheEntry] = OrderedDict()
+        self._tables: typing.Dict[str, typing.Set[typing.Hashable]] = {}
+        # 每张表的失效次数, 用于避免查询期间发生的写入被过期的查询结果覆盖
+        self._generation: typing.Dict[str, int] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(sql: str, params: typing.Dict[str, typing.Any]) -> typing.Hashable:
+        return sql, _freeze(params)
+
+    def get(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            if entry.expires <= self._clock():
+                self._remove(key)
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def generation(self, tables: typing.List[str]) -> typing.Tuple[int, ...]:
+        """
+        在查询之前获取相关表的版本, 并在 set 时传入
+        """
+        with self._lock:
+            return tuple(self._generation.get(t, 0) for t in tables)
+
+    def set(self, key: typing.Hashable, value: typing.Any, ttl: float, tables: typing.List[str],
+            generation: typing.Tuple[int, ...] = None):
+        """
+        缓存查询结果, 当 generation 与当前表的版本不一致时, 说明查询期间表已被写入, 不做缓存
+        """
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != tuple(self._generation.get(t, 0) for t in tables):
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = CacheEntry(value, self._clock() + ttl, size, tables)
+            self._bytes += size
+            for table in tables:
+                self._tables.setdefault(table, set()).add(key)
+
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tables: typing.List[str]):
+        """
+        移除所有涉及 tables 的缓存
+        """
+        with self._lock:
+            for table in tables:
+                self._generation[table] = self._generation.get(table, 0) + 1
+                for key in list(self._tables.get(table, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tables.clear()
+            self._bytes = 0
+
+    def _remove(self, key: typing.Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for table in entry.tables:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,465 @@
+"""
+将 SQLInfo 的解析结果编译为 SQL 语句, 语句中的参数统一使用 :name 形式的命名参数,
+具体执行时再由执行引擎转换为对应驱动所支持的参数格式
+"""
+
+import typing
+from collections import OrderedDict
+
+from .ds_cursor import decode_cursor
+from .ds_error import DataSourceInvalidError
+from .ds_field import ModelField, ModelFieldOp, ArgItem, OpTag, FieldMode, resolve_arg
+from .ds_func import Count
+from .ds_sql_info import SQLInfo, KeysetInfo, BulkInfo
+from ..type_check import is_model
+
+_op_mapping: typing.Dict[str, str] = {
+    OpTag.Equal: "=",
+    OpTag.NotEqual: "!=",
+    OpTag.Less: "<",
+    OpTag.LessOrEqual: "<=",
+    OpTag.Greater: ">",
+    OpTag.GreaterOrEqual: ">=",
+    OpTag.In: "IN",
+    OpTag.NotIn: "NOT IN",
+    OpTag.Like: "LIKE",
+    OpTag.And: "AND",
+    OpTag.Or: "OR",
+}
+
+# JoinMode.value() 对应的 SQL 关键字
+_join_mapping: typing.Dict[int, str] = {
+    1: "LEFT JOIN",
+    2: "INNER JOIN",
+    3: "FULL OUTER JOIN",
+}
+
+# 执行引擎所使用的 SQL 方言, 目前只影响批量 upsert 的冲突处理语法
+MYSQL = "mysql"
+SQLITE = "sqlite"
+POSTGRESQL = "postgresql"
+
+# 只有 skip 没有 take 时使用的 LIMIT, 为 MySQL、SQLite 及 PostgreSQL 都能接受的最大值
+MAX_LIMIT = (1 << 63) - 1
+
+# 可以作为自增主键的字段类型
+_INTEGER_TYPES = ("Integer", "BigInteger", "SmallInteger")
+
+# ModelField 统计模式对应的 SQL 函数
+_aggregate_mapping: typing.Dict[int, str] = {
+    FieldMode.Count: "COUNT",
+    FieldMode.Sum: "SUM",
+}
+
+
+class CompiledSQL(object):
+    """
+    编译后的 SQL 语句, params 记录了语句中的命名参数及其来源, 来源为 ArgItem 时
+    需要在执行前通过 bind 从请求参数中获取具体的值
+    """
+
+    def __init__(self, sql: str, params: typing.Dict[str, typing.Any],
+                 tables: typing.List[str], single: bool = False,
+                 keyset: typing.Union[KeysetInfo, None] = None,
+                 first_page_sql: str = "",
+                 cursor_params: typing.List[str] = None,
+                 write: bool = False):
+        self.sql = sql
+        self.params = params
+        self.tables = tables
+        self.single = single
+        self.keyset = keyset
+        # keyset 分页在没有 cursor 时(即第一页)所使用的语句
+        self.first_page_sql = first_page_sql
+        self.cursor_params = cursor_params or []
+        # 是否为写入语句, 写入语句执行后会使相关表的查询缓存失效
+        self.write = write
+        # 查询结果的缓存时间, 为 0 时不缓存
+        self.cache_ttl: float = 0
+
+    def bind(self, arg_values: typing.Any) -> typing.Tuple[str, typing.Dict[str, typing.Any]]:
+        """
+        使用请求参数绑定语句中的命名参数, 返回最终需要执行的语句及其参数
+        """
+        params = {}
+        for name, value in self.params.items():
+            params[name] = resolve_arg(value, arg_values) if isinstance(value, ArgItem) else value
+
+        if not self.keyset:
+            return self.sql, params
+
+        token = self.keyset.cursor_value(arg_values)
+        if not token:
+            return self.first_page_sql, params
+
+        params.update(zip(self.cursor_params, decode_cursor(token, len(self.cursor_params))))
+        return self.sql, params
+
+    def __repr__(self):
+        return f"CompiledSQL({self.sql}, params: {list(self.params.keys())})"
+
+
+class CompiledBulk(object):
+    """
+    编译后的批量写入语句, 由于每个 chunk 的行数可能不同, 多行语句会按行数及 SQL 方言分别生成并缓存,
+    upsert 的冲突处理语法与方言相关, 由执行引擎在执行时指定
+    """
+
+    def __init__(self, bulk: BulkInfo, table: str, columns: typing.List[str],
+                 update_columns: typing.List[str], key_columns: typing.List[str] = None,
+                 auto_column: str = ""):
+        self.bulk = bulk
+        self.table = table
+        self.tables = [table]
+        self.columns = columns
+        self.update_columns = update_columns
+        # ON CONFLICT 的冲突目标, 默认为主键
+        self.key_columns = key_columns or []
+        # 自增的主键字段, chunk 中所有的元素都没有该字段的值时不写入该字段, 由数据库生成
+        self.auto_column = auto_column
+        self.single = False
+        self.write = True
+        self.cache_ttl: float = 0
+        self._chunk_sql: typing.Dict[typing.Tuple[int, str, typing.Tuple[str, ...]], str] = {}
+
+    def suffix(self, dialect: str = MYSQL) -> str:
+        if not self.bulk.upsert or not self.update_columns:
+            return ""
+        if dialect == MYSQL:
+            updates = ", ".join(f"{c} = VALUES({c})" for c in self.update_columns)
+            return f" ON DUPLICATE KEY UPDATE {updates}"
+        if dialect in (SQLITE, POSTGRESQL):
+            if not self.key_columns:
+                raise DataSourceInvalidError(f"Model {self.table} 没有主键, 无法生成 ON CONFLICT 语句")
+            updates = ", ".join(f"{c} = excluded.{c}" for c in self.update_columns)
+            return f" ON CONFLICT ({', '.join(self.key_columns)}) DO UPDATE SET {updates}"
+        raise DataSourceInvalidError(f"不支持 {dialect} 的批量 upsert")
+
+    def head(self, columns: typing.List[str] = None) -> str:
+        return f"INSERT INTO {self.table} ({', '.join(columns or self.columns)}) VALUES "
+
+    @property
+    def sql(self) -> str:
+        """
+        MySQL 的单行写入语句
+        """
+        return self.row_sql()
+
+    def row_sql(self, dialect: str = MYSQL, columns: typing.List[str] = None) -> str:
+        """
+        单行的写入语句, executemany 模式下每个 chunk 都使用该语句
+        """
+        columns = columns or self.columns
+        return self.head(columns) + f"({', '.join(':' + c for c in columns)})" + self.suffix(dialect)
+
+    def chunk_sql(self, n: int, dialect: str = MYSQL, columns: typing.List[str] = None) -> str:
+        """
+        获取写入 n 行数据的多行 INSERT 语句
+        """
+        columns = columns or self.columns
+        key = (n, dialect, tuple(columns))
+        sql = self._chunk_sql.get(key)
+        if sql is None:
+            rows = (f"({', '.join(f':_r{i}_{c}' for c in columns)})" for i in range(n))
+            sql = self.head(columns) + ", ".join(rows) + self.suffix(dialect)
+            self._chunk_sql[key] = sql
+        return sql
+
+    def row_params(self, item: typing.Any, columns: typing.List[str] = None) -> typing.Dict[str, typing.Any]:
+        columns = columns or self.columns
+        if isinstance(item, dict):
+            return {c: item.get(c) for c in columns}
+        return {c: getattr(item, c, None) for c in columns}
+
+    def chunk_columns(self, chunk: typing.List[typing.Any]) -> typing.List[str]:
+        """
+        chunk 所写入的字段, 所有的元素都没有自增主键的值时不写入该字段, 否则没有值的元素会写入 NULL
+        """
+        auto = self.auto_column
+        if not auto:
+            return self.columns
+        for item in chunk:
+            value = item.get(auto) if isinstance(item, dict) else getattr(item, auto, None)
+            if value is not None:
+                return self.columns
+        return [c for c in self.columns if c != auto]
+
+    def chunks(self, arg_values: typing.Any,
+               dialect: str = MYSQL) -> typing.Iterator[typing.Tuple[str, typing.Any, int]]:
+        """
+        按 chunk_size 切分需要写入的数据, 返回每个 chunk 的语句, 参数及行数,
+        executemany 模式下参数为每行参数的列表
+        """
+        items = self.bulk.items_value(arg_values)
+        size = max(self.bulk.chunk_size, 1)
+        for start in range(0, len(items), size):
+            chunk = items[start:start + size]
+            columns = self.chunk_columns(chunk)
+            if self.bulk.executemany:
+                yield self.row_sql(dialect, columns), [self.row_params(item, columns) for item in chunk], len(chunk)
+                continue
+
+            params = {}
+            for i, item in enumerate(chunk):
+                for c, v in self.row_params(item, columns).items():
+                    params[f"_r{i}_{c}"] = v
+            yield self.chunk_sql(len(chunk), dialect, columns), params, len(chunk)
+
+    def __repr__(self):
+        return f"CompiledBulk({self.sql}, chunk_size: {self.bulk.chunk_size})"
+
+
+class SQLCompiler(object):
+    """
+    SQL 编译器, 每个 SQLInfo 对应一个编译器实例, 编译 select 中的子查询时 parent 为外层查询的编译器,
+    子查询的参数统一由外层查询的编译器生成
+    """
+
+    def __init__(self, info: SQLInfo, parent: 'SQLCompiler' = None):
+        self._info = info
+        self._parent = parent
+        self._params: typing.Dict[str, typing.Any] = OrderedDict()
+        # 参数名 -> 参数的来源, 不同来源的参数生成了相同的名称时(如 args.a_b 与 args.a.b)为后者添加序号
+        self._owners: typing.Dict[str, typing.Any] = {}
+        self._literal_n = 0
+        self._tables: typing.List[str] = []
+        # 子查询所涉及的表, 用于查询缓存的失效
+        self._sub_tables: typing.List[str] = []
+
+    def param(self, value: typing.Any) -> str:
+        """
+        为参数生成命名占位符，来自 args 的参数以其访问路径命名, 立即数则按出现顺序命名
+        """
+        if self._parent is not None:
+            return self._parent.param(value)
+
+        if isinstance(value, ArgItem):
+            name = "_".join(value.get_path())
+            if value.get_nth() >= 0:
+                name = f"{name}_{value.get_nth()}"
+            owner = (tuple(value.get_path()), value.get_nth())
+        else:
+            name = f"_p{self._literal_n}"
+            owner = self._literal_n
+            self._literal_n += 1
+
+        unique, n = name, 0
+        while unique in self._owners and self._owners[unique] != owner:
+            n += 1
+            unique = f"{name}_{n}"
+        self._owners[unique] = owner
+        self._params[unique] = value
+        return f":{unique}"
+
+    @staticmethod
+    def column(field: ModelField) -> str:
+        return f"{field.get_model().get_name()}.{field.get_column().get_name()}"
+
+    def operand(self, node: typing.Any) -> str:
+        if isinstance(node, ModelField):
+            return self.column(node)
+        elif isinstance(node, ModelFieldOp):
+            return self.condition(node)
+        return self.param(node)
+
+    def condition(self, op: ModelFieldOp) -> str:
+        """
+        编译过滤或联表条件
+        """
+        tag = op.get_tag()
+        if op.is_logical():
+            parts = []
+            for child in (op.get_left(), op.get_right()):
+                sql = self.condition(child)
+                if isinstance(child, ModelFieldOp) and child.is_logical() and child.get_tag() != tag:
+                    sql = f"({sql})"
+                parts.append(sql)
+            return f" {_op_mapping[tag]} ".join(parts)
+
+        left, right = op.get_left(), op.get_right()
+        if right is None and tag in (OpTag.Equal, OpTag.NotEqual):
+            return f"{self.operand(left)} IS {'NOT ' if tag == OpTag.NotEqual else ''}NULL"
+
+        return f"{self.operand(left)} {_op_mapping[tag]} {self.operand(right)}"
+
+    @staticmethod
+    def models_of(op: typing.Any) -> typing.List[typing.Any]:
+        """
+        获取条件中所引用的所有 Model
+        """
+        if isinstance(op, ModelField):
+            return [op.get_model()]
+        if isinstance(op, ModelFieldOp):
+            return SQLCompiler.models_of(op.get_left()) + SQLCompiler.models_of(op.get_right())
+        return []
+
+    def aggregate(self, f: typing.Union[ModelField, Count]) -> str:
+        """
+        编译统计字段, 只有一个查询字段且设置了 alias 时以 alias 作为结果的列名
+        """
+        info = self._info
+        if isinstance(f, Count):
+            field = f.get_field()
+            sql, name = f"COUNT({self.column(field) if field else '*'})", f.get_alias()
+        else:
+            sql, name = f"{_aggregate_mapping[f.get_mode()]}({self.column(f)})", f.get_aggregate_name()
+
+        if info.alias and len(info.select) == 1:
+            name = info.alias
+        return f"{sql} AS {name}"
+
+    def subquery(self, op: typing.Any) -> str:
+        """
+        编译 select 中的子查询, 子查询中引用的外层查询的表不会出现在子查询的 FROM 中
+        """
+        info = SQLInfo(op.get_source())
+        compiler = SQLCompiler(info, self)
+        compiled = compiler.compile()
+        self._sub_tables.extend(t for t in compiled.tables if t not in self._sub_tables)
+        return f"({compiled.sql}) AS {info.alias}"
+
+    def select_list(self) -> str:
+        cols = []
+        for f in self._info.select:
+            if is_model(f):
+                cols.extend(f"{f.get_name()}.{col.get_name()}" for col in f.get_columns())
+            elif SQLInfo.is_subquery(f):
+                cols.append(self.subquery(f))
+            elif SQLInfo.is_aggregate(f):
+                cols.append(self.aggregate(f))
+            else:
+                cols.append(self.column(f))
+        return ", ".join(cols)
+
+    def group_clause(self) -> str:
+        """
+        select 中包含统计字段时, 使用其余的字段生成 GROUP BY 子句
+        """
+        cols = []
+        for f in self._info.group_by:
+            if is_model(f):
+                cols.extend(f"{f.get_name()}.{col.get_name()}" for col in f.get_columns())
+            else:
+                cols.append(self.column(f))
+        return f" GROUP BY {', '.join(cols)}" if cols else ""
+
+    def from_clause(self) -> str:
+        """
+        生成 FROM 及 JOIN 子句, select 及 where 中出现但没有通过 join 关联的表会作为 FROM 的表
+        """
+        info = self._info
+        tables = [m.get_name() for m in info.get_models()]
+        if info.where is not None:
+            tables.extend(m.get_name() for m in self.models_of(info.where))
+        if self._parent is not None:
+            # 关联子查询中引用的外层查询的表
+            outer = self._parent._tables
+            tables = [t for t in tables if t not in outer]
+        if not tables:
+            raise DataSourceInvalidError("查询中没有可用的表")
+
+        joined, joins = [], []
+        for cond, mode in zip(info.join, info.join_mode):
+            introduced = [m.get_name() for m in self.models_of(cond)
+                          if m.get_name() not in joined and m.get_name() != tables[0]]
+            if not introduced:
+                raise DataSourceInvalidError("join 条件中没有需要关联的新表")
+            joined.append(introduced[0])
+            keyword = _join_mapping[mode.value()] if mode else _join_mapping[1]
+            joins.append(f"{keyword} {introduced[0]} ON {self.condition(cond)}")
+
+        from_tables = []
+        for t in tables:
+            if t not in joined and t not in from_tables:
+                from_tables.append(t)
+
+        self._tables = from_tables + joined
+        return " ".join([f"FROM {', '.join(from_tables)}"] + joins)
+
+    def keyset_clause(self, keyset: KeysetInfo) -> typing.Tuple[str, str, typing.List[str]]:
+        """
+        生成 keyset 分页的条件及排序子句, 多个排序字段时使用行比较 (a, b) > (:a, :b)
+        """
+        cols = [self.column(k) for k in keyset.keys]
+        names = [f"_cursor{i}" for i in range(len(cols))]
+        holders = [f":{n}" for n in names]
+        op = "<" if keyset.desc else ">"
+        if len(cols) == 1:
+            cond = f"{cols[0]} {op} {holders[0]}"
+        else:
+            cond = f"({', '.join(cols)}) {op} ({', '.join(holders)})"
+
+        order = ", ".join(f"{c} DESC" if keyset.desc else c for c in cols)
+        return cond, order, names
+
+    def limit_value(self, n: typing.Any) -> str:
+        return self.param(n) if isinstance(n, ArgItem) else str(int(n))
+
+    @staticmethod
+    def compile_bulk(bulk: BulkInfo) -> CompiledBulk:
+        cols = bulk.model.get_columns()
+        if not cols:
+            raise DataSourceInvalidError(f"Model {bulk.model.get_name()} 没有可写入的字段")
+
+        columns = [col.get_name() for col in cols]
+        primary = [col for col in cols if col.get_primary()]
+        if bulk.conflict_fields:
+            key_columns = [f.get_column().get_name() for f in bulk.conflict_fields]
+        else:
+            key_columns = [col.get_name() for col in primary]
+        if bulk.update_fields:
+            update_columns = [f.get_column().get_name() for f in bulk.update_fields]
+        else:
+            update_columns = [col.get_name() for col in cols
+                              if not col.get_primary() and col.get_name() not in key_columns]
+
+        # 与 SQLAlchemy 的默认规则一致, 唯一的整数主键且不是外键时为自增字段
+        auto_column = ""
+        if len(primary) == 1 and primary[0].get_type() in _INTEGER_TYPES and not primary[0].get_foreign():
+            auto_column = primary[0].get_name()
+        return CompiledBulk(bulk, bulk.model.get_name(), columns, update_columns, key_columns, auto_column)
+
+    def compile_update(self) -> CompiledSQL:
+        info = self._info
+        table = info.update[0].get_left().get_model().get_name()
+        sets = ", ".join(
+            f"{op.get_left().get_column().get_name()} = {self.operand(op.get_right())}" for op in info.update
+        )
+        sql = f"UPDATE {table} SET {sets}"
+        if info.where is not None:
+            sql += f" WHERE {self.condition(info.where)}"
+        return CompiledSQL(sql, self._params, [table], write=True)
+
+    def compile(self) -> typing.Union[CompiledSQL, CompiledBulk]:
+        info = self._info
+        if info.bulk:
+            return self.compile_bulk(info.bulk)
+        if info.update:
+            return self.compile_update()
+
+        # 先生成 FROM 子句, 以便子查询能够区分外层查询的表
+        from_clause = self.from_clause()
+        head = f"SELECT {self.select_list()} {from_clause}"
+        where = self.condition(info.where) if info.where is not None else ""
+        group = self.group_clause()
+        tables = self._tables + [t for t in self._sub_tables if t not in self._tables]
+
+        keyset = info.keyset
+        if not keyset:
+            sql = head + (f" WHERE {where}" if where else "") + group
+            skip, take = info.paging
+            if take:
+                sql += f" LIMIT {self.limit_value(take)}"
+            elif skip:
+                # MySQL 的 OFFSET 必须与 LIMIT 一起使用
+                sql += f" LIMIT {MAX_LIMIT}"
+            if skip:
+                sql += f" OFFSET {self.limit_value(skip)}"
+            return CompiledSQL(sql, self._params, tables, info.single)
+
+        cond, order, names = self.keyset_clause(keyset)
+        tail = f"{group} ORDER BY {order} LIMIT {self.limit_value(keyset.size)}"
+        first_page_sql = head + (f" WHERE {where}" if where else "") + tail
+        seek_where = f"({where}) AND {cond}" if where else cond
+        sql = f"{head} WHERE {seek_where}{tail}"
+        return CompiledSQL(sql, self._params, tables, info.single, keyset, first_page_sql, names)
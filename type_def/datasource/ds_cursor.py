@@ -0,0 +1,35 @@
+"""
+keyset(seek) 分页所使用的 continuation token 的编解码,
+token 对于调用方来说是不透明的字符串，只需要原样传回即可获取下一页数据
+"""
+
+import base64
+import binascii
+import json
+import typing
+
+from .ds_error import DataSourceCursorError
+
+
+def encode_cursor(keys: typing.List[typing.Any]) -> str:
+    """
+    将上一页最后一条记录的 key 编码为 continuation token
+    """
+    raw = json.dumps(keys, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, n: int = None) -> typing.List[typing.Any]:
+    """
+    解码 continuation token, n 为 token 中应包含的 key 的个数, 格式不正确时抛出 DataSourceCursorError
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        keys = json.loads(raw.decode("utf-8"))
+    except (ValueError, TypeError, binascii.Error):
+        raise DataSourceCursorError(f"无法解析的分页 token: {token}")
+
+    if not isinstance(keys, list) or (n is not None and len(keys) != n):
+        raise DataSourceCursorError(f"分页 token 与排序字段不匹配: {token}")
+
+    return keys
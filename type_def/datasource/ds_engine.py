@@ -0,0 +1,215 @@
+"""
+数据源的执行引擎, 负责将 DataSource 编译好的语句交给具体的数据库驱动执行,
+生成的服务代码及 Pipe 等运行时都通过 Engine 访问数据库
+"""
+
+import re
+import threading
+import time
+import typing
+
+from .ds_base import DataSource, Operator
+from .ds_cache import ResultCache
+from .ds_compiler import CompiledSQL, CompiledBulk, MYSQL
+
+# 匹配 :name 形式的命名参数
+_param_pattern = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+_missing = object()
+
+
+class ChunkStat(object):
+    """
+    批量写入中单个 chunk 的执行信息
+    """
+
+    def __init__(self, rows: int, seconds: float, rowcount: int):
+        self.rows = rows
+        self.seconds = seconds
+        self.rowcount = rowcount
+
+    def __repr__(self):
+        return f"ChunkStat(rows: {self.rows}, seconds: {self.seconds:.6f}, rowcount: {self.rowcount})"
+
+
+class BulkResult(object):
+    """
+    批量写入的结果, chunks 记录了每个 chunk 的行数及耗时
+    """
+
+    def __init__(self):
+        self.chunks: typing.List[ChunkStat] = []
+
+    def add_chunk(self, stat: ChunkStat):
+        self.chunks.append(stat)
+
+    @property
+    def rows(self) -> int:
+        return sum(c.rows for c in self.chunks)
+
+    @property
+    def rowcount(self) -> int:
+        return sum(c.rowcount for c in self.chunks)
+
+    @property
+    def seconds(self) -> float:
+        return sum(c.seconds for c in self.chunks)
+
+    def __repr__(self):
+        return f"BulkResult(rows: {self.rows}, chunks: {len(self.chunks)}, seconds: {self.seconds:.6f})"
+
+
+class Engine(object):
+    """
+    执行引擎的基类, 具体的引擎需要实现 query、execute 接口
+    result_cache 为查询结果缓存, 只有调用了 cache 的 DataSource 才会使用,
+    dialect 为数据库的 SQL 方言, 支持 mysql、sqlite 及 postgresql
+    """
+
+    result_cache: typing.Union[ResultCache, None] = None
+    dialect: str = MYSQL
+
+    def query(self, sql: str, params: typing.Dict[str, typing.Any]) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        执行查询语句, 以字典列表的形式返回查询结果
+        """
+        raise NotImplementedError
+
+    def execute(self, sql: str, params: typing.Dict[str, typing.Any]) -> int:
+        """
+        执行写入语句, 返回影响的行数
+        """
+        raise NotImplementedError
+
+    def executemany(self, sql: str, seq_params: typing.List[typing.Dict[str, typing.Any]]) -> int:
+        """
+        使用多组参数执行同一语句, 驱动不支持时逐条执行
+        """
+        return sum(self.execute(sql, params) for params in seq_params)
+
+    @staticmethod
+    def compiled_of(ds: typing.Union[DataSource, Operator]) -> typing.Union[CompiledSQL, CompiledBulk]:
+        if isinstance(ds, Operator):
+            ds = ds.get_source()
+        return ds.compile()
+
+    def run(self, ds: typing.Union[DataSource, Operator], arg_values: typing.Any = None) -> typing.Any:
+        """
+        执行 DataSource, ds 可以是 DataSource 或其定义链中的任意状态,
+        查询返回字典列表, first 时返回单条记录, 更新返回影响的行数, 批量写入返回 BulkResult
+        """
+        compiled = self.compiled_of(ds)
+        if isinstance(compiled, CompiledBulk):
+            return self.run_bulk(compiled, arg_values)
+
+        sql, params = compiled.bind(arg_values)
+        if compiled.write:
+            rowcount = self.execute(sql, params)
+            self.invalidate(compiled.tables)
+            return rowcount
+
+        cache = self.result_cache if compiled.cache_ttl > 0 else None
+        if cache is None:
+            rows = self.query(sql, params)
+        else:
+            key = cache.key(sql, params)
+            rows = cache.get(key, _missing)
+            if rows is _missing:
+                generation = cache.generation(compiled.tables)
+                rows = self.query(sql, params)
+                cache.set(key, rows, compiled.cache_ttl, compiled.tables, generation)
+
+        if compiled.single:
+            return rows[0] if rows else None
+        return rows
+
+    def invalidate(self, tables: typing.List[str]):
+        """
+        使涉及 tables 的查询缓存失效
+        """
+        if self.result_cache is not None:
+            self.result_cache.invalidate(tables)
+
+    def run_bulk(self, compiled: CompiledBulk, arg_values: typing.Any = None) -> BulkResult:
+        """
+        按 chunk 执行批量写入并记录每个 chunk 的耗时
+        """
+        result = BulkResult()
+        for sql, params, rows in compiled.chunks(arg_values, self.dialect):
+            start = time.perf_counter()
+            if compiled.bulk.executemany:
+                rowcount = self.executemany(sql, params)
+            else:
+                rowcount = self.execute(sql, params)
+            result.add_chunk(ChunkStat(rows, time.perf_counter() - start, rowcount))
+
+        if result.chunks:
+            self.invalidate(compiled.tables)
+        return result
+
+
+class DBAPIEngine(Engine):
+    """
+    基于 DB-API 2.0 驱动(如 PyMySQL)的执行引擎, connect 用于创建新的连接,
+    每个线程会使用各自的连接, paramstyle 为驱动的参数格式, 支持 pyformat 及 named
+    """
+
+    def __init__(self, connect: typing.Callable[[], typing.Any], paramstyle: str = "pyformat",
+                 result_cache: ResultCache = None, dialect: str = MYSQL):
+        if paramstyle not in ("pyformat", "named"):
+            raise ValueError(f"不支持的参数格式: {paramstyle}")
+        self.result_cache = result_cache
+        self.dialect = dialect
+        self._connect = connect
+        self._paramstyle = paramstyle
+        self._local = threading.local()
+        self._converted: typing.Dict[str, str] = {}
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def convert(self, sql: str) -> str:
+        """
+        将 :name 形式的参数转换为驱动所支持的格式
+        """
+        if self._paramstyle == "named":
+            return sql
+
+        converted = self._converted.get(sql)
+        if converted is None:
+            converted = _param_pattern.sub(r"%(\1)s", sql)
+            self._converted[sql] = converted
+        return converted
+
+    def query(self, sql: str, params: typing.Dict[str, typing.Any]) -> typing.List[typing.Dict[str, typing.Any]]:
+        cursor = self.connection().cursor()
+        try:
+            cursor.execute(self.convert(sql), params)
+            names = [d[0] for d in cursor.description or []]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def execute(self, sql: str, params: typing.Dict[str, typing.Any]) -> int:
+        conn = self.connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self.convert(sql), params)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def executemany(self, sql: str, seq_params: typing.List[typing.Dict[str, typing.Any]]) -> int:
+        conn = self.connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(self.convert(sql), seq_params)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
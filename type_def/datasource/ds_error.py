@@ -4,3 +4,7 @@ class DataSourceEmptyError(Exception):
 
 class DataSourceInvalidError(Exception):
     pass
+
+
+class DataSourceCursorError(Exception):
+    pass
@@ -1,6 +1,6 @@
 import typing
 
-from type_def.type_base import ColumnInfo
+from ..type_base import ColumnInfo
 
 
 class OpTag(object):
@@ -55,10 +55,22 @@ class ModelField(object):
     def get_mode(self):
         return self._mode
 
+    def is_aggregate(self) -> bool:
+        return self._mode != FieldMode.Normal
+
+    def get_aggregate_name(self) -> str:
+        """
+        统计结果的列名, 没有设置别名时为 count_字段名 或 sum_字段名
+        """
+        if self._alias:
+            return self._alias
+        prefix = "count" if self._mode == FieldMode.Count else "sum"
+        return f"{prefix}_{self._col.get_name()}"
+
     def alias(self, alias: str) -> 'ModelField':
         """
         设置字段别名, 设置之后的别名只会在生成类型时起作用，并不会在生成 ORM 或 SQL 语句
-        时造成任何影响
+        时造成任何影响, 统计字段(count、sum)除外, 其别名会作为统计结果的列名
         :param alias:
         :return:
         """
@@ -109,7 +121,7 @@ class ModelField(object):
         return check_type(OpTag.In, self, other)
 
     def not_in(self, other: 'FieldOrAny') -> 'ModelFieldOp':
-        return check_type(OpTag.In, self, other)
+        return check_type(OpTag.NotIn, self, other)
 
     def __eq__(self, other: 'FieldOrAny') -> 'ModelFieldOp':
         return check_type(OpTag.Equal, self, other)
@@ -189,6 +201,41 @@ class ArgItem(object):
         self._nth = n
         return self
 
+    def get_path(self) -> typing.List[str]:
+        """
+        获取该参数从根参数开始的访问路径, 如 args.flow.id 的路径为 ["flow", "id"]
+        """
+        path = []
+        item = self
+        while item is not None:
+            path.append(item._from_key)
+            item = item._prev
+        path.reverse()
+        return path
+
+    def get_nth(self) -> int:
+        return self._nth
+
+
+def resolve_arg(item: ArgItem, values: typing.Any) -> typing.Any:
+    """
+    从请求参数 values 中获取 item 所指向的值, values 可以是 dict 或普通对象,
+    路径中不存在的字段将返回 None
+    """
+    value = values
+    for key in item.get_path():
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            value = value.get(key)
+        else:
+            value = getattr(value, key, None)
+
+    nth = item.get_nth()
+    if nth >= 0 and value is not None:
+        value = value[nth]
+    return value
+
 
 class Args(object):
     """
@@ -1,4 +1,7 @@
-from .ds_field import FieldOrAny
+import typing
+
+from .ds_field import FieldOrAny, ModelField
+from ..type_check import is_model
 
 
 class FuncBase(object):
@@ -14,10 +17,32 @@ class Now(FuncBase):
 
 class Count(FuncBase):
     """
-    用于生成 Count 语句
+    用于生成 Count 语句, field 为 Model 时生成 COUNT(*), 为 ModelField 时统计该字段
     """
     def __init__(self, field: FieldOrAny):
+        if not is_model(field) and not isinstance(field, ModelField):
+            raise TypeError(f"func.count 只能统计 Model 或 ModelField, 当前为: {type(field)}")
         self._field = field
+        self._alias = ""
+
+    def alias(self, alias: str) -> 'Count':
+        """
+        设置统计结果的列名, 默认为 count
+        """
+        self._alias = alias
+        return self
+
+    def get_field(self) -> typing.Union[ModelField, None]:
+        """
+        获取统计的字段, 统计整个 Model 时返回 None
+        """
+        return self._field if isinstance(self._field, ModelField) else None
+
+    def get_model(self):
+        return self._field.get_model() if isinstance(self._field, ModelField) else self._field
+
+    def get_alias(self) -> str:
+        return self._alias or "count"
 
 
 class Func(object):
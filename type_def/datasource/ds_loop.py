@@ -2,6 +2,8 @@ import typing
 
 from .ds_field import FieldOrAny
 from .ds_base import DataSource
+from .ds_error import DataSourceInvalidError
+from .ds_stm import EntryDataSource, BulkInsert, DEFAULT_CHUNK_SIZE
 
 
 class Loop(object):
@@ -15,6 +17,9 @@ class Loop(object):
     table = SomeTable()
 
     Loop([1, 2, 3], index="index").it(datasource().save(table).value(table.field.eq(args.index))
+
+    # 逐个写入列表中的元素时, 使用 insert 合并为一个批量写入语句
+    Loop(args.items, item="item").insert(table)
     ```
     """
 
@@ -40,3 +45,11 @@ class Loop(object):
     def it(self, datasource: DataSource) -> 'Loop':
         self._op.append(datasource)
         return self
+
+    def insert(self, model, chunk_size: int = DEFAULT_CHUNK_SIZE) -> BulkInsert:
+        """
+        将循环中对每个元素的写入合并为一个批量写入语句，避免每个元素都执行一次写入
+        """
+        if self._skip != 1:
+            raise DataSourceInvalidError("只有遍历所有元素的 Loop 才能转换为批量写入")
+        return EntryDataSource().insert_many(model, self._loop_elem, chunk_size=chunk_size)
@@ -0,0 +1,246 @@
+"""
+Pipe 的运行时, 根据 result_as 及 ArgItem 的引用关系构建依赖图,
+没有数据依赖的 DataSource 会在线程池中并发执行
+"""
+
+import queue
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from .ds_base import DataSource, Operator
+from .ds_compiler import CompiledBulk
+from .ds_engine import Engine
+from .ds_field import ArgItem
+from .ds_pipe import Pipe, PipeNode, Or
+
+
+class StageStat(object):
+    """
+    Pipe 中单个 DataSource 的执行信息, status 为 running、done、failed 或 skipped(未执行),
+    failed 时 error 为执行抛出的异常
+    """
+
+    def __init__(self, node: int, index: int):
+        self.node = node
+        self.index = index
+        self.status = "skipped"
+        self.error: typing.Union[BaseException, None] = None
+        self.start = 0.0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f"StageStat(node: {self.node}, index: {self.index}, status: {self.status}, seconds: {self.seconds:.6f})"
+
+
+class NodeResult(object):
+    """
+    PipeNode 的执行结果, And 节点的值为各个 DataSource 的结果(只有一个时为该结果本身),
+    Or 节点的值为第一个有效的结果, 执行出错的分支视为无效, 所有分支都无效时 error 为最后一个分支的异常
+    """
+
+    def __init__(self, node: PipeNode):
+        self.node = node
+        self.ok = False
+        self.skipped = True
+        self.value: typing.Any = None
+        self.error: typing.Union[BaseException, None] = None
+        self.seconds = 0.0
+
+
+class PipeResult(object):
+    def __init__(self):
+        self.nodes: typing.List[NodeResult] = []
+        self.stages: typing.List[StageStat] = []
+        # result_as 所对应的结果
+        self.values: typing.Dict[str, typing.Any] = {}
+        self.seconds = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(n.ok for n in self.nodes)
+
+    @property
+    def value(self) -> typing.Any:
+        """
+        Pipe 的结果, 即最后一个节点的结果
+        """
+        return self.nodes[-1].value if self.nodes else None
+
+
+class _ScopedArgs(object):
+    """
+    在请求参数的基础上附加前面节点通过 result_as 传递的结果
+    """
+
+    def __init__(self, base: typing.Any, results: typing.Dict[str, typing.Any]):
+        self._base = base
+        self._results = results
+
+    def __getattr__(self, key: str) -> typing.Any:
+        if key in self._results:
+            return self._results[key]
+        if isinstance(self._base, dict):
+            return self._base.get(key)
+        return getattr(self._base, key, None)
+
+
+def arg_refs(ds: typing.Union[DataSource, Operator]) -> typing.Set[str]:
+    """
+    获取 DataSource 所引用的参数名称, 即 args 之后的第一级名称
+    """
+    compiled = Engine.compiled_of(ds)
+    if isinstance(compiled, CompiledBulk):
+        items = [compiled.bulk.items]
+    else:
+        items = list(compiled.params.values())
+        if compiled.keyset:
+            items += [compiled.keyset.cursor, compiled.keyset.size]
+
+    return {item.get_path()[0] for item in items if isinstance(item, ArgItem)}
+
+
+class PipeRunner(object):
+    """
+    Pipe 的执行器, And 节点内的 DataSource 以及没有数据依赖的节点会并发执行,
+    Or 节点的分支依次执行, 前一个分支执行出错或结果无效时才会执行下一个分支, 得到有效结果后其余分支不会被执行,
+    And 节点中的 DataSource 执行出错时直接抛出异常, 节点失败(And 节点中有无效结果或 Or 节点没有有效结果)时，依赖其结果的节点不会被执行
+    """
+
+    def __init__(self, engine: Engine, max_workers: int = 8, executor: ThreadPoolExecutor = None):
+        self._engine = engine
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+
+    @staticmethod
+    def dependencies(pipe: Pipe) -> typing.List[typing.Set[int]]:
+        """
+        计算每个节点所依赖的节点, 节点引用了前面某个节点的 result_as 时即依赖该节点
+        """
+        deps = []
+        producers: typing.Dict[str, int] = {}
+        for i, node in enumerate(pipe.nodes):
+            refs = set()
+            for ds in node.datasource:
+                refs |= arg_refs(ds)
+            deps.append({producers[name] for name in refs if name in producers})
+            if node.result_as:
+                producers[node.result_as] = i
+        return deps
+
+    def run_stage(self, ds: typing.Union[DataSource, Operator], args: _ScopedArgs, stat: StageStat):
+        stat.status = "running"
+        stat.start = time.perf_counter()
+        try:
+            value = self._engine.run(ds, args)
+        except BaseException as e:
+            stat.error = e
+            stat.status = "failed"
+            raise
+        finally:
+            stat.seconds = time.perf_counter() - stat.start
+        stat.status = "done"
+        return value
+
+    def run(self, pipe: Pipe, arg_values: typing.Any = None) -> PipeResult:
+        start = time.perf_counter()
+        result = PipeResult()
+        deps = self.dependencies(pipe)
+        results = [NodeResult(node) for node in pipe.nodes]
+        stages = [[StageStat(i, j) for j in range(len(node.datasource))] for i, node in enumerate(pipe.nodes)]
+        result.nodes = results
+        result.stages = [stat for node_stages in stages for stat in node_stages]
+
+        pending = set(range(len(pipe.nodes)))
+        running: typing.Dict[int, typing.List[Future]] = {}
+        node_args: typing.Dict[int, _ScopedArgs] = {}
+        node_start: typing.Dict[int, float] = {}
+        # 执行完毕的 DataSource 所属的节点, 由 Future 的回调写入
+        finished: queue.Queue = queue.Queue()
+
+        def ready(i: int) -> bool:
+            return all(d not in pending and d not in running for d in deps[i])
+
+        def submit(i: int, j: int):
+            f = self._executor.submit(self.run_stage, pipe.nodes[i].datasource[j], node_args[i], stages[i][j])
+            running[i].append(f)
+            f.add_done_callback(lambda _: finished.put(i))
+
+        try:
+            while pending or running:
+                for i in sorted(pending):
+                    if not ready(i):
+                        continue
+                    pending.discard(i)
+                    if not all(results[d].ok for d in deps[i]):
+                        # 依赖的节点失败, 跳过该节点
+                        continue
+
+                    node_args[i] = _ScopedArgs(arg_values, dict(result.values))
+                    node_start[i] = time.perf_counter()
+                    running[i] = []
+                    # Or 节点只执行第一个分支, 其余分支在前一个分支无效时再执行
+                    n = 1 if pipe.nodes[i].logic.value() == Or.value() else len(pipe.nodes[i].datasource)
+                    for j in range(n):
+                        submit(i, j)
+
+                if not running:
+                    break
+
+                touched = {finished.get()}
+                while not finished.empty():
+                    touched.add(finished.get_nowait())
+                for i in sorted(touched & running.keys()):
+                    futures = running[i]
+                    if self.resolve(pipe.nodes[i], futures, results[i]):
+                        results[i].seconds = time.perf_counter() - node_start[i]
+                        running.pop(i)
+                        if results[i].ok and pipe.nodes[i].result_as:
+                            result.values[pipe.nodes[i].result_as] = results[i].value
+                    elif pipe.nodes[i].logic.value() == Or.value() and futures[-1].done():
+                        submit(i, len(futures))
+        except BaseException:
+            for fs in running.values():
+                for f in fs:
+                    f.cancel()
+            raise
+
+        result.seconds = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def resolve(node: PipeNode, futures: typing.List[Future], node_result: NodeResult) -> bool:
+        """
+        根据已完成的 DataSource 判断节点是否已经得出结果, Or 节点的最后一个分支无效且还有分支未执行时返回 False,
+        And 节点执行出错时直接抛出异常
+        """
+        if node.logic.value() == Or.value():
+            # Or 节点的分支依次执行, 只需检查最后一个分支
+            f = futures[-1]
+            if not f.done():
+                return False
+            error = f.exception()
+            if error is not None:
+                node_result.error = error
+            elif f.result():
+                node_result.ok, node_result.skipped, node_result.value = True, False, f.result()
+                node_result.error = None
+                return True
+            if len(futures) < len(node.datasource):
+                return False
+            node_result.skipped = False
+            return True
+
+        if not all(f.done() for f in futures):
+            for f in futures:
+                if f.done() and f.exception() is not None:
+                    raise f.exception()
+            return False
+
+        values = [f.result() for f in futures]
+        node_result.skipped = False
+        node_result.ok = all(values)
+        node_result.value = values[0] if len(values) == 1 else values
+        return True
+
+    def shutdown(self, wait_running: bool = True):
+        self._executor.shutdown(wait=wait_running)
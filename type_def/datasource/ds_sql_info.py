@@ -1,8 +1,92 @@
 import typing
 
 from .ds_base import DataSource, Operator
+from .ds_cursor import encode_cursor
 from .ds_error import DataSourceEmptyError, DataSourceInvalidError
-from .ds_field import ModelField, ModelFieldOp
+from .ds_field import ModelField, ModelFieldOp, ArgItem, OpTag, resolve_arg
+from .ds_func import Count
+from ..type_check import is_model
+
+
+class KeysetInfo(object):
+    """
+    keyset(seek) 分页信息
+    """
+
+    def __init__(self, keys: typing.List[ModelField],
+                 cursor: typing.Union[ArgItem, str, None],
+                 size: typing.Union[int, ArgItem],
+                 desc: bool = False):
+        """
+        keys 为排序所使用的字段，为空时使用 Model 的主键,
+        cursor 为上一页返回的 continuation token, size 为每页的记录数,
+        desc 为 True 时按降序翻页
+        """
+        self.keys = keys
+        self.cursor = cursor
+        self.size = size
+        self.desc = desc
+
+    def cursor_value(self, arg_values: typing.Any) -> typing.Union[str, None]:
+        """
+        从请求参数中获取本次请求的 continuation token
+        """
+        if isinstance(self.cursor, ArgItem):
+            return resolve_arg(self.cursor, arg_values)
+        return self.cursor
+
+    def size_value(self, arg_values: typing.Any) -> typing.Union[int, None]:
+        if isinstance(self.size, ArgItem):
+            return resolve_arg(self.size, arg_values)
+        return self.size
+
+    def next_cursor(self, rows: typing.List[typing.Any], arg_values: typing.Any = None) -> typing.Union[str, None]:
+        """
+        根据当前页的查询结果生成下一页的 continuation token,
+        当结果不足一页时说明已经没有下一页，返回 None
+        """
+        size = self.size_value(arg_values)
+        if not rows or (size and len(rows) < size):
+            return None
+
+        last = rows[-1]
+        keys = []
+        for key in self.keys:
+            name = key.get_column().get_name()
+            keys.append(last.get(name) if isinstance(last, dict) else getattr(last, name, None))
+
+        return encode_cursor(keys)
+
+
+class BulkInfo(object):
+    """
+    批量写入信息
+    """
+
+    def __init__(self, model: typing.Any, items: typing.Union[ArgItem, typing.List[typing.Any]],
+                 chunk_size: int, upsert: bool = False,
+                 update_fields: typing.List[ModelField] = None,
+                 executemany: bool = False,
+                 conflict_fields: typing.List[ModelField] = None):
+        """
+        model 为写入的表, items 为需要写入的数据列表, 一般来自参数, 如 args.items,
+        chunk_size 为每条语句写入的最大行数, upsert 为 True 时主键或唯一键冲突则更新 update_fields,
+        update_fields 为空时更新所有非主键及非冲突字段, executemany 为 True 时每个 chunk 使用驱动的
+        executemany 执行单行语句，而不是生成多行的 INSERT ... VALUES,
+        conflict_fields 为 ON CONFLICT 的冲突目标(MySQL 不需要指定), 为空时使用主键
+        """
+        self.model = model
+        self.items = items
+        self.chunk_size = chunk_size
+        self.upsert = upsert
+        self.update_fields = update_fields or []
+        self.executemany = executemany
+        self.conflict_fields = conflict_fields or []
+
+    def items_value(self, arg_values: typing.Any) -> typing.List[typing.Any]:
+        if isinstance(self.items, ArgItem):
+            return resolve_arg(self.items, arg_values) or []
+        return self.items
 
 
 class SQLInfo(object):
@@ -17,9 +101,16 @@ class SQLInfo(object):
         """
         self._select: typing.List[ModelField] = []
         self._where: ModelFieldOp = ModelFieldOp.empty()
+        self._has_where = False
         self._join: typing.List[ModelFieldOp] = []
+        self._join_mode: typing.List[typing.Any] = []
         self._skip = 0
         self._take = 0
+        self._single = False
+        self._keyset: typing.Union[KeysetInfo, None] = None
+        self._alias = ""
+        self._bulk: typing.Union[BulkInfo, None] = None
+        self._update: typing.List[ModelFieldOp] = []
 
         self.analyse(ds)
 
@@ -28,14 +119,31 @@ class SQLInfo(object):
 
     def set_where(self, where: ModelFieldOp):
         self._where = where
+        self._has_where = where is not None
 
-    def append_join(self, join: ModelFieldOp):
+    def append_join(self, join: ModelFieldOp, mode=None):
         self._join.append(join)
+        self._join_mode.append(mode)
 
     def set_paging(self, skip: int, take: int):
         self._skip = skip
         self._take = take
 
+    def set_single(self, single: bool):
+        self._single = single
+
+    def set_keyset(self, keyset: KeysetInfo):
+        self._keyset = keyset
+
+    def set_alias(self, alias: str):
+        self._alias = alias
+
+    def set_bulk(self, bulk: BulkInfo):
+        self._bulk = bulk
+
+    def append_update(self, update: ModelFieldOp):
+        self._update.append(update)
+
     def analyse(self, ds: 'DataSource'):
         """
         解析 ds 中的表达式，后续的各种优化都可以在这里进行处理
@@ -46,24 +154,161 @@ class SQLInfo(object):
         if not exps:
             raise DataSourceEmptyError("Can not analyse DataSource without expression!")
 
-        op: Operator = exps.pop()
-        op.analyse()
+        for op in exps:
+            op: Operator
+            op.analyse(self)
 
-        if not self._select:
+        if not self._select and not self._bulk and not self._update:
             raise DataSourceInvalidError("Can not configure the DataSource without Select Expression")
 
+        if self._update:
+            self.check_update()
+
+        if self._keyset:
+            self.check_keyset()
+
+        for f in self._select:
+            if self.is_subquery(f) and not SQLInfo(f.get_source()).alias:
+                raise DataSourceInvalidError("select 中的子查询必须通过 alias 设置结果的名称")
+
+    @staticmethod
+    def is_aggregate(f: typing.Any) -> bool:
+        return isinstance(f, Count) or (isinstance(f, ModelField) and f.is_aggregate())
+
+    @staticmethod
+    def is_subquery(f: typing.Any) -> bool:
+        return isinstance(f, Operator)
+
+    @staticmethod
+    def model_of(f: typing.Any) -> typing.Any:
+        """
+        获取 select 中的字段所属的 Model, 子查询返回 None
+        """
+        if is_model(f):
+            return f
+        if isinstance(f, (ModelField, Count)):
+            return f.get_model()
+        return None
+
+    def get_models(self) -> typing.List[typing.Any]:
+        """
+        获取 select 中所使用的所有 Model, 第一个 Model 即为查询的主表
+        """
+        models, names = [], set()
+        for f in self._select:
+            model = self.model_of(f)
+            if model is not None and model.get_name() not in names:
+                names.add(model.get_name())
+                models.append(model)
+        return models
+
+    def primary_keys(self) -> typing.List[ModelField]:
+        """
+        获取主表的主键字段
+        """
+        model = self.get_models()[0]
+        keys = [ModelField(model, col) for col in model.get_columns() if col.get_primary()]
+        if not keys:
+            raise DataSourceInvalidError(f"Model {model.get_name()} 没有主键，keyset 分页必须指定排序字段")
+        return keys
+
+    def check_keyset(self):
+        """
+        keyset 分页的排序字段必须是主键或已建立索引的字段，并且必须出现在查询结果中,
+        以便于从最后一条记录中生成下一页的 token, 查询结果中的记录以字段名作为 key,
+        因此排序字段的字段名在查询结果中必须唯一, 如 join 时不能同时选择两个表的 id
+        """
+        if not self._keyset.keys:
+            self._keyset.keys = self.primary_keys()
+
+        selected = set()
+        names: typing.Dict[str, int] = {}
+        for f in self._select:
+            if is_model(f):
+                cols = [(f.get_name(), col.get_name()) for col in f.get_columns()]
+            elif isinstance(f, ModelField) and not f.is_aggregate():
+                cols = [(f.get_model().get_name(), f.get_column().get_name())]
+            else:
+                continue
+            selected.update(cols)
+            for _, name in cols:
+                names[name] = names.get(name, 0) + 1
+
+        for key in self._keyset.keys:
+            model, col = key.get_model(), key.get_column()
+            indexed = [c for index in model.get_indexes() for c in index.columns[:1]]
+            if not (col.get_primary() or col.get_index() or col.get_unique() or col.get_name() in indexed):
+                raise DataSourceInvalidError(
+                    f"keyset 分页的排序字段 {model.get_name()}.{col.get_name()} 必须是主键或已建立索引的字段")
+
+            if (model.get_name(), col.get_name()) not in selected:
+                raise DataSourceInvalidError(
+                    f"keyset 分页的排序字段 {model.get_name()}.{col.get_name()} 必须出现在查询结果中")
+
+            if names[col.get_name()] > 1:
+                raise DataSourceInvalidError(
+                    f"keyset 分页的排序字段 {model.get_name()}.{col.get_name()} 在查询结果中与其他字段重名, "
+                    f"无法从记录中获取其值")
+
+    def check_update(self):
+        """
+        更新的字段必须来自同一个 Model, 且只能使用 eq 指定字段的新值
+        """
+        names = set()
+        for op in self._update:
+            left = op.get_left()
+            if op.get_tag() != OpTag.Equal or not isinstance(left, ModelField):
+                raise DataSourceInvalidError("update 只能使用 Model.field.eq(value) 的形式指定需要更新的字段")
+            names.add(left.get_model().get_name())
+
+        if len(names) != 1:
+            raise DataSourceInvalidError(f"update 的字段必须来自同一个 Model, 当前为: {sorted(names)}")
+
     @property
     def select(self):
         return self._select
 
     @property
-    def where(self):
-        return self._where
+    def group_by(self) -> typing.List[typing.Any]:
+        """
+        select 中包含统计字段时, 其余的 Model 及字段即为分组的依据, 没有统计字段时返回空列表
+        """
+        if not any(self.is_aggregate(f) for f in self._select):
+            return []
+        return [f for f in self._select if not self.is_aggregate(f) and not self.is_subquery(f)]
+
+    @property
+    def where(self) -> typing.Union[ModelFieldOp, None]:
+        return self._where if self._has_where else None
 
     @property
     def join(self):
         return self._join
 
+    @property
+    def join_mode(self):
+        return self._join_mode
+
     @property
     def paging(self):
         return self._skip, self._take
+
+    @property
+    def single(self) -> bool:
+        return self._single
+
+    @property
+    def keyset(self) -> typing.Union[KeysetInfo, None]:
+        return self._keyset
+
+    @property
+    def alias(self) -> str:
+        return self._alias
+
+    @property
+    def bulk(self) -> typing.Union[BulkInfo, None]:
+        return self._bulk
+
+    @property
+    def update(self) -> typing.List[ModelFieldOp]:
+        return self._update
@@ -4,15 +4,21 @@
 能够直观的看出对应的数据接口会触发的具体操作
 """
 
-from type_def.datasource.ds_base import DataSource, Operator
-from type_def.datasource.ds_field import ModelField, ModelFieldOp, OpTag
+from .ds_base import DataSource, Operator
+from .ds_field import ModelField, ModelFieldOp, OpTag, ArgItem
+from .ds_sql_info import SQLInfo, KeysetInfo, BulkInfo
+from .ds_compiler import SQLCompiler, CompiledSQL, CompiledBulk
 
-from type_def.type_error import *
-from type_def.type_check import is_model
-from util import EnumBase
+from .ds_error import DataSourceInvalidError
+from ..type_error import *
+from ..type_check import is_model
+from ...util import EnumBase
 
 SelectField = typing.Union[ModelField, typing.Any]
 
+# 批量写入时每条语句默认写入的最大行数
+DEFAULT_CHUNK_SIZE = 500
+
 
 class LeftJoin(EnumBase):
     @staticmethod
@@ -35,6 +41,13 @@ class OuterJoin(EnumBase):
 JoinMode = typing.Union[typing.Type[LeftJoin], typing.Type[InnerJoin], typing.Type[OuterJoin]]
 
 
+def _init_columns(model: typing.Any):
+    """
+    Model 的字段信息在第一次调用 get_columns 时才会初始化, 编译之前需要确保已经初始化
+    """
+    model.get_columns()
+
+
 class AllowAlias(Operator):
     """
     允许状态机进入 Alias 模式，一般只会在子查询中以该模式结尾
@@ -87,7 +100,7 @@ class AllowPaging(Operator):
         获取当前结果集中的第一条数据，该接口会导致当前结果集的返回结果被解析为
         单一值， 而不是默认的列表
         """
-        return Paging(self.get_source()).take(1)
+        return Paging(self.get_source()).first()
 
     def paging(self, page: typing.Union[int, ModelField], size: typing.Union[int, ModelField]):
         """
@@ -99,6 +112,21 @@ class AllowPaging(Operator):
         """
         return self.skip((page - 1) * size).take(size)
 
+    def seek(self, cursor: typing.Union[ArgItem, str, None], size: typing.Union[int, ArgItem],
+             *order_by: ModelField, desc: bool = False) -> 'KeysetPaging':
+        """
+        使用 keyset(seek) 的方式分页, 生成 WHERE key > :cursor ORDER BY key LIMIT size 形式的语句,
+        不会像 skip 一样随着页数的增加而变慢
+        cursor 为上一页返回的 continuation token, 一般来自参数, 为空时获取第一页
+        order_by 为排序字段，必须是主键或已建立索引的字段，不传递时使用主表的主键
+        :param cursor:
+        :param size:
+        :param order_by:
+        :param desc:
+        :return:
+        """
+        return KeysetPaging(self.get_source(), cursor, size, *order_by, desc=desc)
+
 
 class AllowJoin(Operator):
     """
@@ -131,24 +159,34 @@ class AllowUpdate(AllowFilter):
 class Updater(AllowFilter):
     def __init__(self, source: 'DataSource', update_field: ModelFieldOp, *more: ModelFieldOp):
         super(Updater, self).__init__(source)
-        self._update_op = [update_field] + list(more)
+        self._update_op = []
+        self.update(update_field, *more)
 
     def update(self, update_field: ModelFieldOp, *more: ModelFieldOp) -> 'Updater':
         """
         指定需要更新的字段， update_field 及 more 都必须来自于同一个 Model
         """
-        self._update_op = self._update_op + [update_field] + list(more)
+        new_op = [update_field] + list(more)
+        for op in new_op:
+            _init_columns(op.get_left().get_model())
+
+        self._update_op = self._update_op + new_op
+        self.changed()
         return self
 
+    def analyse(self, info: SQLInfo):
+        for op in self._update_op:
+            info.append_update(op)
+
 
-class Filter(AllowPaging):
+class Filter(AllowPaging, AllowAlias):
     """
     Filter 状态，提供了过滤接口，用于定义过滤数据的表达式
     """
 
     def __init__(self, source: 'DataSource', filter_op: ModelFieldOp):
         super(Filter, self).__init__(source)
-        self._ops: typing.List[ModelFieldOp] = [filter_op] if filter_op else []
+        self._op: typing.Union[ModelFieldOp, None] = filter_op
 
     def and_(self, filter_op: ModelFieldOp) -> 'Filter':
         """
@@ -156,7 +194,8 @@ class Filter(AllowPaging):
         :param filter_op:
         :return:
         """
-        self._ops = ModelFieldOp(OpTag.And, self._ops, filter_op)
+        self._op = ModelFieldOp(OpTag.And, self._op, filter_op) if self._op else filter_op
+        self.changed()
         return self
 
     def or_(self, filter_op: ModelFieldOp) -> 'Filter':
@@ -165,7 +204,8 @@ class Filter(AllowPaging):
         :param filter_op:
         :return:
         """
-        self._ops = ModelFieldOp(OpTag.Or, self._ops, filter_op)
+        self._op = ModelFieldOp(OpTag.Or, self._op, filter_op) if self._op else filter_op
+        self.changed()
         return self
 
     def quote(self) -> 'Filter':
@@ -174,6 +214,9 @@ class Filter(AllowPaging):
         :return:
         """
 
+    def analyse(self, info: SQLInfo):
+        info.set_where(self._op)
+
 
 class Alias(Operator):
     """
@@ -184,6 +227,9 @@ class Alias(Operator):
         super().__init__(source)
         self._alias = alias
 
+    def analyse(self, info: SQLInfo):
+        info.set_alias(self._alias)
+
 
 class Select(AllowFilter, AllowPaging, AllowJoin, AllowAlias):
     """
@@ -198,7 +244,7 @@ class Select(AllowFilter, AllowPaging, AllowJoin, AllowAlias):
 
     def select(self, model_or_field: SelectField, *more: SelectField) -> 'Select':
         """
-        select more column or model
+        select more column or model, 也可以是 count、sum 统计字段, func.count 或通过 alias 命名的子查询
         :param model_or_field:
         :param more:
         :return:
@@ -206,14 +252,18 @@ class Select(AllowFilter, AllowPaging, AllowJoin, AllowAlias):
         new_field = [model_or_field] + list(more)
         for f in new_field:
             if is_model(f):
-                # let the model initialize the column info
-                f.get_columns()
-            else:  # ModelField
-                f.get_model().get_columns()
+                _init_columns(f)
+            elif not isinstance(f, Operator):  # ModelField or Count
+                _init_columns(f.get_model())
 
         self._select_info = self._select_info + new_field
+        self.changed()
         return self
 
+    def analyse(self, info: SQLInfo):
+        for f in self._select_info:
+            info.append_select(f)
+
 
 class Join(AllowFilter, AllowPaging, AllowAlias):
     """
@@ -239,8 +289,13 @@ class Join(AllowFilter, AllowPaging, AllowAlias):
         """
         self._join_info = self._join_info + [join_cond] + list(more)
         self._join_mode = mode
+        self.changed()
         return self
 
+    def analyse(self, info: SQLInfo):
+        for cond in self._join_info:
+            info.append_join(cond, self._join_mode)
+
 
 class Paging(AllowAlias):
     """
@@ -249,6 +304,7 @@ class Paging(AllowAlias):
 
     def __init__(self, source: 'DataSource'):
         super(Paging, self).__init__(source)
+        self._skip = 0
         self._n = -1
         self._single = False
 
@@ -258,7 +314,8 @@ class Paging(AllowAlias):
         :param n:
         :return:
         """
-        self._n = n
+        self._skip = n
+        self.changed()
         return self
 
     def take(self, n: typing.Union[int, ModelField]) -> 'Paging':
@@ -268,6 +325,7 @@ class Paging(AllowAlias):
         :return:
         """
         self._n = n
+        self.changed()
         return self
 
     def first(self) -> 'Paging':
@@ -277,14 +335,90 @@ class Paging(AllowAlias):
         """
         self._n = 1
         self._single = True
+        self.changed()
+        return self
+
+    def analyse(self, info: SQLInfo):
+        info.set_paging(self._skip, self._n if self._n != -1 else 0)
+        info.set_single(self._single)
+
+
+class KeysetPaging(AllowAlias):
+    """
+    KeysetPaging 状态，使用上一页最后一条记录的 key 作为游标进行分页
+    """
+
+    def __init__(self, source: 'DataSource', cursor: typing.Union[ArgItem, str, None],
+                 size: typing.Union[int, ArgItem], *order_by: ModelField, desc: bool = False):
+        super(KeysetPaging, self).__init__(source)
+        self._cursor = cursor
+        self._size = size
+        self._order_by: typing.List[ModelField] = list(order_by)
+        self._desc = desc
+
+    def analyse(self, info: SQLInfo):
+        info.set_keyset(KeysetInfo(list(self._order_by), self._cursor, self._size, self._desc))
+
+
+class BulkInsert(AllowAlias):
+    """
+    批量写入状态, 将列表参数中的所有元素按 chunk 合并为多行的 INSERT 语句
+    """
+
+    def __init__(self, source: 'DataSource', model: typing.Any,
+                 items: typing.Union[ArgItem, typing.List[typing.Any]],
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 upsert: bool = False,
+                 update_fields: typing.List[ModelField] = None,
+                 executemany: bool = False,
+                 conflict_fields: typing.List[ModelField] = None):
+        super(BulkInsert, self).__init__(source)
+        if not is_model(model):
+            raise DataSourceInvalidError("批量写入的对象必须是 Model")
+        self._bulk = BulkInfo(model, items, chunk_size, upsert, update_fields, executemany, conflict_fields)
+
+    def chunk(self, chunk_size: int) -> 'BulkInsert':
+        """
+        设置每条语句写入的最大行数
+        """
+        self._bulk.chunk_size = chunk_size
+        self.changed()
+        return self
+
+    def executemany(self, enable: bool = True) -> 'BulkInsert':
+        """
+        使用驱动的 executemany 逐 chunk 执行单行语句，而不是生成多行的 INSERT ... VALUES
+        """
+        self._bulk.executemany = enable
+        self.changed()
         return self
 
+    def analyse(self, info: SQLInfo):
+        info.set_bulk(self._bulk)
+
 
 class EntryDataSource(DataSource):
     """
     数据操作定义类型，该类型提供了基础的数据定义接口, 及数据源操作的入口 Select
     """
 
+    def __init__(self):
+        super(EntryDataSource, self).__init__()
+        self._compiled: typing.Union[CompiledSQL, CompiledBulk, None] = None
+        self._cache_ttl: float = 0
+
+    def changed(self):
+        self._compiled = None
+
+    def cache(self, ttl: float = 60) -> 'EntryDataSource':
+        """
+        允许缓存该 DataSource 的查询结果 ttl 秒, 只有在执行引擎配置了 ResultCache 时才会生效,
+        通过同一个引擎更新或写入相同的表时，缓存会自动失效
+        """
+        self._cache_ttl = ttl
+        self.changed()
+        return self
+
     def select(self, model: SelectField, *join_models: SelectField) -> Select:
         s = Select(self, model, *join_models)
         return s
@@ -292,3 +426,47 @@ class EntryDataSource(DataSource):
     def update(self, update_field: ModelFieldOp, *more: ModelFieldOp) -> Updater:
         u = Updater(self, update_field, *more)
         return u
+
+    def insert_many(self, model: typing.Any, items: typing.Union[ArgItem, typing.List[typing.Any]],
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> BulkInsert:
+        """
+        批量写入 items 中的所有元素, items 一般来自参数, 如 args.items, 元素中与 model 的字段同名的值
+        会被写入对应的列, 写入会按 chunk_size 合并为多行的 INSERT 语句, 避免逐条写入的多次往返
+        :param model:
+        :param items:
+        :param chunk_size:
+        :return:
+        """
+        return BulkInsert(self, model, items, chunk_size)
+
+    def upsert_many(self, model: typing.Any, items: typing.Union[ArgItem, typing.List[typing.Any]],
+                    *update_fields: ModelField, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    conflict: typing.List[ModelField] = None) -> BulkInsert:
+        """
+        与 insert_many 相同，但在主键或唯一键冲突时更新 update_fields, 不传递时更新所有非主键及非冲突字段,
+        conflict 为 PostgreSQL 及 SQLite 的 ON CONFLICT 所使用的唯一键字段, 不传递时使用主键
+        :param model:
+        :param items:
+        :param update_fields:
+        :param chunk_size:
+        :param conflict:
+        :return:
+        """
+        return BulkInsert(self, model, items, chunk_size, upsert=True, update_fields=list(update_fields),
+                          conflict_fields=conflict)
+
+    def sql_info(self) -> SQLInfo:
+        """
+        解析当前的定义信息
+        """
+        return SQLInfo(self)
+
+    def compile(self) -> typing.Union[CompiledSQL, CompiledBulk]:
+        """
+        将当前的定义编译为 SQL 语句, 编译结果会被缓存，直到定义发生变化
+        """
+        if self._compiled is None:
+            compiled = SQLCompiler(self.sql_info()).compile()
+            compiled.cache_ttl = self._cache_ttl
+            self._compiled = compiled
+        return self._compiled
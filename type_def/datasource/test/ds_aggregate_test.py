@@ -0,0 +1,74 @@
+import sqlite3
+
+from ...type_util import fields
+from ..ds_stm import EntryDataSource as Datasource
+from ..ds_field import args
+from ..ds_func import func
+from ..ds_engine import DBAPIEngine
+
+
+def build_models():
+    book = fields.Model("book", dict(
+        id=fields.Integer().column(primary_key=True),
+        name=fields.String().column()
+    ))
+    book_set = fields.Model("book_set", dict(
+        id=fields.Integer().column(primary_key=True),
+        book=fields.Integer().column(),
+        price=fields.Float().column(),
+        borrowed=fields.Bool().column()
+    ))
+    return book, book_set
+
+
+def build_engine(tmp_path):
+    db = str(tmp_path / "aggregate.db")
+    engine = DBAPIEngine(lambda: sqlite3.connect(db), paramstyle="named")
+    engine.execute("CREATE TABLE book (id INTEGER PRIMARY KEY, name TEXT)", {})
+    engine.execute("CREATE TABLE book_set (id INTEGER PRIMARY KEY, book INTEGER, price REAL, borrowed INTEGER)", {})
+    engine.execute("INSERT INTO book VALUES (1, 'a'), (2, 'b')", {})
+    engine.execute("INSERT INTO book_set VALUES (1, 1, 1.5, 0), (2, 1, 2.5, 1), (3, 1, 3.0, 0), (4, 2, 4.0, 0)", {})
+    return engine
+
+
+def test_group_by_inference(tmp_path):
+    book, book_set = build_models()
+    ds = Datasource().select(book_set.book, book_set.id.count(), book_set.price.sum().alias("total")) \
+        .filter(book_set.borrowed == args.borrowed)
+    compiled = ds.get_source().compile()
+    assert compiled.sql == "SELECT book_set.book, COUNT(book_set.id) AS count_id, SUM(book_set.price) AS total " \
+                           "FROM book_set WHERE book_set.borrowed = :borrowed GROUP BY book_set.book"
+
+    rows = build_engine(tmp_path).run(ds, {"borrowed": 0})
+    assert rows == [{"book": 1, "count_id": 2, "total": 4.5}, {"book": 2, "count_id": 1, "total": 4.0}]
+
+
+def test_alias_and_func_count(tmp_path):
+    book, book_set = build_models()
+    engine = build_engine(tmp_path)
+
+    ds = Datasource().select(func.count(book_set)).filter(book_set.book == args.book).alias("remain")
+    assert ds.get_source().compile().sql == "SELECT COUNT(*) AS remain FROM book_set WHERE book_set.book = :book"
+    assert engine.run(ds, {"book": 1}) == [{"remain": 3}]
+
+    ds = Datasource().select(func.count(book_set.id).alias("n"))
+    assert engine.run(ds) == [{"n": 4}]
+
+
+def test_correlated_subquery(tmp_path):
+    book, book_set = build_models()
+    ds = Datasource().select(
+        book,
+        Datasource().select(book_set.id.count())
+        .filter(book.id.eq(book_set.book) & book_set.borrowed.eq(False))
+        .alias("remain")
+    ).filter(book.name.like(args.name))
+    compiled = ds.get_source().compile()
+    assert compiled.sql == "SELECT book.id, book.name, " \
+                           "(SELECT COUNT(book_set.id) AS remain FROM book_set " \
+                           "WHERE book.id = book_set.book AND book_set.borrowed = :_p0) AS remain " \
+                           "FROM book WHERE book.name LIKE :name"
+    assert compiled.tables == ["book", "book_set"]
+
+    rows = build_engine(tmp_path).run(ds, {"name": "%"})
+    assert rows == [{"id": 1, "name": "a", "remain": 2}, {"id": 2, "name": "b", "remain": 1}]
@@ -0,0 +1,117 @@
+import sqlite3
+
+import pytest
+
+from ...type_util import fields
+from ..ds_stm import EntryDataSource as Datasource
+from ..ds_field import args
+from ..ds_compiler import SQLITE
+from ..ds_error import DataSourceInvalidError
+from ..ds_loop import Loop
+from ..ds_engine import DBAPIEngine
+
+
+def build_model():
+    return fields.Model("item", dict(
+        id=fields.Integer().column(primary_key=True),
+        name=fields.String().column(),
+        price=fields.Float().column()
+    ))
+
+
+def build_engine(tmp_path):
+    db = str(tmp_path / "bulk.db")
+    engine = DBAPIEngine(lambda: sqlite3.connect(db), paramstyle="named", dialect=SQLITE)
+    engine.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT, price REAL)", {})
+    return engine
+
+
+def test_insert_many_sql():
+    item = build_model()
+    compiled = Datasource().insert_many(item, args.items, chunk_size=2).get_source().compile()
+
+    assert compiled.sql == "INSERT INTO item (id, name, price) VALUES (:id, :name, :price)"
+    chunks = list(compiled.chunks({"items": [
+        {"id": 1, "name": "a", "price": 1.0},
+        {"id": 2, "name": "b", "price": 2.0},
+        {"id": 3, "name": "c", "price": 3.0},
+    ]}))
+    assert [rows for _, _, rows in chunks] == [2, 1]
+    assert chunks[0][0] == "INSERT INTO item (id, name, price) VALUES " \
+                          "(:_r0_id, :_r0_name, :_r0_price), (:_r1_id, :_r1_name, :_r1_price)"
+    assert chunks[1][1] == {"_r0_id": 3, "_r0_name": "c", "_r0_price": 3.0}
+
+
+def test_upsert_many_sql():
+    item = build_model()
+    compiled = Datasource().upsert_many(item, args.items, item.price).get_source().compile()
+    assert compiled.sql == "INSERT INTO item (id, name, price) VALUES (:id, :name, :price) " \
+                           "ON DUPLICATE KEY UPDATE price = VALUES(price)"
+    assert compiled.row_sql(SQLITE) == "INSERT INTO item (id, name, price) VALUES (:id, :name, :price) " \
+                                       "ON CONFLICT (id) DO UPDATE SET price = excluded.price"
+    with pytest.raises(DataSourceInvalidError):
+        compiled.row_sql("oracle")
+
+    # 指定唯一键作为冲突目标, 默认不更新冲突字段
+    compiled = Datasource().upsert_many(item, args.items, conflict=[item.name]).get_source().compile()
+    assert compiled.row_sql(SQLITE).endswith("ON CONFLICT (name) DO UPDATE SET price = excluded.price")
+
+
+def test_bulk_auto_increment():
+    item = build_model()
+    compiled = Datasource().insert_many(item, args.items).get_source().compile()
+    assert compiled.auto_column == "id"
+    # 没有自增主键的值时不写入该字段, 由数据库生成
+    (sql, params, _), = compiled.chunks({"items": [{"name": "a", "price": 1.0}]})
+    assert sql == "INSERT INTO item (name, price) VALUES (:_r0_name, :_r0_price)"
+    assert params == {"_r0_name": "a", "_r0_price": 1.0}
+    (sql, _, _), = compiled.chunks({"items": [{"name": "a"}, {"id": 2, "name": "b"}]})
+    assert sql.startswith("INSERT INTO item (id, name, price)")
+
+    order = fields.Model("order_item", dict(
+        order_id=fields.Integer().column(primary_key=True),
+        item_id=fields.Integer().column(primary_key=True),
+    ))
+    assert Datasource().insert_many(order, args.items).get_source().compile().auto_column == ""
+
+
+def test_bulk_execute(tmp_path):
+    item = build_model()
+    engine = build_engine(tmp_path)
+    items = [{"id": i, "name": f"n{i}", "price": float(i)} for i in range(1, 8)]
+
+    result = engine.run(Datasource().insert_many(item, args.items, chunk_size=3), {"items": items})
+    assert [c.rows for c in result.chunks] == [3, 3, 1]
+    assert result.rowcount == 7
+    assert all(c.seconds >= 0 for c in result.chunks)
+
+    more = [{"id": i, "name": f"n{i}", "price": float(i)} for i in range(8, 12)]
+    result = engine.run(Loop(args.items, item="item").insert(item, chunk_size=2).executemany(), {"items": more})
+    assert result.rows == 4 and len(result.chunks) == 2
+
+    rows = engine.run(Datasource().select(item).filter(item.id > 9), {})
+    assert [r["id"] for r in rows] == [10, 11]
+
+    result = engine.run(Datasource().insert_many(item, args.items), {"items": [{"name": "auto", "price": 0.0}]})
+    assert result.rowcount == 1
+    rows = engine.run(Datasource().select(item).filter(item.name == "auto"), {})
+    assert rows[0]["id"] == 12
+    engine.execute("DELETE FROM item WHERE id = 12", {})
+
+    updated = [{"id": 1, "name": "x", "price": 10.0}, {"id": 12, "name": "n12", "price": 12.0}]
+    result = engine.run(Datasource().upsert_many(item, args.items, item.price), {"items": updated})
+    assert result.rowcount == 2
+    rows = engine.run(Datasource().select(item).filter(item.id == 1), {})
+    assert rows[0]["name"] == "n1" and rows[0]["price"] == 10.0
+
+
+def test_compile_after_change():
+    item = build_model()
+    ds = Datasource()
+    where = ds.select(item).filter(item.id > 1)
+    paging = where.take(10)
+    assert ds.compile().sql.endswith("WHERE item.id > :_p0 LIMIT 10")
+    # 编译之后修改定义, 编译结果同样会更新
+    where.and_(item.price < 3)
+    paging.skip(5)
+    assert ds.compile().sql.endswith("WHERE item.id > :_p0 AND item.price < :_p1 LIMIT 10 OFFSET 5")
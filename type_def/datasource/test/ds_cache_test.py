@@ -0,0 +1,103 @@
+import sqlite3
+
+from ...type_util import fields
+from ..ds_stm import EntryDataSource as Datasource
+from ..ds_field import args
+from ..ds_engine import DBAPIEngine
+from ..ds_cache import ResultCache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingEngine(DBAPIEngine):
+    def __init__(self, *a, **kw):
+        super(CountingEngine, self).__init__(*a, **kw)
+        self.queries = 0
+
+    def query(self, sql, params):
+        self.queries += 1
+        return super(CountingEngine, self).query(sql, params)
+
+
+def build_model():
+    return fields.Model("item", dict(
+        id=fields.Integer().column(primary_key=True),
+        price=fields.Float().column()
+    ))
+
+
+def build_engine(tmp_path, cache):
+    db = str(tmp_path / "cache.db")
+    engine = CountingEngine(lambda: sqlite3.connect(db), paramstyle="named", result_cache=cache)
+    engine.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, price REAL)", {})
+    engine.execute("INSERT INTO item (id, price) VALUES (1, 1.0), (2, 2.0)", {})
+    return engine
+
+
+def test_update_sql():
+    item = build_model()
+    compiled = Datasource().update(item.price.eq(args.price)).filter(item.id == args.id).get_source().compile()
+    assert compiled.sql == "UPDATE item SET price = :price WHERE item.id = :id"
+    assert compiled.write and compiled.tables == ["item"]
+
+
+def test_cache_hit_ttl_and_invalidate(tmp_path):
+    item = build_model()
+    clock = FakeClock()
+    cache = ResultCache(clock=clock)
+    engine = build_engine(tmp_path, cache)
+
+    ds = Datasource().cache(10).select(item).filter(item.id == args.id).first()
+    assert engine.run(ds, {"id": 1}) == {"id": 1, "price": 1.0}
+    assert engine.run(ds, {"id": 1}) == {"id": 1, "price": 1.0}
+    assert engine.queries == 1 and cache.hits == 1
+
+    # 不同的参数使用不同的缓存, 没有调用 cache 的 DataSource 不会使用缓存
+    engine.run(ds, {"id": 2})
+    engine.run(Datasource().select(item).filter(item.id == args.id).first(), {"id": 1})
+    assert engine.queries == 3
+
+    clock.now = 11
+    engine.run(ds, {"id": 1})
+    assert engine.queries == 4
+
+    update = Datasource().update(item.price.eq(args.price)).filter(item.id == args.id)
+    assert engine.run(update, {"id": 1, "price": 5.0}) == 1
+    assert len(cache) == 0
+    assert engine.run(ds, {"id": 1}) == {"id": 1, "price": 5.0}
+    assert engine.queries == 5
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.set("a", [1], 10, ["t"])
+    cache.set("b", [2], 10, ["t"])
+    assert cache.get("a") == [1]
+    cache.set("c", [3], 10, ["t"])
+    assert cache.get("b") is None and len(cache) == 2
+
+    size = cache.size
+    cache = ResultCache(max_bytes=size)
+    cache.set("a", [1], 10, ["t"])
+    cache.set("b", [2], 10, ["t"])
+    cache.set("c", [3], 10, ["t"])
+    assert cache.get("a") is None and cache.size <= size
+
+    # 查询期间表被写入时不缓存结果
+    generation = cache.generation(["t"])
+    cache.invalidate(["t"])
+    cache.set("d", [4], 10, ["t"], generation)
+    assert cache.get("d") is None
+
+
+def test_key_of_set_params():
+    a = {"k%d" % i for i in range(20)}
+    b = set(sorted(a, reverse=True))
+    assert ResultCache.key("sql", {"ids": a}) == ResultCache.key("sql", {"ids": b})
+    assert ResultCache.key("sql", {"ids": [1, 2]}) != ResultCache.key("sql", {"ids": [2, 1]})
@@ -0,0 +1,111 @@
+import pytest
+
+from ...type_util import fields
+from ..ds_stm import EntryDataSource as Datasource
+from ..ds_field import args
+from ..ds_cursor import encode_cursor, decode_cursor
+from ..ds_error import DataSourceInvalidError, DataSourceCursorError
+
+
+def build_models():
+    user = fields.Model("user", dict(
+        id=fields.Integer().column(primary_key=True),
+        name=fields.String().column(),
+        age=fields.Integer().column(index=True)
+    ))
+
+    info = fields.Model("info", dict(
+        id=fields.Integer().column(primary_key=True),
+        uid=fields.Integer().column(),
+        height=fields.Float().column()
+    ))
+    return user, info
+
+
+def test_offset_paging():
+    user, info = build_models()
+    compiled = Datasource() \
+        .select(user.id, info.height) \
+        .join(info.uid == user.id) \
+        .filter(user.name.like(args.name)) \
+        .skip(args.skip) \
+        .take(20) \
+        .get_source().compile()
+
+    assert compiled.sql == "SELECT user.id, info.height FROM user LEFT JOIN info ON info.uid = user.id " \
+                           "WHERE user.name LIKE :name LIMIT 20 OFFSET :skip"
+    assert compiled.bind({"name": "%a%", "skip": 40})[1] == {"name": "%a%", "skip": 40}
+
+    # 只有 skip 时使用最大的 LIMIT
+    compiled = Datasource().select(user.id).skip(10).get_source().compile()
+    assert compiled.sql == f"SELECT user.id FROM user LIMIT {(1 << 63) - 1} OFFSET 10"
+
+
+def test_param_names_are_unique():
+    user, info = build_models()
+    compiled = Datasource().select(user.id) \
+        .filter(user.name == args.a_b) \
+        .and_(user.age == args.a.b) \
+        .and_(user.id == args.a_b) \
+        .get_source().compile()
+    assert compiled.sql.endswith("WHERE user.name = :a_b AND user.age = :a_b_1 AND user.id = :a_b")
+    assert compiled.bind({"a_b": 1, "a": {"b": 2}})[1] == {"a_b": 1, "a_b_1": 2}
+
+
+def test_keyset_paging_with_primary_key():
+    user, _ = build_models()
+    compiled = Datasource() \
+        .select(user) \
+        .filter(user.age > 18) \
+        .seek(args.cursor, args.size) \
+        .get_source().compile()
+
+    head = "SELECT user.id, user.name, user.age FROM user WHERE "
+    assert compiled.sql == head + "(user.age > :_p0) AND user.id > :_cursor0 ORDER BY user.id LIMIT :size"
+
+    sql, params = compiled.bind({"size": 2})
+    assert sql == head + "user.age > :_p0 ORDER BY user.id LIMIT :size"
+    assert params == {"_p0": 18, "size": 2}
+
+    rows = [{"id": 1, "name": "a", "age": 20}, {"id": 5, "name": "b", "age": 30}]
+    token = compiled.keyset.next_cursor(rows, {"size": 2})
+    assert decode_cursor(token) == [5]
+    assert compiled.keyset.next_cursor(rows[:1], {"size": 2}) is None
+
+    sql, params = compiled.bind({"size": 2, "cursor": token})
+    assert sql == compiled.sql
+    assert params["_cursor0"] == 5
+
+
+def test_keyset_paging_with_index_columns():
+    user, _ = build_models()
+    compiled = Datasource() \
+        .select(user.id, user.age) \
+        .seek(args.cursor, 10, user.age, user.id, desc=True) \
+        .get_source().compile()
+    assert compiled.first_page_sql == "SELECT user.id, user.age FROM user ORDER BY user.age DESC, user.id DESC LIMIT 10"
+    assert compiled.sql == "SELECT user.id, user.age FROM user WHERE (user.age, user.id) < (:_cursor0, :_cursor1) " \
+                           "ORDER BY user.age DESC, user.id DESC LIMIT 10"
+
+    _, params = compiled.bind({"cursor": encode_cursor([18, 7])})
+    assert params == {"_cursor0": 18, "_cursor1": 7}
+
+
+def test_keyset_paging_invalid():
+    user, info = build_models()
+    with pytest.raises(DataSourceInvalidError):
+        Datasource().select(user).seek(args.cursor, 10, user.name).get_source().compile()
+
+    # 两个表的 id 在查询结果中重名, 无法从记录中得到下一页的 token
+    with pytest.raises(DataSourceInvalidError):
+        Datasource().select(user, info).join(user.id == info.uid) \
+            .seek(args.cursor, 10, user.id, info.id).get_source().compile()
+    Datasource().select(user, info.height).join(user.id == info.uid) \
+        .seek(args.cursor, 10, user.id).get_source().compile()
+
+    with pytest.raises(DataSourceInvalidError):
+        Datasource().select(user.name).seek(args.cursor, 10).get_source().compile()
+
+    compiled = Datasource().select(user).seek(args.cursor, 10).get_source().compile()
+    with pytest.raises(DataSourceCursorError):
+        compiled.bind({"cursor": "not a token"})
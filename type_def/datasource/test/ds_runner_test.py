@@ -0,0 +1,110 @@
+import threading
+import time
+
+from ...type_util import fields
+from ..ds_stm import EntryDataSource as Datasource
+from ..ds_field import args
+from ..ds_engine import Engine
+from ..ds_pipe import Pipe
+from ..ds_runner import PipeRunner
+
+
+class FakeEngine(Engine):
+    """
+    按表名返回预设数据的引擎, 每次查询都会等待 delay 秒
+    """
+
+    def __init__(self, data, delay=0.0, broken=()):
+        self.data = data
+        self.delay = delay
+        self.broken = broken
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def query(self, sql, params):
+        with self.lock:
+            self.calls.append((sql, params))
+        time.sleep(self.delay)
+        table = sql.split(" FROM ")[1].split(" ")[0]
+        if table in self.broken:
+            raise RuntimeError(table)
+        return self.data.get(table, [])
+
+
+def build_models():
+    book = fields.Model("book", dict(
+        id=fields.Integer().column(primary_key=True),
+        name=fields.String().column()
+    ))
+    book_set = fields.Model("book_set", dict(
+        id=fields.Integer().column(primary_key=True),
+        book=fields.Integer().column()
+    ))
+    return book, book_set
+
+
+def test_dependencies_and_hand_off():
+    book, book_set = build_models()
+    pipe = Pipe(
+        Datasource().select(book_set.id).filter(book_set.book == args.book_id).first(),
+        result_as="book_set"
+    ).next(
+        Datasource().select(book).filter(book.id == args.book_set.id)
+    )
+    assert PipeRunner.dependencies(pipe) == [set(), {0}]
+
+    engine = FakeEngine({"book_set": [{"id": 7}], "book": [{"id": 7, "name": "a"}]})
+    result = PipeRunner(engine).run(pipe, {"book_id": 1})
+    assert result.ok
+    assert result.values == {"book_set": {"id": 7}}
+    assert engine.calls[1][1] == {"book_set_id": 7}
+    assert result.value == [{"id": 7, "name": "a"}]
+
+
+def test_independent_nodes_run_concurrently():
+    book, book_set = build_models()
+    pipe = Pipe(Datasource().select(book), result_as="books") \
+        .next(Datasource().select(book_set), result_as="sets") \
+        .next(Datasource().select(book), Datasource().select(book_set))
+
+    engine = FakeEngine({"book": [{"id": 1}], "book_set": [{"id": 2}]}, delay=0.2)
+    result = PipeRunner(engine, max_workers=4).run(pipe)
+    assert result.ok
+    assert result.seconds < 0.35
+    assert len([s for s in result.stages if s.status == "done"]) == 4
+
+
+def test_or_short_circuit_and_skip():
+    book, book_set = build_models()
+    pipe = Pipe(
+        Datasource().select(book_set).first(),
+        Datasource().select(book).first(),
+        Datasource().select(book).first(),
+        logic=Pipe.Or, result_as="found"
+    ).next(
+        Datasource().select(book).filter(book.id == args.found.id)
+    )
+
+    # 即使线程池有空闲的线程, 得到有效结果后其余分支也不会被执行
+    engine = FakeEngine({"book_set": [{"id": 3}], "book": [{"id": 3}]}, delay=0.1)
+    result = PipeRunner(engine).run(pipe)
+    assert result.nodes[0].value == {"id": 3}
+    assert [s.status for s in result.stages[:3]] == ["done", "skipped", "skipped"]
+    assert len(engine.calls) == 2
+
+    engine = FakeEngine({})
+    result = PipeRunner(engine).run(pipe)
+    assert not result.ok
+    assert result.nodes[1].skipped
+    assert result.stages[-1].status == "skipped"
+
+    # 出错的分支视为无效, 继续使用下一个分支的结果
+    engine = FakeEngine({"book": [{"id": 5}]}, broken=("book_set",))
+    result = PipeRunner(engine).run(pipe)
+    assert result.ok and result.nodes[0].value == {"id": 5}
+    assert result.stages[0].status == "failed" and isinstance(result.stages[0].error, RuntimeError)
+
+    engine = FakeEngine({}, broken=("book_set", "book"))
+    result = PipeRunner(engine).run(pipe)
+    assert not result.ok and isinstance(result.nodes[0].error, RuntimeError)
+    assert [s.status for s in result.stages[:3]] == ["failed"] * 3
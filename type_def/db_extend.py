@@ -1,3 +1,7 @@
+import base64
+import binascii
+import io
+import typing
 from decimal import Decimal as _Decimal, DecimalException
 
 from .type_def import *
@@ -58,14 +62,159 @@ class Decimal(Double):
         return value.quantize(_Decimal('.1') ** self.decimal_places, rounding=self.rounding)
 
 
+# 可以作为二进制值的类型, 均支持 buffer 协议, 可以不经复制地通过 memoryview 访问
+BYTES_TYPES = (bytes, bytearray, memoryview)
+
+
+def _is_bytes(value) -> bool:
+    """
+    是否为可以不复制地按字节访问的二进制值
+    """
+    return isinstance(value, BYTES_TYPES) and (not isinstance(value, memoryview) or value.c_contiguous)
+
+
+def _view(value) -> memoryview:
+    """
+    以字节为单位访问 value 的 memoryview, 不复制数据
+    """
+    view = value if isinstance(value, memoryview) else memoryview(value)
+    if view.ndim != 1 or view.format != "B":
+        view = view.cast("B")
+    return view
+
+
+def _read_varint(data, pos: int) -> typing.Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
 class Binary(String):
+    """
+    二进制类型, 值为 bytes、bytearray 或 C 连续的 memoryview, 反序列化时原样返回不做复制,
+    非连续的 memoryview(如 memoryview(b)[::2])无法不复制地按字节访问, 视为无效的值,
+    长度检查按字节数(memoryview 的 nbytes)进行.
+    JSON 中以 base64 字符串表示, 二进制格式为 varint(字节数 + 1) 后接原始数据, 0 表示 None,
+    iter_base64 / write_json / write_to 为供调用方自行写出大的值时使用的辅助方法, 可以分块写出而不需要在内存中
+    生成完整的编码结果, Model 的 serialize 不会使用这些方法
+    """
     default_error_messages = {
         ERROR_TYPE.invalid: 'A valid bytes is required but get type: {input_type}',
+        ERROR_TYPE.convert: 'Type: {input_type} not support convert to `bytes`',
     }
 
+    # base64 每 3 个字节编码为 4 个字符, 分块编码时块的大小需要是 3 的倍数
+    CHUNK_SIZE = 3 * 64 * 1024
+
     def get_column_type(self):
         return "Binary"
 
+    def valid(self, name: str, value=None):
+        if self.required and value is None:
+            raise ValidationError(msg=" %s is required, but value is %s" % (name, value))
+
+        if value is not None and not _is_bytes(value):
+            raise self.fail("invalid", input_type=type(value).__name__)
+
+    def serialize(self, value: any) -> typing.Union[str, None]:
+        """
+        转换为 JSON 中使用的 base64 字符串, 已经是字符串时认为已经编码过
+        """
+        if value is None or isinstance(value, str):
+            return value
+        if not _is_bytes(value):
+            self.fail(ERROR_TYPE.convert, input_type=type(value))
+        return base64.b64encode(_view(value)).decode("ascii")
+
+    def deserialize(self, value: any) -> typing.Union[bytes, bytearray, memoryview, None]:
+        """
+        bytes、bytearray 及 memoryview 原样返回, 字符串按 base64 解码
+        """
+        if value is None or _is_bytes(value):
+            return value
+        if isinstance(value, memoryview):
+            self.fail(ERROR_TYPE.invalid, input_type=type(value))
+        if not isinstance(value, str):
+            self.fail(ERROR_TYPE.convert, input_type=type(value))
+        try:
+            return base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError):
+            self.fail(ERROR_TYPE.invalid, input_type=type(value))
+
+    def iter_base64(self, value, chunk_size: int = CHUNK_SIZE) -> typing.Iterator[str]:
+        """
+        分块生成 value 的 base64 编码, 拼接后与 serialize 的结果相同, 每块只编码 memoryview 的一个切片
+        """
+        view = self._checked_view(value)
+        chunk_size -= chunk_size % 3
+        for start in range(0, view.nbytes, chunk_size or 3):
+            yield base64.b64encode(view[start:start + chunk_size]).decode("ascii")
+
+    def write_json(self, value, fp: typing.TextIO, chunk_size: int = CHUNK_SIZE):
+        """
+        将 value 以 JSON 字符串(包含引号)写入 fp, None 写为 null
+        """
+        if value is None:
+            fp.write("null")
+            return
+        fp.write('"')
+        for chunk in self.iter_base64(value, chunk_size):
+            fp.write(chunk)
+        fp.write('"')
+
+    def write_to(self, value, fp: typing.BinaryIO) -> int:
+        """
+        以二进制格式写入 fp, 数据部分直接写入 memoryview, 返回写入的字节数
+        """
+        if value is None:
+            fp.write(b"\x00")
+            return 1
+        view = self._checked_view(value)
+        header = _varint(view.nbytes + 1)
+        fp.write(header)
+        fp.write(view)
+        return len(header) + view.nbytes
+
+    def _checked_view(self, value) -> memoryview:
+        if not _is_bytes(value):
+            self.fail(ERROR_TYPE.convert, input_type=type(value))
+        return _view(value)
+
+    def to_bytes(self, value) -> bytes:
+        buf = io.BytesIO()
+        self.write_to(value, buf)
+        return buf.getvalue()
+
+    def read_from(self, data, pos: int = 0) -> typing.Tuple[typing.Union[memoryview, None], int]:
+        """
+        从 data 的 pos 处读取一个二进制格式的值, 返回 data 上的 memoryview 切片及之后的位置, 不复制数据
+        """
+        view = _view(data)
+        try:
+            n, pos = _read_varint(view, pos)
+        except IndexError:
+            self.fail(ERROR_TYPE.invalid, input_type=type(data))
+        if n == 0:
+            return None, pos
+        end = pos + n - 1
+        if end > view.nbytes:
+            self.fail(ERROR_TYPE.invalid, input_type=type(data))
+        return view[pos:end], end
+
 
 class LargeBinary(Binary):
 
@@ -152,7 +301,7 @@ def binary(description: str = "", required: bool = True,
     :return:
     """
 
-    if min_length is not None and max_length is not None:
+    if min_length is not None or max_length is not None:
         validator = StringValidate(min_length=min_length, max_length=max_length)
     else:
         validator = None
@@ -176,7 +325,7 @@ def large_binary(description: str = "", required: bool = True,
     :return:
     """
 
-    if min_length is not None and max_length is not None:
+    if min_length is not None or max_length is not None:
         validator = StringValidate(min_length=min_length, max_length=max_length)
     else:
         validator = None
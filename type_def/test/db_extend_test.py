@@ -0,0 +1,70 @@
+import array
+import base64
+import io
+import json
+
+import pytest
+
+from ..type_error import ValidationError
+from ..type_util import fields
+
+
+def test_binary_deserialize():
+    t = fields.Binary()
+    for value in (b"abc", bytearray(b"abc"), memoryview(b"abc")):
+        assert t.deserialize(value) is value
+        t.valid("blob", value)
+    assert t.deserialize(base64.b64encode(b"abc").decode()) == b"abc"
+
+    # 非连续的 memoryview 无法不复制地按字节访问
+    for value in ("not base64!", 1, memoryview(b"abcd")[::2]):
+        with pytest.raises(ValidationError):
+            t.deserialize(value)
+    for write in (t.serialize, t.to_bytes, lambda v: list(t.iter_base64(v))):
+        with pytest.raises(ValidationError):
+            write(memoryview(b"abcd")[::2])
+    with pytest.raises(ValidationError):
+        t.valid("blob", "abc")
+
+
+def test_binary_length():
+    words = memoryview(array.array("I", [1, 2]))
+    assert len(words) == 2 and words.nbytes == 8
+    fields.Binary(min_length=4).validator.valid(words)
+    with pytest.raises(ValidationError):
+        fields.Binary(max_length=4).validator.valid(words)
+
+
+def test_binary_json():
+    t = fields.LargeBinary()
+    data = bytes(range(256)) * 10
+    encoded = t.serialize(memoryview(data))
+    assert encoded == base64.b64encode(data).decode()
+    assert "".join(t.iter_base64(data, chunk_size=7)) == encoded
+    assert t.serialize(None) is None
+
+    fp = io.StringIO()
+    t.write_json(bytearray(data), fp, chunk_size=30)
+    assert json.loads(fp.getvalue()) == encoded
+
+
+def test_binary_wire():
+    t = fields.Binary()
+    big = bytes(300)
+    fp = io.BytesIO()
+    for value in (b"abc", None, memoryview(array.array("H", [1, 2])), big):
+        t.write_to(value, fp)
+    data = fp.getvalue()
+
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = t.read_from(data, pos)
+        values.append(value)
+    assert values[0] == b"abc" and values[0].obj is data
+    assert values[1] is None
+    assert values[2] == array.array("H", [1, 2]).tobytes()
+    assert values[3] == big
+    assert t.to_bytes(b"abc") == b"\x04abc"
+
+    with pytest.raises(ValidationError):
+        t.read_from(b"\x05ab")
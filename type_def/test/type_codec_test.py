@@ -0,0 +1,90 @@
+import datetime
+import decimal
+
+import pytest
+
+from ...base import RPCDict
+from ..type_codec import codec_of
+from ..type_error import ValidationError
+from ..type_util import fields
+
+
+@fields.args(fields.Model("HelloArgs", dict(
+    id=fields.Integer(),
+    name=fields.String(),
+    score=fields.Float(),
+    ok=fields.Bool(),
+    tags=fields.List(fields.String()),
+    info=fields.Dict(dict(
+        age=fields.Integer(),
+        items=fields.List(fields.Dict(dict(height=fields.Float()))),
+    )),
+)))
+class HelloArgs(RPCDict):
+    pass
+
+
+class Info(object):
+    def __init__(self, age, items):
+        self.age = age
+        self.items = items
+        self._private = 1
+
+
+class Item(object):
+    def __init__(self, height):
+        self.height = height
+
+
+def test_from_dict():
+    payload = {"id": "1", "name": "a", "score": 2, "ok": "true", "tags": ["x", 1],
+               "info": {"age": 3, "items": [{"height": 1}]}, "extra": 1}
+    args = HelloArgs().from_dict(payload)
+    assert args.__dict__ == HelloArgs._rpc_doc_args.deserialize(payload)
+    assert args.id == 1 and args.score == 2.0 and args.ok is True and args.tags == ["x", "1"]
+    assert not hasattr(args, "extra")
+
+    bad = {"id": "x", "score": "y", "tags": [], "info": {"items": []}}
+    with pytest.raises(ValidationError) as exc:
+        HelloArgs().from_dict(bad)
+    with pytest.raises(ValidationError) as expected:
+        HelloArgs._rpc_doc_args.deserialize(bad)
+    assert exc.value.msg == expected.value.msg
+    assert set(exc.value.msg) == {"id", "score", "ok"}
+
+
+def test_to_dict():
+    args = HelloArgs()
+    args.id, args.name, args.tags = 1, "a", ["x"]
+    args.info = Info(3, [Item(1.5), {"height": 2.0, "other": 1}])
+    args.unknown = 1
+    assert args.to_dict() == {"id": 1, "name": "a", "tags": ["x"],
+                              "info": {"age": 3, "items": [{"height": 1.5}, {"height": 2.0}]}}
+    assert codec_of(HelloArgs) is codec_of(HelloArgs)
+
+
+def test_to_dict_serializes_typed_fields():
+    @fields.resp(fields.Model("Event", dict(
+        at=fields.DateTime(out_format="%Y-%m-%d"),
+        price=fields.Decimal(),
+        days=fields.List(fields.DateTime(out_format="%Y-%m-%d")),
+    )))
+    class Event(RPCDict):
+        pass
+
+    event = Event()
+    event.at, event.price = datetime.datetime(2020, 1, 2, 3, 4), decimal.Decimal("1.50")
+    event.days = [datetime.datetime(2020, 1, 3), None]
+    assert event.to_dict() == {"at": "2020-01-02", "price": "1.50", "days": ["2020-01-03", None]}
+    event.at = None
+    assert event.to_dict()["at"] is None
+
+def test_without_schema():
+    class Plain(RPCDict):
+        def __init__(self):
+            self.a = 1
+            self._b = 2
+
+    assert codec_of(Plain) is None
+    assert Plain().to_dict() == {"a": 1}
+    assert Plain().from_dict({"a": 2}).a == 1
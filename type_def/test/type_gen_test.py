@@ -0,0 +1,69 @@
+import base64
+import json
+
+from ...metadata import Entry, Arg
+from ..type_gen import PayloadGenerator, check
+from ..type_util import fields
+
+
+def build_model():
+    return fields.Model("GenResp", dict(
+        id=fields.Integer(minimum=1, maximum=100),
+        name=fields.String(min_length=2, max_length=8),
+        score=fields.Float(minimum=0),
+        ok=fields.Bool(must_true=True),
+        flag=fields.Bool(),
+        state=fields.Enum(dict(On=fields.Integer(default_value=1), Off=fields.Integer(default_value=2))),
+        created=fields.DateTime(in_format="%Y-%m-%d %H:%M:%S"),
+        price=fields.Decimal(maximum=1000),
+        tags=fields.List(fields.String(), min_items=0, max_items=4),
+        items=fields.List(fields.Dict(dict(
+            age=fields.Integer(maximum=200),
+            height=fields.Float(),
+        ))),
+    ))
+
+
+def test_valid_and_invalid():
+    model = build_model()
+    gen = PayloadGenerator(model, seed=7)
+    for _ in range(500):
+        payload = gen.valid()
+        assert check(model, payload), payload
+        assert 1 <= payload["id"] <= 100 and 2 <= len(payload["name"]) <= 8 and payload["ok"] is True
+        assert 0 <= len(payload["tags"]) <= 4
+    for _ in range(500):
+        payload = gen.invalid()
+        assert not check(model, payload), payload
+
+
+def test_seed_and_jsonl(tmp_path):
+    model = build_model()
+    a, b = PayloadGenerator(model, seed=1, wire=True), PayloadGenerator(model, seed=1, wire=True)
+    assert [a.valid() for _ in range(10)] == [b.valid() for _ in range(10)]
+
+    path = str(tmp_path / "rows.jsonl")
+    gen = PayloadGenerator(model, seed=3, wire=True)
+    size = gen.write_jsonl(path, 2500, invalid_ratio=0.2, labeled=True, chunk_size=1000)
+    with open(path, "rb") as fp:
+        assert len(fp.read()) == size
+    with open(path, encoding="utf-8") as fp:
+        rows = [json.loads(line) for line in fp]
+    assert len(rows) == 2500
+    assert 300 < sum(not r["valid"] for r in rows) < 700
+    row = next(r["payload"] for r in rows if r["valid"])
+    assert isinstance(row["created"], str) and isinstance(row["price"], str)
+    assert check(model.get_fields().get_elem_info()["created"], row["created"])
+
+    blob = PayloadGenerator(fields.Binary(min_length=1, max_length=4), seed=1, wire=True).valid()
+    assert 1 <= len(base64.b64decode(blob)) <= 4
+    binary = fields.Binary(min_length=1, max_length=4)
+    assert check(binary, PayloadGenerator(binary, seed=1).valid())
+
+
+def test_entry():
+    entry = Entry("get", [Arg("uid", fields.Integer(minimum=0, maximum=9), None),
+                          Arg("name", fields.String(max_length=4), None)], None)
+    gen = PayloadGenerator(entry, seed=2)
+    assert all(check(entry, gen.valid()) for _ in range(100))
+    assert not any(check(entry, gen.invalid()) for _ in range(100))
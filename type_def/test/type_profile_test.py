@@ -0,0 +1,89 @@
+import copy
+
+from ..type_def import Dict
+from ..type_profile import Profiler
+from ..type_util import fields
+
+
+def build_model():
+    return fields.Model("HelloResp", dict(
+        field1=fields.String(max_length=10),
+        field2=fields.Dict(dict(
+            names=fields.List(fields.String()),
+            infos=fields.List(fields.Dict(dict(
+                age=fields.Integer(minimum=0, maximum=200),
+                height=fields.Float(),
+            ))),
+        )),
+    ))
+
+
+def payload():
+    return {
+        "field1": "hello",
+        "field2": {
+            "names": ["a", "b"],
+            "infos": [{"age": 1, "height": 1.5}, {"age": 2, "height": 1.7}, {"age": 3, "height": 1.8}],
+        },
+    }
+
+
+def test_model_profile():
+    model = build_model()
+    root: Dict = model.get_fields()
+    profiler = Profiler()
+    profiler.enable(model, "resp")
+
+    root.deserialize(payload())
+    root.serialize(payload())
+    root.valid("resp", payload())
+    root.validator.valid(payload())
+    stats = {(s["path"], s["op"]): s for s in profiler.snapshot()}
+
+    assert stats[("resp.field2.infos[].age", "deserialize")]["calls"] == 3
+    assert stats[("resp.field2.infos[].age", "serialize")]["calls"] == 3
+    assert stats[("resp.field2.names[]", "valid")]["calls"] == 2
+    assert stats[("resp.field2.infos[].age", "validator")]["calls"] == 3
+    assert stats[("resp", "deserialize")]["calls"] == 1
+    root_stat = stats[("resp", "deserialize")]
+    assert root_stat["self"] < root_stat["total"]
+    assert profiler.snapshot()[0]["path"] == "resp"
+    assert "resp.field2.infos[].age" in profiler.report()
+
+    # 深拷贝出的 Model 共享同一份统计
+    derived = copy.deepcopy(model)
+    derived.get_fields().deserialize(payload())
+    assert profiler.stat("resp", "deserialize").calls == 2
+
+    # 开启中 reset 后继续记录
+    profiler.reset()
+    assert profiler.snapshot() == []
+    root.deserialize(payload())
+    assert {(s["path"], s["op"]): s["calls"] for s in profiler.snapshot()}[("resp", "deserialize")] == 1
+
+    profiler.disable()
+    assert "deserialize" not in root.__dict__
+    root.deserialize(payload())
+    # 拷贝出的节点同样会被移除
+    assert "deserialize" not in derived.get_fields().__dict__
+    derived.get_fields().deserialize(payload())
+    assert profiler.stat("resp", "deserialize").calls == 1
+
+
+def test_global_profile():
+    model = build_model()
+    profiler = Profiler()
+    profiler.enable_global()
+    try:
+        model.get_fields().deserialize(payload())
+        model.get_fields().valid("x", payload())
+        model.get_fields().validator.valid(payload())
+    finally:
+        profiler.disable()
+
+    stats = {(s["path"], s["op"]): s for s in profiler.snapshot()}
+    assert stats[("Dict.field2.infos[].age", "deserialize")]["calls"] == 3
+    # List.valid 通过 super 调用 RpcType.valid 时不重复记录
+    assert stats[("Dict.field2.names", "valid")]["calls"] == 1
+    assert stats[("Dict.field2.infos[].age", "validator")]["calls"] == 3
+    assert "deserialize" not in Dict.__dict__ or not hasattr(Dict.__dict__["deserialize"], "__wrapped__")
@@ -0,0 +1,31 @@
+import datetime
+
+import pytest
+
+from ..type_error import ValidationError
+from ..type_util import fields
+from ..type_valid import GreaterValidate, LessValidate, ChoiceValidate
+
+
+def test_datetime_deserialize():
+    t = fields.DateTime()
+    # datetime 是 date 的子类, 不应被当作 date 拒绝
+    assert t.deserialize(datetime.datetime(2020, 1, 1)).year == 2020
+    for value in (datetime.date(2020, 1, 1), datetime.time(1)):
+        with pytest.raises(ValidationError):
+            t.deserialize(value)
+
+
+def test_validator_messages():
+    cases = [
+        (GreaterValidate(1), 1, "must greater then 1, but got 1"),
+        (LessValidate(1), 2, "must less then 1, but got 2"),
+        (ChoiceValidate(2, 1, 2, 3), [1, 4], "[1, 4] is not valid with choice condition: n = 2, data = [1, 2, 3]"),
+    ]
+    for validator, value, msg in cases:
+        with pytest.raises(ValidationError) as exc:
+            validator.valid(value)
+        assert exc.value.msg == msg
+
+    with pytest.raises(ValidationError):
+        GreaterValidate(1).valid(None)
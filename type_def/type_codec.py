@@ -0,0 +1,174 @@
+"""
+根据 fields.args / fields.resp 挂在类型上的定义(_rpc_doc_args / _rpc_doc_resp), 在运行时为 RPCDict
+生成 to_dict / from_dict 的转换函数, 函数按定义中的字段逐个展开, 不再遍历实例的属性,
+生成结果按类型缓存, 未使用代码生成的服务也可以得到按定义转换的能力:
+
+    @fields.args(fields.Model("HelloArgs", dict(arg1=fields.Integer(), arg2=fields.String())))
+    class HelloArgs(RPCDict):
+        pass
+
+    HelloArgs().from_dict({"arg1": "1", "arg2": "x"}).to_dict()  # {"arg1": 1, "arg2": "x"}
+"""
+
+import typing
+
+from ..util.convert import convert2builtin
+from .type_base import RpcType
+from .type_def import Dict, List, Integer, Float, Double, String, Bool
+from .type_error import ERROR_TYPE, ValidationError
+from .type_tags import rpc_doc_args_key, rpc_doc_resp_key
+
+_BUILTINS = frozenset((int, str, float, bool, type(None)))
+_MISSING = object()
+
+# 值已经是目标类型时 deserialize 会原样返回, 生成的代码中直接判断后赋值, 不再调用 deserialize,
+# 只匹配这些类型本身, 子类可能覆盖了 deserialize
+_IDENTITY_CHECKS: typing.Dict[type, str] = {
+    Integer: "type(v) is int or v is None",
+    String: "type(v) is str or v is None",
+    Float: "type(v) is float",
+    Double: "type(v) is float",
+    Bool: "v is True or v is False",
+}
+
+# 这些类型的 serialize 只是将值转换为对应的基础类型, 非基础类型的值交给 convert2builtin 处理,
+# 其余的类型(如 DateTime、Decimal、Binary)通过字段的 serialize 转换
+_PLAIN_SERIALIZE = frozenset(c.__dict__["serialize"] for c in (Integer, Float, String, Bool))
+
+ToDict = typing.Callable[[typing.Dict[str, typing.Any]], typing.Dict[str, typing.Any]]
+FromDict = typing.Callable[[typing.Any], typing.Dict[str, typing.Any]]
+
+
+def _exec(lines: typing.List[str], ns: typing.Dict[str, typing.Any], name: str) -> typing.Callable:
+    exec("\n".join(lines), ns)
+    return ns[name]
+
+
+def _serializes(t: RpcType) -> bool:
+    """
+    字段的值是否需要通过字段的 serialize 转换
+    """
+    if isinstance(t, (Dict, List)):
+        return False
+    return getattr(type(t), "serialize", None) not in _PLAIN_SERIALIZE
+
+
+def _to_value(t: RpcType) -> typing.Callable[[typing.Any], typing.Any]:
+    """
+    按字段的定义转换非基础类型的值, Dict 的值可以是字典或对象, 需要 serialize 的类型调用字段的 serialize,
+    其他类型交给 convert2builtin
+    """
+    if isinstance(t, Dict) and t.get_elem_info():
+        fn = compile_to_dict(t)
+
+        def dict_value(v):
+            if type(v) is dict:
+                return fn(v)
+            d = getattr(v, "__dict__", None)
+            return convert2builtin(v) if d is None else fn(d)
+        return dict_value
+
+    if isinstance(t, List) and t.get_elem() is not None:
+        elem = _to_value(t.get_elem())
+        skip = (type(None),) if _serializes(t.get_elem()) else _BUILTINS
+
+        def list_value(v):
+            if type(v) is not list:
+                return convert2builtin(v)
+            return [e if type(e) in skip else elem(e) for e in v]
+        return list_value
+
+    if _serializes(t):
+        # serialize 在调用时查找, 因此 profiler 替换的方法依然有效
+        return lambda v: t.serialize(v)
+    return convert2builtin
+
+
+def compile_to_dict(schema: Dict) -> ToDict:
+    """
+    生成将字典(或对象的 __dict__)按 schema 的字段转换为基础类型的函数, 未赋值的字段不会出现在结果中,
+    需要 serialize 的字段调用字段的 serialize, 其他字段中基础类型的值直接写入结果
+    """
+    ns: typing.Dict[str, typing.Any] = {"B": _BUILTINS, "MISSING": _MISSING}
+    lines = ["def to_dict(d):", "    out = {}", "    get = d.get"]
+    for i, (key, t) in enumerate(schema.get_elem_info().items()):
+        k = repr(key)
+        if _serializes(t):
+            # 字符串等基础类型的值同样需要 serialize, 如 Decimal 的小数位数
+            ns[f"t{i}"] = t
+            value = f"v if v is None else t{i}.serialize(v)"
+        else:
+            ns[f"c{i}"] = _to_value(t)
+            value = f"v if type(v) in B else c{i}(v)"
+        lines += [f"    v = get({k}, MISSING)",
+                  "    if v is not MISSING:",
+                  f"        out[{k}] = {value}"]
+    lines.append("    return out")
+    return _exec(lines, ns, "to_dict")
+
+
+def compile_from_dict(schema: Dict) -> FromDict:
+    """
+    生成按 schema 反序列化字典的函数, 结果及错误信息与 schema.deserialize 一致,
+    字段的 deserialize 在调用时查找, 因此 profiler 替换的方法依然有效
+    """
+    ns: typing.Dict[str, typing.Any] = {"schema": schema, "ValidationError": ValidationError, "ERROR_TYPE": ERROR_TYPE}
+    lines = ["def from_dict(value):",
+             "    if not isinstance(value, dict):",
+             "        schema.fail(ERROR_TYPE.invalid, input_type=type(value))",
+             "    data, error = {}, {}",
+             "    get = value.get"]
+    for i, (key, t) in enumerate(schema.get_elem_info().items()):
+        k, name = repr(key), f"t{i}"
+        ns[name] = t
+        lines.append(f"    v = get({k})")
+        indent = "    "
+        check = _IDENTITY_CHECKS.get(type(t))
+        if check is not None:
+            lines += [f"    if {check}:", f"        data[{k}] = v", "    else:"]
+            indent = "        "
+        lines += [f"{indent}try:",
+                  f"{indent}    data[{k}] = {name}.deserialize(v)",
+                  f"{indent}except ValidationError as exc:",
+                  f"{indent}    error[{k}] = exc.msg"]
+    lines += ["    if error:", "        raise ValidationError(msg=error)", "    return data"]
+    return _exec(lines, ns, "from_dict")
+
+
+class DictCodec(object):
+    """
+    一个类型的 to_dict / from_dict 转换函数
+    """
+
+    def __init__(self, schema: Dict):
+        self.schema = schema
+        self.to_dict: ToDict = compile_to_dict(schema)
+        self.from_dict: FromDict = compile_from_dict(schema)
+
+
+# 类型 -> 转换函数, 没有可用定义的类型为 None
+_codecs: typing.Dict[type, typing.Union[DictCodec, None]] = {}
+
+
+def schema_of(cls: type) -> typing.Union[Dict, None]:
+    """
+    类型上的参数或返回值定义, 只有字段确定的 Dict 可以用于生成转换函数
+    """
+    for key in (rpc_doc_args_key, rpc_doc_resp_key):
+        schema = getattr(cls, key, None)
+        if isinstance(schema, Dict) and schema.get_elem_info():
+            return schema
+    return None
+
+
+def codec_of(cls: type) -> typing.Union[DictCodec, None]:
+    """
+    获取类型的转换函数, 第一次调用时生成并缓存
+    """
+    try:
+        return _codecs[cls]
+    except KeyError:
+        pass
+    schema = schema_of(cls)
+    codec = None if schema is None else DictCodec(schema)
+    return _codecs.setdefault(cls, codec)
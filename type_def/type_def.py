@@ -236,12 +236,13 @@ class DateTime(RpcType):
             self.fail(ERROR_TYPE.invalid, input_type=type(value))
 
     def deserialize(self, value: any) -> datetime.datetime:
-        if isinstance(value, (datetime.date, datetime.time)):
-            self.fail(ERROR_TYPE, input_type=type(value))
-
+        # datetime 是 date 的子类, 需要先于 date 判断
         if isinstance(value, datetime.datetime):
             return value.astimezone(self.get_timezone())
 
+        if isinstance(value, (datetime.date, datetime.time)):
+            self.fail(ERROR_TYPE.invalid, input_type=type(value))
+
         try:
             parsed = self.datetime_parser(value, self.in_format)
             return parsed.astimezone(self.get_timezone())
@@ -0,0 +1,261 @@
+"""
+类型系统的性能分析, 记录每个类型节点 valid、serialize、deserialize 及其 validator 的调用次数与耗时,
+节点以字段路径标识, 如 resp.field2.infos[].age
+
+开启时直接在节点实例上设置替换的方法(全局开启时替换类上的方法), 关闭时移除,
+因此未开启时没有任何额外的开销:
+
+    profiler.enable(SomeModel, "resp")
+    ...
+    print(profiler.report())
+    profiler.disable()
+"""
+
+import copy
+import threading
+import time
+import typing
+import weakref
+
+from .type_base import RpcType
+from .type_def import Dict, List
+from .type_valid_base import Validate, EmptyValidate
+
+OPERATIONS = ("valid", "serialize", "deserialize")
+# validator 的调用以 "validator" 作为操作名
+VALIDATOR = "validator"
+
+
+class NodeStat(object):
+    """
+    一个节点的一种操作的统计, total 包含子节点的耗时, self_time 不包含
+    """
+    __slots__ = ("path", "op", "calls", "total", "self_time")
+
+    def __init__(self, path: str, op: str):
+        self.path = path
+        self.op = op
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {"path": self.path, "op": self.op, "calls": self.calls,
+                "total": self.total, "self": self.self_time}
+
+    def __repr__(self):
+        return f"NodeStat({self.path}, {self.op}, calls: {self.calls}, total: {self.total:.6f})"
+
+
+def _children(node: RpcType, path: str) -> typing.Iterator[typing.Tuple[RpcType, str]]:
+    if isinstance(node, Dict):
+        for key, child in node.get_elem_info().items():
+            yield child, f"{path}.{key}" if path else key
+    elif isinstance(node, List) and isinstance(node.get_elem(), RpcType):
+        yield node.get_elem(), f"{path}[]"
+
+
+def _subclasses(cls: type) -> typing.List[type]:
+    result, stack = [], [cls]
+    while stack:
+        c = stack.pop()
+        result.append(c)
+        stack.extend(c.__subclasses__())
+    return result
+
+
+class _Probe(object):
+    """
+    设置在节点实例上的方法, 调用原有的方法并记录耗时, 节点被深拷贝时, 拷贝出的节点共享同一份统计,
+    拷贝出的节点同样会注册到 profiler 中, disable 时一并移除
+    """
+    __slots__ = ("profiler", "target", "name", "stat")
+
+    def __init__(self, profiler: 'Profiler', target, name: str, stat: NodeStat):
+        self.profiler = profiler
+        self.target = target
+        self.name = name
+        self.stat = stat
+
+    def __call__(self, *args, **kwargs):
+        func = getattr(type(self.target), self.name).__get__(self.target)
+        return self.profiler.measure(self.stat, func, args, kwargs)
+
+    def __deepcopy__(self, memo):
+        target = copy.deepcopy(self.target, memo)
+        self.profiler._register(target, self.name)
+        return _Probe(self.profiler, target, self.name, self.stat)
+
+
+class Profiler(object):
+    """
+    按 Model 或全局开启的性能分析, 统计结果按 (路径, 操作) 汇总
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats: typing.Dict[typing.Tuple[str, str], NodeStat] = {}
+        # 已开启的节点实例(弱引用)及在其上设置的方法名, 包括深拷贝出的节点
+        self._probed: typing.List[typing.Tuple[weakref.ref, str]] = []
+        # 全局开启时替换的类方法
+        self._patched: typing.List[typing.Tuple[type, str, typing.Any]] = []
+        # 全局开启时节点的路径, 未知的根节点以类型名作为路径
+        self._paths: typing.MutableMapping[typing.Any, str] = weakref.WeakKeyDictionary()
+
+    def stat(self, path: str, op: str) -> NodeStat:
+        key = (path, op)
+        stat = self.stats.get(key)
+        if stat is None:
+            with self._lock:
+                stat = self.stats.setdefault(key, NodeStat(path, op))
+        return stat
+
+    def measure(self, stat: NodeStat, func, args, kwargs):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        # 每一层记录其子节点的耗时
+        frame = [0.0]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                stat.calls += 1
+                stat.total += elapsed
+                stat.self_time += elapsed - frame[0]
+            if stack:
+                stack[-1][0] += elapsed
+
+    def enable(self, target, root: str = ""):
+        """
+        为 Model 或 RpcType 的所有节点开启性能分析, root 为根节点的路径, 默认使用 Model 的名称
+        """
+        if hasattr(target, "get_fields") and hasattr(target, "get_name"):
+            root = root or target.get_name()
+            target = target.get_fields()
+        if not isinstance(target, RpcType):
+            raise TypeError(f"只能对 Model 或 RpcType 开启性能分析, 而不是 {type(target).__name__}")
+
+        stack = [(target, root or type(target).__name__)]
+        while stack:
+            node, path = stack.pop()
+            for op in OPERATIONS:
+                self._probe(node, op, path, op)
+            if node.validator is not None and not isinstance(node.validator, EmptyValidate):
+                self._probe(node.validator, "valid", path, VALIDATOR)
+            stack.extend(_children(node, path))
+
+    def _probe(self, target, name: str, path: str, op: str):
+        if isinstance(target.__dict__.get(name), _Probe):
+            return
+        setattr(target, name, _Probe(self, target, name, self.stat(path, op)))
+        self._register(target, name)
+
+    def _register(self, target, name: str):
+        with self._lock:
+            self._probed.append((weakref.ref(target), name))
+
+    def enable_global(self):
+        """
+        为所有的 RpcType 及 Validate 开启性能分析, 通过 enable 注册过的节点使用注册时的路径,
+        其他的节点从第一次调用的根节点推导路径
+        """
+        if self._patched:
+            return
+        for cls in _subclasses(RpcType):
+            for op in OPERATIONS:
+                if op in cls.__dict__:
+                    self._patch(cls, op, op)
+        for cls in _subclasses(Validate):
+            if "valid" in cls.__dict__ and cls is not EmptyValidate:
+                self._patch(cls, "valid", VALIDATOR)
+
+    def _patch(self, cls: type, name: str, op: str):
+        original = cls.__dict__[name]
+        profiler = self
+
+        def probe(target, *args, **kwargs):
+            # 子类通过 super 调用父类的方法时不重复记录
+            current = getattr(profiler._local, "current", None)
+            if current is not None and current[0] is target and current[1] == op:
+                return original(target, *args, **kwargs)
+
+            stat = profiler.stat(profiler.path_of(target), op)
+            profiler._local.current = (target, op)
+            try:
+                return profiler.measure(stat, original, (target,) + args, kwargs)
+            finally:
+                profiler._local.current = current
+
+        probe.__wrapped__ = original
+        setattr(cls, name, probe)
+        self._patched.append((cls, name, original))
+
+    def path_of(self, target) -> str:
+        """
+        全局开启时获取节点的路径, Validate 使用其所属的类型节点的路径
+        """
+        if isinstance(target, Validate):
+            # ListValidate 及 DictValidate 直接保存 host, 其他的 validator 保存 host 的弱引用
+            host = target.host if isinstance(target.host, RpcType) else target.host()
+            if host is None:
+                return type(target).__name__
+            target = host
+
+        path = self._paths.get(target)
+        if path is None:
+            path = self._paths[target] = type(target).__name__
+        # 第一次遇到复合类型时为其子节点推导路径
+        for child, child_path in _children(target, path):
+            if child not in self._paths:
+                self._paths[child] = child_path
+        return path
+
+    def disable(self):
+        """
+        移除所有设置的方法, 已记录的统计会保留
+        """
+        with self._lock:
+            probed, self._probed = self._probed, []
+        for ref, name in probed:
+            target = ref()
+            if target is not None and isinstance(target.__dict__.get(name), _Probe):
+                delattr(target, name)
+        for cls, name, original in reversed(self._patched):
+            setattr(cls, name, original)
+        self._patched = []
+
+    def reset(self):
+        """
+        清零已记录的统计, 已设置的方法持有各自的 NodeStat, 因此在原对象上清零, 开启中的节点继续记录
+        """
+        with self._lock:
+            for stat in self.stats.values():
+                stat.calls, stat.total, stat.self_time = 0, 0.0, 0.0
+
+    def snapshot(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        按总耗时降序排列的统计
+        """
+        stats = sorted(list(self.stats.values()), key=lambda s: s.total, reverse=True)
+        return [s.to_dict() for s in stats if s.calls]
+
+    def report(self, top: int = 0) -> str:
+        rows = self.snapshot()
+        if top:
+            rows = rows[:top]
+        width = max([len(r["path"]) for r in rows] + [4]) + 2
+        lines = [f"{'path':<{width}}{'op':<13}{'calls':>10}{'total(ms)':>12}{'self(ms)':>12}{'avg(us)':>10}"]
+        for r in rows:
+            lines.append(f"{r['path']:<{width}}{r['op']:<13}{r['calls']:>10}{r['total'] * 1e3:>12.3f}"
+                         f"{r['self'] * 1e3:>12.3f}{r['total'] / r['calls'] * 1e6:>10.2f}")
+        return "\n".join(lines)
+
+
+# 默认的性能分析器
+profiler = Profiler()
@@ -6,6 +6,7 @@ rpc_serializer = '__serializer__'
 rpc_doc_args_key = "_rpc_doc_args"
 rpc_doc_type_key = "_rpc_doc_type"
 rpc_doc_resp_key = "_rpc_doc_resp"
+rpc_doc_cache_key = "_rpc_doc_cache"
 
 
 MYSQL = 'MYSQL'
@@ -53,3 +54,18 @@ def allow_addition():
         return cls
 
     return w
+
+
+def cacheable(ttl: float, stale: float = 0):
+    """
+    标记服务为幂等且可在客户端缓存其返回值, ttl 为缓存的有效时间(秒),
+    过期后的 stale 秒内仍返回旧的结果, 同时在后台刷新
+    """
+    def w(cls):
+        # doc 只加在原始的函数上
+        while hasattr(cls, "__wrapped__"):
+            cls = cls.__wrapped__
+        setattr(cls, rpc_doc_cache_key, {"ttl": ttl, "stale": stale})
+        return cls
+
+    return w
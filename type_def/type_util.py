@@ -214,9 +214,8 @@ class Model(object):
         挑选某些字段，行程新的fields.Model
         """
         m2 = copy.deepcopy(self)
-        m2.get_fields().type_dict = self.iter_serializer(
-            self.get_fields().get_elem_info(), include=field_list
-        )
+        elem_info = m2.get_fields().get_elem_info()
+        m2.get_fields().type_dict = {k: elem_info[k] for k in field_list if k in elem_info}
         return m2
 
     def exclude(self, field_list: typing.List[str]):
@@ -224,7 +223,8 @@ class Model(object):
         排除某些字段，行程新的fields.Model
         """
         m2 = copy.deepcopy(self)
-        m2.get_fields().type_dict = self.iter_serializer(self.get_fields().get_elem_info(), exclude=field_list)
+        excluded = set(field_list)
+        m2.get_fields().type_dict = {k: v for k, v in m2.get_fields().get_elem_info().items() if k not in excluded}
         return m2
 
     def exclude_primary(self) -> 'Model':
@@ -641,6 +641,7 @@ class Fields(object):
     Text = db_extend.text
     json = db_extend.json
     allow_addition = allow_addition
+    cacheable = cacheable
 
 
 # global fields for define
@@ -24,7 +24,7 @@ class GreaterValidate(Validate):
 
     def valid(self, v: Number):
         if v is None:
-            self.fail(VALID_TYPE.invalid)
+            self.fail(VALID_TYPE.null)
 
         if v <= self.n:
             self.fail(VALID_TYPE.invalid, n=self.n, v=v)
@@ -52,7 +52,7 @@ class LessValidate(Validate):
             self.fail(VALID_TYPE.null)
 
         if v >= self.n:
-            self.fail(VALID_TYPE.invalid, m=self.n, v=v)
+            self.fail(VALID_TYPE.invalid, n=self.n, v=v)
 
     def gen_invalid(self) -> any:
         gen = random.randint(self.n + 1, self.n + random.randint(1, (self.n * 10) % 100))
@@ -116,7 +116,7 @@ class ChoiceValidate(Validate):
     def valid(self, v: any):
         if isinstance(v, list):
             if len(v) != self.n or len(set(v).intersection(set(self.data))) != self.n:
-                self.fail(VALID_TYPE.invalid, v=v, data=self.data)
+                self.fail(VALID_TYPE.invalid, v=v, n=self.n, data=self.data)
         elif v not in self.data:
             self.fail(VALID_TYPE.invalid, v=v, n=self.n, data=self.data)
 
@@ -180,7 +180,8 @@ class StringValidate(Validate):
         if not v:
             self.fail(VALID_TYPE.null)
 
-        self.validator.valid(len(v))
+        # memoryview 的 len 为第一维的元素个数, 二进制的长度按字节数检查
+        self.validator.valid(v.nbytes if isinstance(v, memoryview) else len(v))
 
     def gen_invalid(self) -> str:
         if self.min_length is not None and self.max_length is None:
@@ -313,7 +314,7 @@ def validator_constructor(**kwargs):
         if choose_n is None:
             choose_n = 1
 
-        validator.append(ChoiceValidate(choose_n, choose_condition))
+        validator.append(ChoiceValidate(choose_n, *choose_condition))
 
     # TODO: 后续要支持多种 Validator 的组合
     return validator and validator[0] or EmptyValidate()
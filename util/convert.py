@@ -0,0 +1,305 @@
+"""
+将任意复合类型转换为基础类型, 供 RPCDict.to_dict 使用
+
+每个值按其类型分类, 分类结果按类型缓存, 对象按类型及其 __dict__ 的 key 组合缓存公开字段的列表(计划),
+同一计划使用若干次后会为其生成专用的转换函数, 函数中按字段逐个取值, 基础类型的值直接写入结果,
+不再对每个属性调用 startswith、callable 及 hasattr
+"""
+
+import typing
+
+# 值的分类, CALLABLE 为附加的标记, 作为对象的属性或字典的值时会被忽略
+BUILTIN = 0
+LIST = 1
+DICT = 2
+OBJECT = 3
+SLOTS = 4
+OTHER = 5
+CALLABLE = 8
+
+# 嵌套超过该深度后开始记录路径上的对象, 用于检测循环引用, 正常深度的数据不需要额外的开销
+CYCLE_CHECK_DEPTH = 32
+# 计划使用该次数后为其生成专用的转换函数, 避免为只出现一次的字典生成函数
+COMPILE_AFTER = 2
+# 每个类型最多缓存的计划数, 超过后不再缓存新的计划
+MAX_SHAPES = 8
+# 缓存的字典计划数, 超过后清空重新缓存
+MAX_DICT_SHAPES = 1024
+
+_BUILTINS = frozenset((int, str, float, bool, type(None)))
+# 转换结果中应忽略的值
+_SKIP = object()
+
+
+class CycleError(ValueError):
+    """
+    转换的数据中存在循环引用
+    """
+    pass
+
+
+def _public(keys: typing.Iterable[typing.Any]) -> typing.Tuple[typing.Any, ...]:
+    return tuple(k for k in keys if not (isinstance(k, str) and k.startswith("_")))
+
+
+def _slot_names(cls: type) -> typing.Tuple[str, ...]:
+    """
+    类型及其父类中通过 __slots__ 声明的公开字段
+    """
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for name in slots:
+            if name not in ("__dict__", "__weakref__") and name not in names:
+                names.append(name)
+    return _public(names)
+
+
+# 转换函数, 参数为 (字典或对象, 子元素的深度, 路径上的对象)
+FieldsFunc = typing.Callable[[typing.Any, int, typing.Union[typing.Set[int], None]], typing.Dict[str, typing.Any]]
+
+
+def _compile(keys: typing.Tuple[str, ...], value: typing.Callable, attr: bool = False) -> FieldsFunc:
+    """
+    为固定的字段生成转换函数, attr 为 True 时通过 getattr 从对象上取值, 未赋值的字段会被忽略
+    """
+    lines = ["def build(B, value, SKIP, MISSING):", "    def convert(d, depth, seen):", "        out = {}"]
+    for key in keys:
+        k = repr(key)
+        if attr:
+            lines += [f"        v = getattr(d, {k}, MISSING)",
+                      "        if v is MISSING:",
+                      "            pass",
+                      "        elif type(v) in B:"]
+        else:
+            lines += [f"        v = d[{k}]",
+                      "        if type(v) in B:"]
+        lines += [f"            out[{k}] = v",
+                  "        else:",
+                  "            v = value(v, depth, seen)",
+                  "            if v is not SKIP:",
+                  f"                out[{k}] = v"]
+    lines += ["        return out", "    return convert"]
+    ns: typing.Dict[str, typing.Any] = {}
+    exec("\n".join(lines), ns)
+    return ns["build"](_BUILTINS, value, _SKIP, _SKIP)
+
+
+class _Shape(object):
+    """
+    字典或对象的转换计划, public 为需要转换的 key, fn 为生成的专用转换函数
+    """
+    __slots__ = ("public", "hits", "fn", "compilable")
+
+    def __init__(self, public: typing.Tuple[typing.Any, ...]):
+        self.public = public
+        self.hits = 0
+        self.fn: typing.Union[FieldsFunc, None] = None
+        self.compilable = all(isinstance(k, str) for k in public)
+
+
+class Converter(object):
+    """
+    转换器, 缓存每个类型的分类及转换计划, slots 为 True 时, 只声明了 __slots__ 的对象会按其字段转换为字典,
+    否则与其他没有 __dict__ 的对象一样原样返回
+    """
+
+    def __init__(self, slots: bool = False, compile_after: int = COMPILE_AFTER):
+        self.slots = slots
+        self.compile_after = compile_after
+        self._kinds: typing.Dict[type, int] = {int: BUILTIN, str: BUILTIN, float: BUILTIN, bool: BUILTIN,
+                                              type(None): BUILTIN, list: LIST, dict: DICT}
+        # 对象的类型 -> {__dict__ 的 key 组合: 计划}
+        self._shapes: typing.Dict[type, typing.Dict[typing.Tuple[typing.Any, ...], _Shape]] = {}
+        # 字典的 key 组合 -> 计划
+        self._dict_shapes: typing.Dict[typing.Tuple[typing.Any, ...], _Shape] = {}
+        self._slot_fns: typing.Dict[type, FieldsFunc] = {}
+
+    def convert(self, obj) -> typing.Any:
+        if type(obj) in _BUILTINS:
+            return obj
+        kind = self._kind(obj)
+        if kind == BUILTIN:
+            return obj
+        return self._checked(obj, kind & ~CALLABLE, 0, None)
+
+    def _kind(self, value) -> int:
+        kind = self._kinds.get(type(value))
+        return self._classify(value) if kind is None else kind
+
+    def _classify(self, value) -> int:
+        """
+        按类型的第一个值决定该类型的分类, 与原有实现的判断顺序一致
+        """
+        if isinstance(value, (int, str, float, bool)):
+            kind = BUILTIN
+        elif isinstance(value, list):
+            kind = LIST
+        elif isinstance(value, dict):
+            kind = DICT
+        elif hasattr(value, "__dict__"):
+            kind = OBJECT
+        elif self.slots and _slot_names(type(value)):
+            kind = SLOTS
+        else:
+            kind = OTHER
+
+        if kind != BUILTIN and callable(value):
+            kind |= CALLABLE
+        self._kinds[type(value)] = kind
+        return kind
+
+    def _value(self, value, depth: int, seen) -> typing.Any:
+        """
+        转换字典的值或对象的属性, 可调用的值返回 _SKIP
+        """
+        kind = self._kinds.get(type(value))
+        if kind is None:
+            kind = self._classify(value)
+        if kind == BUILTIN or kind == OTHER:
+            return value
+        if kind & CALLABLE:
+            return _SKIP
+        if depth >= CYCLE_CHECK_DEPTH:
+            return self._checked(value, kind, depth, seen)
+        # 常见的情况直接使用已生成的转换函数, 减少方法调用
+        if kind == DICT:
+            shape = self._dict_shapes.get(tuple(value)) or self._dict_shape(value)
+            fn = shape.fn
+            return fn(value, depth + 1, seen) if fn is not None else self._fields(value, shape, depth, seen)
+        if kind == OBJECT:
+            d = value.__dict__
+            shape = self._shape(type(value), d)
+            fn = shape.fn
+            return fn(d, depth + 1, seen) if fn is not None else self._fields(d, shape, depth, seen)
+        if kind == LIST:
+            return self._items(value, depth, seen)
+        return self._container(value, kind, depth, seen)
+
+    def _checked(self, value, kind: int, depth: int, seen: typing.Union[typing.Set[int], None]):
+        """
+        超过 CYCLE_CHECK_DEPTH 后记录路径上的对象以检测循环引用
+        """
+        if depth < CYCLE_CHECK_DEPTH:
+            return self._container(value, kind, depth, seen)
+
+        if seen is None:
+            seen = set()
+        i = id(value)
+        if i in seen:
+            raise CycleError(f"存在循环引用的 {type(value).__name__} 对象, 无法转换为基础类型")
+        seen.add(i)
+        try:
+            return self._container(value, kind, depth, seen)
+        finally:
+            seen.discard(i)
+
+    def _container(self, value, kind: int, depth: int, seen):
+        if kind == OBJECT:
+            d = value.__dict__
+            return self._fields(d, self._shape(type(value), d), depth, seen)
+        if kind == DICT:
+            return self._fields(value, self._dict_shape(value), depth, seen)
+        if kind == LIST:
+            return self._items(value, depth, seen)
+        if kind == SLOTS:
+            return self._slots(value, depth, seen)
+        return value
+
+    def _shape(self, cls: type, d: dict) -> _Shape:
+        """
+        同一类型的对象通常有相同的字段, 因此按类型及 key 的组合缓存计划
+        """
+        keys = tuple(d)
+        shapes = self._shapes.get(cls)
+        if shapes is None:
+            shapes = self._shapes.setdefault(cls, {})
+        shape = shapes.get(keys)
+        if shape is None:
+            shape = _Shape(_public(keys))
+            if len(shapes) < MAX_SHAPES:
+                shapes[keys] = shape
+        return shape
+
+    def _dict_shape(self, d: dict) -> _Shape:
+        """
+        同一处代码构造的字典通常有相同的 key, 同样按 key 的组合缓存计划
+        """
+        keys = tuple(d)
+        shape = self._dict_shapes.get(keys)
+        if shape is None:
+            shape = _Shape(_public(keys))
+            if len(self._dict_shapes) >= MAX_DICT_SHAPES:
+                self._dict_shapes.clear()
+            self._dict_shapes[keys] = shape
+        return shape
+
+    def _fields(self, d, shape: _Shape, depth: int, seen) -> typing.Dict[typing.Any, typing.Any]:
+        depth += 1
+        fn = shape.fn
+        if fn is not None:
+            return fn(d, depth, seen)
+
+        shape.hits += 1
+        if shape.hits >= self.compile_after and shape.compilable:
+            shape.fn = _compile(shape.public, self._value)
+
+        out, value = {}, self._value
+        for key in shape.public:
+            v = d[key]
+            if type(v) in _BUILTINS:
+                out[key] = v
+            else:
+                v = value(v, depth, seen)
+                if v is not _SKIP:
+                    out[key] = v
+        return out
+
+    def _items(self, items: list, depth: int, seen) -> typing.List[typing.Any]:
+        out = []
+        append, kinds, shape_of = out.append, self._kinds, self._shape
+        depth += 1
+        for v in items:
+            if type(v) in _BUILTINS:
+                append(v)
+                continue
+            kind = kinds.get(type(v))
+            if kind is None:
+                kind = self._classify(v)
+            # 列表中的元素不会因为可调用而被忽略
+            kind &= ~CALLABLE
+            if kind == BUILTIN or kind == OTHER:
+                append(v)
+            elif kind == OBJECT and depth < CYCLE_CHECK_DEPTH:
+                d = v.__dict__
+                shape = shape_of(type(v), d)
+                fn = shape.fn
+                append(fn(d, depth + 1, seen) if fn is not None else self._fields(d, shape, depth, seen))
+            else:
+                append(self._checked(v, kind, depth, seen))
+        return out
+
+    def _slots(self, obj, depth: int, seen) -> typing.Dict[str, typing.Any]:
+        cls = type(obj)
+        fn = self._slot_fns.get(cls)
+        if fn is None:
+            fn = self._slot_fns.setdefault(cls, _compile(_slot_names(cls), self._value, attr=True))
+        return fn(obj, depth + 1, seen)
+
+
+_converter = Converter()
+_slots_converter = Converter(slots=True)
+
+
+def convert2builtin(obj, slots: bool = False) -> typing.Union[typing.Dict[str, typing.Any],
+                                                              typing.List,
+                                                              int, bool, float, str, None]:
+    """
+    转换任意复合类型到基础类型, 字典及对象中以 _ 开头的 key 及可调用的值会被忽略,
+    如果传递的类型不在支持的范围内则原样返回, slots 为 True 时只声明了 __slots__ 的对象也会被转换为字典,
+    存在循环引用时抛出 CycleError
+    WARN: 但如果一个类型无法转换为 builtin， 则说明他后续的序列化会出错。
+    """
+    return (_slots_converter if slots else _converter).convert(obj)
@@ -0,0 +1,95 @@
+import datetime
+
+import pytest
+
+from ..convert import convert2builtin, CycleError, CYCLE_CHECK_DEPTH
+from ..prelude import is_builtin_type
+
+
+def reference(obj):
+    """
+    原有的逐个属性检查的实现, 用于对比结果
+    """
+    if is_builtin_type(obj):
+        return obj
+    if isinstance(obj, dict):
+        d = {}
+        for key, value in obj.items():
+            if key.startswith("_") or callable(value):
+                continue
+            if is_builtin_type(value):
+                d[key] = value
+            elif isinstance(value, (list, dict)):
+                d[key] = reference(value)
+            elif hasattr(value, "__dict__"):
+                d[key] = reference(value.__dict__)
+            else:
+                d[key] = value
+        return d
+    if isinstance(obj, list):
+        return [reference(i) for i in obj]
+    if hasattr(obj, "__dict__"):
+        return reference(obj.__dict__)
+    return obj
+
+
+class Address(object):
+    def __init__(self, city):
+        self.city = city
+        self._secret = 1
+        self.on_change = lambda: None
+
+
+class User(object):
+    def __init__(self, i):
+        self.id = i
+        self.name = f"user{i}"
+        self.created = datetime.date(2020, 1, i + 1)
+        self.pair = (1, 2)
+        self.address = Address(f"city{i}") if i % 2 else None
+        self.tags = ["a", Address("b"), {"_x": 1, "y": [1, {"z": Address("c")}]}]
+        self.kind = Address
+
+
+class Point(object):
+    __slots__ = ("x", "y", "_z")
+
+    def __init__(self, x, y):
+        self.x, self.y, self._z = x, y, 0
+
+
+def test_same_as_reference():
+    data = {"users": [User(i) for i in range(4)], "total": 4, "_hidden": 1, "fn": print}
+    assert convert2builtin(data) == reference(data)
+    for u in data["users"]:
+        assert convert2builtin(u) == reference(u)
+
+    # 同一类型的对象有不同的字段时使用新的计划
+    u = User(5)
+    u.extra = Address("d")
+    del u.name
+    assert convert2builtin(u) == reference(u)
+    assert "extra" in convert2builtin(u) and "name" not in convert2builtin(u)
+
+
+def test_cycle_and_deep():
+    a = User(0)
+    a.tags.append(a)
+    with pytest.raises(CycleError):
+        convert2builtin(a)
+
+    # 重复出现但没有循环的对象, 以及没有循环的深层嵌套可以正常转换
+    shared = Address("x")
+    deep = node = {}
+    for _ in range(CYCLE_CHECK_DEPTH * 3):
+        node["next"] = {"a": shared, "b": shared}
+        node = node["next"]
+    assert convert2builtin(deep) == reference(deep)
+
+
+def test_slots():
+    p = {"p": Point(1, 2)}
+    assert convert2builtin(p)["p"] is p["p"]
+    assert convert2builtin(p, slots=True) == {"p": {"x": 1, "y": 2}}
+    del p["p"].y
+    assert convert2builtin(p, slots=True) == {"p": {"x": 1}}